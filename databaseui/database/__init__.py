@@ -1,8 +1,16 @@
 from .db_manager import DatabaseManager, with_session
+from .cache import ReferenceCache
+from .metrics import QueryMetrics
+from .statements import StatementRegistry
+from .summaries import SummaryTables
 from . import db_types
 
 __all__ = [
     'DatabaseManager',
     'with_session',
+    'ReferenceCache',
+    'QueryMetrics',
+    'StatementRegistry',
+    'SummaryTables',
     'db_types'
 ]
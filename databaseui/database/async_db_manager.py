@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import importlib.util
+import time
+from functools import wraps
+from typing import Callable, TypeVar, Optional, Concatenate, ParamSpec, Awaitable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from databaseui.database.db_manager import DatabaseManager
+from databaseui.database.db_types import DBCredentials, PoolOptions
+from databaseui.database.metrics import QueryMetrics
+from databaseui.database.pool import InstrumentedAsyncQueuePool, PoolMonitor, PoolStatistics
+from databaseui.threads.task_context import current_task
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+# Async MySQL drivers SQLAlchemy has a dialect for, by module name
+ASYNC_DRIVERS = ('aiomysql', 'asyncmy')
+
+
+def async_mode_available(driver: str) -> bool:
+    """
+    The asyncio execution mode needs the async driver, and qasync to run asyncio on the Qt event loop.
+    Both are optional dependencies.
+    :param driver: Async driver module name
+    :return: True if everything needed is installed
+    """
+    return (driver in ASYNC_DRIVERS and importlib.util.find_spec(driver) is not None
+            and importlib.util.find_spec('qasync') is not None)
+
+
+def with_async_session(func: Callable[Concatenate[Session, P], R]) -> Callable[P, Awaitable[Optional[R]]]:
+    """
+    Asyncio counterpart of `with_session`, for the same synchronous function body.
+    The body runs with `AsyncSession.run_sync`: it gets a regular `Session`, but every statement it executes awaits the
+    async driver, so many calls are multiplexed on the event loop thread instead of blocking one pool thread each.
+    Errors are handled, and calls are recorded in `QueryMetrics`, the same way as `with_session`. The call follows the
+    `TaskContext` of its `AsyncTask` like it follows a worker's: it is skipped once the task is cancelled, and the
+    connection it checks out gets the execution time limit of the task and is killed if the task is cancelled.
+    :param func: Function taking a session as first argument
+    :return: Coroutine function
+    """
+
+    @wraps(func)
+    async def wrapper(*args: P.args, **kwargs: P.kwargs) -> Optional[R]:
+        context = current_task()
+        if context is not None and context.is_cancelled():
+            print(f'{func.__name__} skipped, its task was cancelled')
+            return None
+        result: Optional[R]
+        rolled_back = False
+        AsyncDatabaseManager.reset_checkout_wait()
+        QueryMetrics.begin_call()
+        start = time.perf_counter()
+
+        async with AsyncDatabaseManager.new_session() as session:
+            try:
+                result = await session.run_sync(func, *args, **kwargs)
+                await session.commit()
+
+            except Exception as e:
+                result = None
+                rolled_back = True
+                await session.rollback()
+                if context is not None and context.is_cancelled():
+                    print(f'{func.__name__} cancelled')
+                else:
+                    print(f"Error: {e}")
+                    print(e)
+
+            finally:
+                QueryMetrics.end_call(func.__name__, time.perf_counter() - start, rolled_back,
+                                      AsyncDatabaseManager.checkout_wait())
+
+        return result
+
+    return wrapper
+
+
+class AsyncDatabaseManager:
+    """
+    Singleton manager of the asyncio engine, used by `with_async_session`. Only connected in the asyncio execution mode
+    """
+    _instance = None
+
+    _engine = None
+    _Session = None
+    _pool_monitor: PoolMonitor
+
+    def __new__(cls):
+        if cls._instance is None:
+            print('Creating AsyncDatabaseManager Singleton')
+            cls._instance = super(AsyncDatabaseManager, cls).__new__(cls)
+        return cls._instance
+
+    @staticmethod
+    def connect(credentials: DBCredentials, pool_options: Optional[PoolOptions] = None, driver: str = 'aiomysql'):
+        """
+        Create the async engine and session factory.
+        :param credentials: Database credentials
+        :param pool_options: Connection pool settings, or None for the defaults
+        :param driver: Async driver, one of `ASYNC_DRIVERS`
+        :return:
+        """
+        # Imported here, sqlalchemy.ext.asyncio needs greenlet which is only required for this mode
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+        if driver not in ASYNC_DRIVERS:
+            raise ValueError(f'Unknown async driver {driver}, expected one of {", ".join(ASYNC_DRIVERS)}')
+        self = AsyncDatabaseManager()
+        pool_options = pool_options or PoolOptions()
+        self._engine = create_async_engine(
+            (
+                f'mysql+{driver}://'
+                f'{credentials.user}:{credentials.passwd}@{credentials.host}/{credentials.db_name}'
+            ),
+            poolclass=InstrumentedAsyncQueuePool,
+            pool_size=pool_options.size,
+            max_overflow=pool_options.max_overflow,
+            pool_timeout=pool_options.timeout_s,
+            pool_recycle=pool_options.recycle_s,
+            pool_pre_ping=pool_options.pre_ping,
+        )
+        self._pool_monitor = PoolMonitor()
+        self._pool_monitor.attach(self._engine.pool)
+        # Events are registered on the synchronous facade of the engine, which is where they fire
+        event.listen(self._engine.sync_engine, 'connect', self._pool_monitor.record_connect)
+        event.listen(self._engine.sync_engine, 'checkin', self._pool_monitor.record_checkin)
+        # The checkout runs in the greenlet of `run_sync`, which sees the context of the task, so the time limit and the
+        # kill on cancel are applied the same way as on the threaded engine
+        event.listen(self._engine.sync_engine, 'checkout', DatabaseManager.on_checkout)
+        event.listen(self._engine.sync_engine, 'checkin', DatabaseManager.on_checkin)
+        event.listen(self._engine.sync_engine, 'after_cursor_execute', QueryMetrics.on_cursor_execute)
+        self._Session = async_sessionmaker(bind=self._engine, expire_on_commit=False)
+
+    @staticmethod
+    def is_connected() -> bool:
+        return AsyncDatabaseManager()._engine is not None
+
+    @staticmethod
+    def reset_checkout_wait():
+        AsyncDatabaseManager()._pool_monitor.reset_last_wait()
+
+    @staticmethod
+    def checkout_wait() -> float:
+        """
+        :return: Seconds the calling task waited for its last connection checkout
+        """
+        return AsyncDatabaseManager()._pool_monitor.last_wait_s()
+
+    @staticmethod
+    def pool_statistics() -> PoolStatistics:
+        self = AsyncDatabaseManager()
+        if self._engine is None:
+            raise RuntimeError('The async engine is not connected')
+        return self._pool_monitor.snapshot(self._engine.pool)
+
+    @staticmethod
+    def new_session():
+        return AsyncDatabaseManager()._Session()
+
+    @staticmethod
+    async def shutdown():
+        self = AsyncDatabaseManager()
+        if self._engine is not None:
+            await self._engine.dispose()
@@ -0,0 +1,162 @@
+"""
+Asyncio counterparts of the `query_manager` functions, for the asyncio execution mode.
+
+Functions wrapped by `with_session` reuse the exact same body through `with_async_session`, so the SQL and the row
+mapping are shared with the threaded path. Functions composed of several session calls (cached reference data, the
+paged patient load) are rewritten as coroutines around the async counterparts.
+"""
+from typing import Callable, Optional, Awaitable
+
+from databaseui.database import query_manager
+from databaseui.database.async_db_manager import with_async_session
+from databaseui.database.cache import ReferenceCache
+from databaseui.database.db_types import PatientPage
+from databaseui.database.query_manager import (CACHE_TREATMENTS, CACHE_DISEASES, CACHE_TESTS, CACHE_DOCTORS,
+                                               PATIENT_PAGE_SIZE, FIRST_PATIENT_PAGE_SIZE, progress_percent)
+from databaseui.signals.signal_manager import SignalManager
+from databaseui.threads.async_task import AsyncTask
+from databaseui.threads.task_context import CancellationToken, Priority, TaskContext
+
+
+def run_async(fn: Callable[..., Awaitable], *args, priority: Priority = Priority.INTERACTIVE,
+              token: Optional[CancellationToken] = None, max_statement_ms: Optional[int] = None,
+              **kwargs) -> AsyncTask:
+    """
+    Counterpart of `run_in_pool`, schedules a coroutine function on the running event loop
+    :param fn: Coroutine function to run
+    :param args: Positional arguments to pass to the function
+    :param priority: Priority of the task. Tasks are not queued, it selects the default statement time limit
+    :param token: Token to cancel the task with
+    :param max_statement_ms: Server side execution time limit of the read statements, see `run_in_pool`
+    :param kwargs: Keyword arguments to pass to the function
+    :return: A task with the same signals as a worker
+    """
+    task = AsyncTask(fn, *args, **kwargs)
+    task.context = TaskContext(priority, token, max_statement_ms)
+    return task.start()
+
+
+def run_async_progress(fn: Callable[..., Awaitable], *args, priority: Priority = Priority.INTERACTIVE,
+                       token: Optional[CancellationToken] = None, max_statement_ms: Optional[int] = None,
+                       **kwargs) -> AsyncTask:
+    """
+    Counterpart of `run_in_pool_progress`, the coroutine function is passed the task's progress signal
+    """
+    task = AsyncTask(fn, *args, progress=True, **kwargs)
+    task.context = TaskContext(priority, token, max_statement_ms)
+    return task.start()
+
+
+def _counterpart(func: Callable) -> Callable[..., Awaitable]:
+    # `with_session` keeps the undecorated function in __wrapped__
+    return with_async_session(getattr(func, '__wrapped__'))
+
+
+fetch_all_treatments = _counterpart(query_manager.fetch_all_treatments)
+fetch_all_tests = _counterpart(query_manager.fetch_all_tests)
+fetch_all_diseases = _counterpart(query_manager.fetch_all_diseases)
+fetch_all_doctors = _counterpart(query_manager.fetch_all_doctors)
+fetch_patient_page = _counterpart(query_manager.fetch_patient_page)
+count_patients = _counterpart(query_manager.count_patients)
+get_department_statistics = _counterpart(query_manager.get_department_statistics)
+get_patient = _counterpart(query_manager.get_patient)
+search_patients = _counterpart(query_manager.search_patients)
+update_patient_information = _counterpart(query_manager.update_patient_information)
+get_all_availability = _counterpart(query_manager.get_all_availability)
+get_appointments = _counterpart(query_manager.get_appointments)
+get_day_appointments = _counterpart(query_manager.get_day_appointments)
+get_tests_for_patient = _counterpart(query_manager.get_tests_for_patient)
+create_diagnosis = _counterpart(query_manager.create_diagnosis)
+create_new_patient = _counterpart(query_manager.create_new_patient)
+create_room_assignment = _counterpart(query_manager.create_room_assignment)
+order_lab_test = _counterpart(query_manager.order_lab_test)
+order_prescription = _counterpart(query_manager.order_prescription)
+make_appointment = _counterpart(query_manager.make_appointment)
+make_appointments = _counterpart(query_manager.make_appointments)
+update_appointment_status = _counterpart(query_manager.update_appointment_status)
+update_appointment_statuses = _counterpart(query_manager.update_appointment_statuses)
+rebook_appointments = _counterpart(query_manager.rebook_appointments)
+update_test_status = _counterpart(query_manager.update_test_status)
+get_diagnoses_for_patient = _counterpart(query_manager.get_diagnoses_for_patient)
+get_patient_chart = _counterpart(query_manager.get_patient_chart)
+add_comments = _counterpart(query_manager.add_comments)
+
+
+async def _get_reference_data(key: str, fetch: Callable[[], Awaitable[Optional[list]]],
+                              force: bool) -> Optional[list]:
+    """
+    Async counterpart of `query_manager._get_reference_data`, sharing the same `ReferenceCache`
+    """
+    if not force:
+        cached = ReferenceCache.get(key)
+        if cached is not None:
+            return cached
+    rows = await fetch()
+    if rows is not None:
+        ReferenceCache.put(key, rows)
+    return rows
+
+
+async def get_all_treatments(force: bool = False):
+    treatments = await _get_reference_data(CACHE_TREATMENTS, fetch_all_treatments, force)
+    if treatments is None:
+        return
+    print(f'Got {len(treatments)} treatments')
+    SignalManager().treatments_received.emit(treatments)
+    return treatments
+
+
+async def get_all_tests(force: bool = False):
+    tests = await _get_reference_data(CACHE_TESTS, fetch_all_tests, force)
+    if tests is None:
+        return
+    print(f'Got {len(tests)} tests')
+    SignalManager().tests_received.emit(tests)
+    return tests
+
+
+async def get_all_diseases(force: bool = False):
+    diseases = await _get_reference_data(CACHE_DISEASES, fetch_all_diseases, force)
+    if diseases is None:
+        return
+    print(f'Got {len(diseases)} diseases')
+    SignalManager().diseases_received.emit(diseases)
+    return diseases
+
+
+async def get_all_doctors(force: bool = False):
+    doctors = await _get_reference_data(CACHE_DOCTORS, fetch_all_doctors, force)
+    if doctors is None:
+        return
+    print(f'Got {len(doctors)} doctors')
+    SignalManager().doctors_received.emit(doctors)
+    return doctors
+
+
+async def get_all_patients(last_patient_id: int = -1, after_id: int = -1, page_size: int = PATIENT_PAGE_SIZE,
+                           progress_callback=None) -> Optional[int]:
+    """
+    Async counterpart of `query_manager.get_all_patients`. Pages are emitted as they arrive, and the event loop stays
+    free to run other queries between pages.
+    :return: The cursor after the last page, None if the load stopped early
+    """
+    expected = await count_patients(after_id) if progress_callback is not None else None
+    cursor = after_id
+    total = 0
+    size = min(page_size, FIRST_PATIENT_PAGE_SIZE)
+    while True:
+        patients = await fetch_patient_page(cursor, size)
+        if patients is None:
+            print(f'Stopped loading patients at cursor {cursor}')
+            return None
+        total += len(patients)
+        done = len(patients) < size
+        next_cursor = patients[-1].id if patients else cursor
+        SignalManager().patients_received.emit(PatientPage(patients, cursor, next_cursor, done), last_patient_id)
+        if progress_callback is not None:
+            progress_callback.emit(100 if done else progress_percent(total, expected))
+        cursor = next_cursor
+        size = page_size
+        if done:
+            print(f'Got {total} patients')
+            return cursor
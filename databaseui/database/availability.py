@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, date, time, timedelta
+from typing import Any, Iterable, Optional, Sequence
+
+from databaseui.database.db_types import Availability, split_aggregate
+
+# Appointments are booked in one hour slots
+SLOT = timedelta(hours=1)
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# Format of appointment times, as stored in the appointment table
+SLOT_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_slot(value: datetime | str) -> datetime:
+    """
+    :param value: Appointment time, as a datetime or in `SLOT_FORMAT`
+    :return: The slot start
+    """
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def format_slot(slot: datetime) -> str:
+    return slot.strftime(SLOT_FORMAT)
+
+
+def _time_of_day(value: datetime | time | timedelta) -> time:
+    # TIME columns are returned as timedelta by the driver
+    if isinstance(value, timedelta):
+        return (datetime.min + value).time()
+    if isinstance(value, datetime):
+        return value.time()
+    return value
+
+
+@dataclass(frozen=True, slots=True)
+class _Window:
+    """
+    A daily working window of a doctor on one weekday, starting at `start` for `hours` one hour slots
+    """
+    start: time
+    hours: int
+    effective_from: Optional[date]
+
+
+class DoctorSchedule:
+    """
+    Slot start times of one doctor per weekday, each with the date it applies from, and the booked slots, all in
+    sorted lists. Checking a slot is a binary search, and listing the free slots between two times walks the slot times
+    of each day in the range next to the bookings from the range start, so it is O(slots + bookings in the range).
+    """
+    __slots__ = ('_slots', '_booked')
+
+    def __init__(self):
+        # Per weekday, sorted (start time, effective from) pairs, `date.min` when the window has no start date
+        self._slots: tuple[list[tuple[time, date]], ...] = tuple([] for _ in WEEKDAYS)
+        self._booked: list[datetime] = []
+
+    def add_window(self, weekday: int, window: _Window) -> None:
+        start = timedelta(hours=window.start.hour, minutes=window.start.minute, seconds=window.start.second)
+        for hour in range(window.hours):
+            # A window running past midnight carries on into the next weekday
+            days, offset = divmod(start + hour * SLOT, timedelta(days=1))
+            effective_from = date.min
+            if window.effective_from is not None:
+                effective_from = window.effective_from + timedelta(days=days)
+            slots = self._slots[(weekday + days) % len(WEEKDAYS)]
+            entry = ((datetime.min + offset).time(), effective_from)
+            i = bisect_left(slots, entry)
+            if i == len(slots) or slots[i] != entry:
+                slots.insert(i, entry)
+
+    def is_available(self, slot: datetime) -> bool:
+        """
+        :return: True if the slot is inside one of the doctor's windows, booked or not
+        """
+        slots = self._slots[slot.weekday()]
+        at = slot.time()
+        i = bisect_left(slots, (at, date.min))
+        while i < len(slots) and slots[i][0] == at:
+            if slots[i][1] <= slot.date():
+                return True
+            i += 1
+        return False
+
+    def is_booked(self, slot: datetime) -> bool:
+        i = bisect_left(self._booked, slot)
+        return i < len(self._booked) and self._booked[i] == slot
+
+    def is_free(self, slot: datetime) -> bool:
+        return not self.is_booked(slot) and self.is_available(slot)
+
+    def free_slots(self, start: datetime, end: datetime, limit: Optional[int] = None) -> list[datetime]:
+        """
+        Free slots starting in [start, end), in order
+        :param start: Range start
+        :param end: Range end
+        :param limit: Maximum number of slots to return
+        :return: Slot starts
+        """
+        free: list[datetime] = []
+        booked = bisect_left(self._booked, start)
+        day = start.date()
+        while datetime.combine(day, time.min) < end:
+            slots = self._slots[day.weekday()]
+            first = bisect_left(slots, (start.time(), date.min)) if day == start.date() else 0
+            last = bisect_left(slots, (end.time(), date.min)) if day == end.date() else len(slots)
+            for at, effective_from in slots[first:last]:
+                slot = datetime.combine(day, at)
+                # Windows with different start dates can share a slot time
+                if effective_from > day or (free and free[-1] == slot):
+                    continue
+                while booked < len(self._booked) and self._booked[booked] < slot:
+                    booked += 1
+                if booked < len(self._booked) and self._booked[booked] == slot:
+                    continue
+                free.append(slot)
+                if limit is not None and len(free) >= limit:
+                    return free
+            day += timedelta(days=1)
+        return free
+
+    def book(self, slot: datetime) -> bool:
+        """
+        :return: False if the slot was already booked
+        """
+        i = bisect_left(self._booked, slot)
+        if i < len(self._booked) and self._booked[i] == slot:
+            return False
+        self._booked.insert(i, slot)
+        return True
+
+    def release(self, slot: datetime) -> None:
+        i = bisect_left(self._booked, slot)
+        if i < len(self._booked) and self._booked[i] == slot:
+            del self._booked[i]
+
+
+class AvailabilityIndex:
+    """
+    In memory index of every doctor's availability and bookings, built from the availability table and the booked
+    appointment times. Lets the UI list free slots and reject double bookings without a round trip; the
+    ScheduleAppointment procedure stays the authority, the index only avoids sending requests that are bound to fail.
+    Not thread safe, it is owned by the GUI thread once built.
+    """
+
+    def __init__(self):
+        self._schedules: dict[int, DoctorSchedule] = {}
+
+    @classmethod
+    def build(cls, availability: Iterable[Availability],
+              booked: Iterable[Sequence[Any]]) -> AvailabilityIndex:
+        """
+        :param availability: Availability rows
+        :param booked: (doctor id, appointment time) rows of the booked appointments
+        :return: The index
+        """
+        index = cls()
+        for row in availability:
+            schedule = index._schedules.setdefault(row.doctor_id, DoctorSchedule())
+            effective_from = row.dates.date() if isinstance(row.dates, datetime) else row.dates
+            window = _Window(_time_of_day(row.start_time), row.duration_h, effective_from)
+            for day in split_aggregate(row.days_available):
+                weekday = WEEKDAYS.index(day[:3].lower()) if day[:3].lower() in WEEKDAYS else None
+                if weekday is None:
+                    print(f'Unknown day {day!r} in availability {row.id}')
+                    continue
+                schedule.add_window(weekday, window)
+        for doctor_id, slot in booked:
+            index._schedules.setdefault(doctor_id, DoctorSchedule()).book(parse_slot(slot))
+        return index
+
+    def doctors(self) -> list[int]:
+        return list(self._schedules.keys())
+
+    def free_slots(self, doctor_id: int, start: datetime, end: datetime, limit: Optional[int] = None) -> list[datetime]:
+        schedule = self._schedules.get(doctor_id)
+        return schedule.free_slots(start, end, limit) if schedule is not None else []
+
+    def is_free(self, doctor_id: int, slot: datetime | str) -> bool:
+        schedule = self._schedules.get(doctor_id)
+        return schedule is not None and schedule.is_free(parse_slot(slot))
+
+    def book(self, doctor_id: int, slot: datetime | str) -> bool:
+        """
+        Record a booking, e.g. once an appointment was made
+        :return: False if the slot was already booked
+        """
+        return self._schedules.setdefault(doctor_id, DoctorSchedule()).book(parse_slot(slot))
+
+    def release(self, doctor_id: int, slot: datetime | str) -> None:
+        schedule = self._schedules.get(doctor_id)
+        if schedule is not None:
+            schedule.release(parse_slot(slot))
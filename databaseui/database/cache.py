@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, SessionTransaction
+
+# Reference data (treatments, diseases, lab tests, doctors) rarely changes, so by default we keep it for 15 minutes
+DEFAULT_TTL_S = 15 * 60
+
+# Key of the cache keys to drop once the transaction commits, in the `info` dict of a session
+PENDING_INVALIDATIONS_KEY = 'pending_cache_invalidations'
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    stored_at: float
+    ttl_s: float
+
+    def is_fresh(self, now: float) -> bool:
+        return now - self.stored_at < self.ttl_s
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+@dataclass
+class _KeyStats:
+    per_key: Dict[str, CacheStats] = field(default_factory=dict)
+
+    def get(self, key: str) -> CacheStats:
+        return self.per_key.setdefault(key, CacheStats())
+
+
+class ReferenceCache:
+    """
+    Singleton in-process cache for reference data that almost never changes.
+    Entries expire after their TTL, and can be invalidated explicitly (e.g. after a write that affects them).
+    Queries run on pool threads, so every access is guarded by a lock.
+    """
+    _instance = None
+
+    _lock: threading.Lock
+    _entries: Dict[str, CacheEntry]
+    _ttls: Dict[str, float]
+    _default_ttl_s: float
+    _stats: _KeyStats
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ReferenceCache, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._entries = {}
+            cls._instance._ttls = {}
+            cls._instance._default_ttl_s = DEFAULT_TTL_S
+            cls._instance._stats = _KeyStats()
+        return cls._instance
+
+    @staticmethod
+    def configure(default_ttl_s: Optional[float] = None, **ttls: float) -> None:
+        """
+        Set the default TTL and/or per key TTLs, e.g. `configure(doctors=60)`
+        :param default_ttl_s: TTL for keys without their own TTL
+        :param ttls: Per key TTLs in seconds
+        :return:
+        """
+        self = ReferenceCache()
+        with self._lock:
+            if default_ttl_s is not None:
+                self._default_ttl_s = default_ttl_s
+            self._ttls.update(ttls)
+
+    @staticmethod
+    def get(key: str) -> Optional[Any]:
+        """
+        Get a fresh value from the cache, counting a hit or a miss
+        :param key: Cache key
+        :return: The cached value, or None if it is missing or expired
+        """
+        self = ReferenceCache()
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats.get(key)
+            entry = self._entries.get(key)
+            if entry is None or not entry.is_fresh(now):
+                stats.misses += 1
+                return None
+            stats.hits += 1
+            return entry.value
+
+    @staticmethod
+    def put(key: str, value: Any) -> None:
+        self = ReferenceCache()
+        with self._lock:
+            ttl = self._ttls.get(key, self._default_ttl_s)
+            self._entries[key] = CacheEntry(value, time.monotonic(), ttl)
+
+    @staticmethod
+    def invalidate(*keys: str) -> None:
+        """
+        Drop entries from the cache so the next read goes to the database.
+        :param keys: Keys to drop. If none are given, the whole cache is cleared
+        :return:
+        """
+        self = ReferenceCache()
+        with self._lock:
+            for key in keys or tuple(self._entries.keys()):
+                if self._entries.pop(key, None) is not None:
+                    self._stats.get(key).invalidations += 1
+
+    @staticmethod
+    def invalidate_on_commit(session: Session, *keys: str) -> None:
+        """
+        Drop entries once the session's transaction commits, for writes that affect them. Dropping them before the
+        commit would let a read on another connection cache the rows from before the write again. Nothing is dropped if
+        the transaction rolls back.
+        :param session: Session running the write
+        :param keys: Keys to drop
+        :return:
+        """
+        session.info.setdefault(PENDING_INVALIDATIONS_KEY, set()).update(keys)
+
+    @staticmethod
+    def stats() -> Dict[str, CacheStats]:
+        """
+        Snapshot of the hit/miss counters for every key that has been accessed
+        :return: Copy of the counters, keyed by cache key
+        """
+        self = ReferenceCache()
+        with self._lock:
+            return {k: CacheStats(v.hits, v.misses, v.invalidations) for k, v in self._stats.per_key.items()}
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session: Session) -> None:
+    keys = session.info.pop(PENDING_INVALIDATIONS_KEY, None)
+    if keys:
+        ReferenceCache.invalidate(*keys)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_rolled_back(session: Session, transaction: SessionTransaction) -> None:
+    # Runs after `after_commit` for a commit, so only the keys of a rolled back transaction are left
+    if transaction.parent is None:
+        session.info.pop(PENDING_INVALIDATIONS_KEY, None)
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from array import array
+from dataclasses import fields
+from typing import Any, Generic, Iterable, Iterator, Sequence, TypeVar, get_type_hints
+
+T = TypeVar("T")
+
+
+class RowView(Generic[T]):
+    """
+    Lightweight view of one row of a `ColumnarRows`. Attributes are read from the columns on access, so a view costs
+    two references no matter how many columns the row has.
+    """
+    __slots__ = ('_rows', '_index')
+
+    def __init__(self, rows: ColumnarRows[T], index: int):
+        self._rows = rows
+        self._index = index
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            column = self._rows.column(name)
+        except KeyError:
+            raise AttributeError(name) from None
+        return column[self._index]
+
+    def materialize(self) -> T:
+        """
+        :return: The row as an instance of the row type
+        """
+        return self._rows.row_type(*(self._rows.column(name)[self._index] for name in self._rows.names))
+
+    def __repr__(self) -> str:
+        return f'RowView({self.materialize()!r})'
+
+
+class ColumnarRows(Generic[T]):
+    """
+    Column oriented container for query results. Every column is stored as one sequence instead of one object per row:
+    integer columns without NULLs are packed into an `array`, and repeated strings (sex, gender, status, ...) are
+    shared between rows. Indexing returns a `RowView`, `to_rows` materializes row type instances when needed.
+    The query functions return slotted row type instances instead: the UI models, search indexes and type checks of
+    the selected rows need them, so a columnar result would be materialized again on arrival. `ColumnarRows` is kept
+    as the compact representation `scripts.benchmark_row_memory` measures them against.
+    """
+
+    def __init__(self, row_type: type[T], columns: dict[str, Sequence[Any]]):
+        self.row_type = row_type
+        self.names = tuple(columns.keys())
+        self._columns = columns
+        self._length = len(next(iter(columns.values()))) if columns else 0
+
+    @classmethod
+    def from_rows(cls, row_type: type[T], rows: Iterable[Sequence[Any]]) -> ColumnarRows[T]:
+        """
+        Build the columns from result rows, in the field order of the row type
+        :param row_type: Dataclass the rows map to
+        :param rows: Result rows (e.g. a SQLAlchemy `Result`)
+        :return: Columnar container
+        """
+        names = [f.name for f in fields(row_type) if f.init]  # type: ignore[arg-type]
+        hints = get_type_hints(row_type)
+        values: list[list[Any]] = [[] for _ in names]
+        appends = [v.append for v in values]
+        for row in rows:
+            for append, value in zip(appends, row):
+                append(value)
+        return cls(row_type, {name: cls._compact(hints.get(name), column) for name, column in zip(names, values)})
+
+    @staticmethod
+    def _compact(hint: Any, column: list[Any]) -> Sequence[Any]:
+        if hint is int:
+            try:
+                return array('q', column)
+            except (TypeError, OverflowError):
+                # NULLs in the column, keep it as a list
+                return column
+        # Share equal strings, low cardinality columns then only hold a handful of string objects
+        shared: dict[str, str] = {}
+        return [shared.setdefault(v, v) if isinstance(v, str) else v for v in column]
+
+    def column(self, name: str) -> Sequence[Any]:
+        return self._columns[name]
+
+    def to_rows(self) -> list[T]:
+        return [self.row_type(*values) for values in zip(*(self._columns[name] for name in self.names))]
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int) -> RowView[T]:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return RowView(self, index)
+
+    def __iter__(self) -> Iterator[RowView[T]]:
+        return (RowView(self, i) for i in range(self._length))
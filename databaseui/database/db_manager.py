@@ -1,31 +1,75 @@
 from __future__ import annotations
 
+import threading
+import time
 from functools import wraps
-from typing import Callable, TypeVar, Optional, Concatenate, ParamSpec
+from typing import Any, Callable, TypeVar, Optional, Concatenate, ParamSpec
 
-from sqlalchemy import create_engine, Engine
+from sqlalchemy import create_engine, Engine, Connection, event
 from sqlalchemy.orm import sessionmaker, Session, scoped_session
+from sqlalchemy.pool import ConnectionPoolEntry
 
-from databaseui.database.db_types import DBCredentials
+from databaseui.database.db_types import DBCredentials, PoolOptions
+from databaseui.database.metrics import QueryMetrics
+from databaseui.database.pool import InstrumentedQueuePool, PoolMonitor, PoolStatistics
+from databaseui.threads.task_context import TaskContext, Priority, current_task
 
 P = ParamSpec("P")
 R = TypeVar("R")
 
 
+class _QueryKiller:
+    """
+    Kills the statement running on a connection when the task using it is cancelled. The kill runs on its own thread,
+    so cancelling never blocks the GUI thread, and holds a lock the task takes before it gives the connection back to
+    the pool, so a late kill never hits the next user of the connection.
+    """
+
+    def __init__(self, connection_id: int):
+        self._connection_id = connection_id
+        self._lock = threading.Lock()
+        self._attached = True
+
+    def kill(self) -> None:
+        threading.Thread(target=self._kill, daemon=True).start()
+
+    def _kill(self) -> None:
+        with self._lock:
+            if self._attached:
+                DatabaseManager.kill_query(self._connection_id)
+
+    def detach(self) -> None:
+        with self._lock:
+            self._attached = False
+
+
 def with_session(func: Callable[Concatenate[Session, P], R]) -> Callable[P, Optional[R]]:
     """
     Decorator to wrap a function with a session handler.
     Database connections don't generally play well with multithreading, so we utilize SQLAlchemy Sessions.
     This wrapper will get a session, run the wrapped function (while handling errors), and then close the session after.
+    Sessions are scoped to the thread, so pool threads keep reusing their own session between calls.
+    Every call is recorded in `QueryMetrics` (latency, rows, rollbacks and pool wait time).
+    Inside a worker, the call follows the worker's `TaskContext`: it is skipped once the task is cancelled, and the
+    connection it checks out gets the execution time limit of the task and is killed if the task is cancelled (see
+    `DatabaseManager.on_checkout`).
     :param func: Wrapped function
     :return:
     """
 
     @wraps(func)
     def wrapper(*args: P.args, **kwargs: P.kwargs) -> Optional[R]:
+        context = current_task()
+        if context is not None and context.is_cancelled():
+            print(f'{func.__name__} skipped, its task was cancelled')
+            return None
         # Create a new session
         session = DatabaseManager.new_session()
         result: Optional[R]
+        rolled_back = False
+        DatabaseManager.reset_checkout_wait()
+        QueryMetrics.begin_call()
+        start = time.perf_counter()
 
         try:
             # Call the original function with the session
@@ -37,13 +81,20 @@ def with_session(func: Callable[Concatenate[Session, P], R]) -> Callable[P, Opti
         except Exception as e:
             # Handle exceptions (rollback the transaction, log, etc.)
             result = None
+            rolled_back = True
             session.rollback()
-            print(f"Error: {e}")
-            print(e)
+            if context is not None and context.is_cancelled():
+                print(f'{func.__name__} cancelled')
+            else:
+                print(f"Error: {e}")
+                print(e)
 
         finally:
-            # Remove the session to release resources
-            DatabaseManager.remove()
+            # Close the session to return its connection to the pool. The session object stays registered to this
+            # thread, so the next call on this pool thread reuses it instead of building a new one
+            session.close()
+            QueryMetrics.end_call(func.__name__, time.perf_counter() - start, rolled_back,
+                                  DatabaseManager.checkout_wait())
 
         return result
 
@@ -58,6 +109,11 @@ class DatabaseManager:
 
     _engine: Engine
     _Session: scoped_session[Session]
+    _pool_monitor: PoolMonitor
+    # Engine of the connection used to kill statements, outside the pool so a kill never waits for a checkout
+    _kill_engine: Engine
+    # Default server side execution time limit of read statements per task priority, 0 for none
+    _max_statement_ms: dict[Priority, int] = {Priority.INTERACTIVE: 0, Priority.BACKGROUND: 0}
 
     def __new__(cls):
         if cls._instance is None:
@@ -66,13 +122,170 @@ class DatabaseManager:
         return cls._instance
 
     @staticmethod
-    def connect(credentials: DBCredentials):
+    def connect(credentials: DBCredentials, pool_options: Optional[PoolOptions] = None):
+        """
+        Create the engine and session factory.
+        :param credentials: Database credentials
+        :param pool_options: Connection pool settings, or None for the defaults
+        :return:
+        """
         self = DatabaseManager()
-        self._engine = create_engine((
-            'mysql+mysqlconnector://'
-            f'{credentials.user}:{credentials.passwd}@{credentials.host}/{credentials.db_name}'
-        ))
+        pool_options = pool_options or PoolOptions()
+        url = f'mysql+mysqlconnector://{credentials.user}:{credentials.passwd}@{credentials.host}/{credentials.db_name}'
+        self._engine = create_engine(
+            url,
+            poolclass=InstrumentedQueuePool,
+            pool_size=pool_options.size,
+            max_overflow=pool_options.max_overflow,
+            pool_timeout=pool_options.timeout_s,
+            pool_recycle=pool_options.recycle_s,
+            pool_pre_ping=pool_options.pre_ping,
+        )
+        self._pool_monitor = PoolMonitor()
+        self._pool_monitor.attach(self._engine.pool)
+        event.listen(self._engine, 'connect', self._pool_monitor.record_connect)
+        event.listen(self._engine, 'checkin', self._pool_monitor.record_checkin)
+        event.listen(self._engine, 'checkout', DatabaseManager.on_checkout)
+        event.listen(self._engine, 'checkin', DatabaseManager.on_checkin)
+        event.listen(self._engine, 'after_cursor_execute', QueryMetrics.on_cursor_execute)
         self._Session = scoped_session(sessionmaker(bind=self._engine))
+        self._kill_engine = create_engine(url, pool_size=1, max_overflow=0)
+        if pool_options.prewarm > 0:
+            DatabaseManager.prewarm(min(pool_options.prewarm, pool_options.size))
+
+    @staticmethod
+    def prewarm(count: int):
+        """
+        Open `count` connections at once and return them to the pool, so the first queries after startup don't have
+        to pay for the TCP and authentication handshakes.
+        :param count: Number of connections to open
+        :return:
+        """
+        self = DatabaseManager()
+        connections: list[Connection] = []
+        lock = threading.Lock()
+
+        def open_connection():
+            try:
+                connection = self._engine.connect()
+            except Exception as e:
+                print(f'Error pre-warming connection pool: {e}')
+                return
+            with lock:
+                connections.append(connection)
+
+        threads = [threading.Thread(target=open_connection) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for connection in connections:
+            connection.close()
+        print(f'Pre-warmed {len(connections)} connections')
+
+    @staticmethod
+    def configure_statement_timeouts(interactive_ms: Optional[int] = None, background_ms: Optional[int] = None):
+        """
+        :param interactive_ms: Default execution time limit of the read statements of interactive tasks, 0 for none
+        :param background_ms: Default execution time limit of the read statements of background tasks, 0 for none
+        """
+        if interactive_ms is not None:
+            DatabaseManager._max_statement_ms[Priority.INTERACTIVE] = interactive_ms
+        if background_ms is not None:
+            DatabaseManager._max_statement_ms[Priority.BACKGROUND] = background_ms
+
+    @staticmethod
+    def statement_limit_ms(context: Optional[TaskContext]) -> int:
+        """
+        :param context: Task running on this thread, None outside of a worker
+        :return: Execution time limit of the task's statements, 0 for none
+        """
+        if context is None:
+            return 0
+        if context.max_statement_ms is not None:
+            return context.max_statement_ms
+        return DatabaseManager._max_statement_ms[context.priority]
+
+    @staticmethod
+    def on_checkout(dbapi_connection: Any, connection_record: ConnectionPoolEntry, _connection_proxy: Any) -> None:
+        """
+        Pool checkout listener, applies the task running on this thread to the connection it checks out, before any
+        transaction is begun: the execution time limit of the task is set on the connection if it changed (it stays
+        set on the pooled connection), and cancelling the task kills the statement running on the connection until it
+        is checked in.
+        MariaDB limits every statement with `max_statement_time` (in seconds). MySQL only limits read only SELECT
+        statements with `max_execution_time` (in milliseconds), writes are never cut off there.
+        """
+        context = current_task()
+        limit = DatabaseManager.statement_limit_ms(context)
+        info = connection_record.info
+        if info.get('max_statement_ms', 0) != limit:
+            if getattr(DatabaseManager()._engine.dialect, 'is_mariadb', False):
+                statement = f'SET SESSION max_statement_time = {limit / 1000:.3f}'
+            else:
+                statement = f'SET SESSION max_execution_time = {int(limit)}'
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute(statement)
+            finally:
+                cursor.close()
+            info['max_statement_ms'] = limit
+        if context is not None and context.token is not None:
+            if 'connection_id' not in info:
+                cursor = dbapi_connection.cursor()
+                try:
+                    cursor.execute('SELECT CONNECTION_ID()')
+                    info['connection_id'] = cursor.fetchone()[0]
+                finally:
+                    cursor.close()
+            killer = _QueryKiller(info['connection_id'])
+            info['killer'] = (killer, context.token.on_cancel(killer.kill))
+
+    @staticmethod
+    def on_checkin(_dbapi_connection: Any, connection_record: ConnectionPoolEntry) -> None:
+        """
+        Pool checkin listener, detaches the kill of the task that used the connection, so a late cancellation never
+        kills the statement of the next user of the connection
+        """
+        entry: Optional[tuple[_QueryKiller, Callable[[], None]]] = connection_record.info.pop('killer', None)
+        if entry is not None:
+            killer, unregister = entry
+            unregister()
+            killer.detach()
+
+    @staticmethod
+    def kill_query(connection_id: int):
+        """
+        Kill the statement running on a connection, the connection itself stays open
+        :param connection_id: Server side id of the connection
+        :return:
+        """
+        try:
+            with DatabaseManager()._kill_engine.connect() as connection:
+                connection.exec_driver_sql(f'KILL QUERY {int(connection_id)}')
+            print(f'Killed the query of connection {connection_id}')
+        except Exception as e:
+            print(f'Error killing the query of connection {connection_id}: {e}')
+
+    @staticmethod
+    def reset_checkout_wait():
+        DatabaseManager()._pool_monitor.reset_last_wait()
+
+    @staticmethod
+    def checkout_wait() -> float:
+        """
+        :return: Seconds the calling thread waited for its last connection checkout
+        """
+        return DatabaseManager()._pool_monitor.last_wait_s()
+
+    @staticmethod
+    def pool_statistics() -> PoolStatistics:
+        """
+        Checkout and wait statistics of the connection pool, to help size it for the workload
+        :return: Snapshot of the pool statistics
+        """
+        self = DatabaseManager()
+        return self._pool_monitor.snapshot(self._engine.pool)
 
     @staticmethod
     def new_session() -> Session:
@@ -84,4 +297,6 @@ class DatabaseManager:
 
     @staticmethod
     def shutdown():
-        DatabaseManager()._engine.dispose()
+        self = DatabaseManager()
+        self._engine.dispose()
+        self._kill_engine.dispose()
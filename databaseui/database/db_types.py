@@ -1,6 +1,39 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional
+from typing import Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def split_aggregate(value: Optional[str]) -> tuple[str, ...]:
+    """
+    Split a comma concatenated aggregate column (GROUP_CONCAT) into its items
+    :param value: Aggregate string, or None if there are no items
+    :return: The items
+    """
+    if not value:
+        return ()
+    return tuple(item for item in (part.strip() for part in value.split(',')) if item)
+
+
+class ParsedAggregates:
+    """
+    Mixin for rows with comma concatenated aggregate columns. Each aggregate is split the first time it is read and
+    the result is cached on the row, until the raw column is replaced.
+    """
+    __slots__ = ()
+    _parsed: Optional[dict[str, tuple[Optional[str], tuple[str, ...]]]]
+
+    def _aggregate(self, name: str) -> tuple[str, ...]:
+        raw = getattr(self, name)
+        if self._parsed is None:
+            # The slot is declared by the dataclasses using the mixin
+            self._parsed = {}  # type: ignore[misc]
+        cached = self._parsed.get(name)
+        if cached is None or cached[0] is not raw:
+            cached = (raw, split_aggregate(raw))
+            self._parsed[name] = cached
+        return cached[1]
 
 
 @dataclass
@@ -12,20 +45,30 @@ class DBCredentials:
 
 
 @dataclass
+class PoolOptions:
+    size: int = 5
+    max_overflow: int = 10
+    timeout_s: float = 30.0
+    recycle_s: int = -1
+    pre_ping: bool = False
+    prewarm: int = 0
+
+
+@dataclass(slots=True)
 class Treatment:
     id: int
     name: str
     generic_id: Optional[int]
 
 
-@dataclass
+@dataclass(slots=True)
 class Disease:
     id: int
     name: str
     description: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Diagnosis:
     patient_id: int
     doctor_id: int
@@ -34,20 +77,20 @@ class Diagnosis:
     comments: str
 
 
-@dataclass
+@dataclass(slots=True)
 class NamedDiagnosis(Diagnosis):
     disease_name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Person:
     id: int
     first_name: str
     last_name: str
 
 
-@dataclass
-class Patient:
+@dataclass(slots=True)
+class Patient(ParsedAggregates):
     id: int
     person_id: int
     gender: str
@@ -61,15 +104,57 @@ class Patient:
     treatments: Optional[str]
     tests: Optional[str]
     appts: Optional[str]
+    _parsed: Optional[dict] = field(default=None, init=False, repr=False, compare=False)
 
+    @property
+    def diagnosis_names(self) -> tuple[str, ...]:
+        return self._aggregate('diagnoses')
 
-@dataclass
+    @property
+    def treatment_names(self) -> tuple[str, ...]:
+        return self._aggregate('treatments')
+
+    @property
+    def test_names(self) -> tuple[str, ...]:
+        return self._aggregate('tests')
+
+    @property
+    def appointment_times(self) -> tuple[str, ...]:
+        return self._aggregate('appts')
+
+
+@dataclass(slots=True)
 class NamedPatient(Patient):
     first_name: str
     last_name: str
 
 
 @dataclass
+class PatientPage:
+    """
+    One keyset page of `patient_info`. Pages are ordered by patient id, `after_id` is the cursor the page was read from
+    and `next_cursor` can be passed back to resume loading after this page.
+    """
+    patients: list[NamedPatient]
+    after_id: int
+    next_cursor: int
+    done: bool
+
+
+@dataclass
+class PatientSearchPage:
+    """
+    One keyset page of server side patient search results, ordered by patient id. `text` is the search text, pass
+    `next_cursor` back to read the page after this one.
+    """
+    text: str
+    patients: list[NamedPatient]
+    after_id: int
+    next_cursor: int
+    done: bool
+
+
+@dataclass(slots=True)
 class BaseDoctor:
     id: int
     person_id: str
@@ -77,16 +162,21 @@ class BaseDoctor:
     specialty_id: str
 
 
-@dataclass
-class Doctor(BaseDoctor):
+@dataclass(slots=True)
+class Doctor(BaseDoctor, ParsedAggregates):
     first_name: str
     last_name: str
     department_name: str
     specialty_name: str
-    appt_time: list
+    appt_time: Optional[str]
+    _parsed: Optional[dict] = field(default=None, init=False, repr=False, compare=False)
 
+    @property
+    def appointment_times(self) -> tuple[str, ...]:
+        return self._aggregate('appt_time')
 
-@dataclass
+
+@dataclass(slots=True)
 class Availability:
     id: int
     doctor_id: int
@@ -96,7 +186,20 @@ class Availability:
     dates: datetime
 
 
-@dataclass
+# Status of a cancelled appointment. Appointments in these statuses give their slot back, they are not scheduled
+CANCELLED_STATUS = 'Cancelled'
+FREE_SLOT_STATUSES = (CANCELLED_STATUS,)
+
+
+def occupies_slot(status: Optional[str]) -> bool:
+    """
+    :param status: Appointment status
+    :return: True if an appointment in the status holds its slot and counts as scheduled
+    """
+    return status not in FREE_SLOT_STATUSES
+
+
+@dataclass(slots=True)
 class Appointment:
     id: int
     patient_id: int
@@ -107,26 +210,26 @@ class Appointment:
     description: str
 
 
-@dataclass
+@dataclass(slots=True)
 class NamedAppointment(Appointment):
     patient_name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Room:
     room_number: int
     capacity: int
     dept_id: int
 
 
-@dataclass
+@dataclass(slots=True)
 class LabTest:
     id: int
     disease_id: int
     test_name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class OrderedLabTest:
     patient_id: int
     lab_test_id: int
@@ -134,12 +237,12 @@ class OrderedLabTest:
     result: Optional[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class NamedOrderedLabTest(OrderedLabTest):
     test_name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class FilledOrderedLabTest(OrderedLabTest):
     first_name: str
     last_name: str
@@ -150,7 +253,7 @@ class FilledOrderedLabTest(OrderedLabTest):
     doctor_last_name: str
 
 
-@dataclass
+@dataclass(slots=True)
 class DepartmentStatistics:
     id: int
     department_name: str
@@ -159,3 +262,67 @@ class DepartmentStatistics:
     number_of_patients: int
     number_of_doctors: int
     scheduled_appointments: int
+
+
+@dataclass(slots=True)
+class Prescription:
+    patient_id: int
+    disease_id: int
+    treatment_id: int
+    start_date: datetime
+    end_date: datetime
+    dosage_instructions: Optional[str]
+
+
+@dataclass(slots=True)
+class NamedPrescription(Prescription):
+    treatment_name: str
+
+
+@dataclass
+class PatientChart:
+    """
+    Everything shown for one selected patient, read in a single round trip. `tests` are only the ones ordered by
+    `doctor_id`, or all of the patient's tests if the chart was read without a doctor.
+    """
+    patient_id: int
+    doctor_id: Optional[int]
+    tests: list[NamedOrderedLabTest]
+    diagnoses: list[NamedDiagnosis]
+    prescriptions: list[NamedPrescription]
+    appointments: list[NamedAppointment]
+
+
+@dataclass(slots=True)
+class AppointmentRequest:
+    patient_id: int
+    doctor_id: int
+    time: str
+    description: str
+
+
+@dataclass(slots=True)
+class BatchItemResult(Generic[T]):
+    """
+    Outcome of one item of a batch write. `error` is the database error message if the item failed
+    """
+    item: T
+    ok: bool
+    error: Optional[str] = None
+
+
+@dataclass
+class BatchResult(Generic[T]):
+    """
+    Per item outcome of a batch write. Failed items were rolled back to their savepoint, the others were committed
+    together in one transaction.
+    """
+    items: list[BatchItemResult[T]]
+
+    @property
+    def succeeded(self) -> list[BatchItemResult[T]]:
+        return [item for item in self.items if item.ok]
+
+    @property
+    def failed(self) -> list[BatchItemResult[T]]:
+        return [item for item in self.items if not item.ok]
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+# Log scaled latency buckets, each 25% wider than the last, from 0.1 ms up to about a minute
+BUCKET_BOUNDS_MS = [0.1 * 1.25 ** i for i in range(60)]
+
+# Calls slower than this are logged, 0 disables the slow query log
+DEFAULT_SLOW_QUERY_MS = 500.0
+
+
+@dataclass
+class LatencyHistogram:
+    counts: list[int] = field(default_factory=lambda: [0] * (len(BUCKET_BOUNDS_MS) + 1))
+    total: int = 0
+    max_ms: float = 0.0
+
+    def add(self, ms: float) -> None:
+        self.counts[bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.total += 1
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float:
+        """
+        Estimate a percentile by interpolating inside the bucket it falls in
+        :param q: Percentile, between 0 and 1
+        :return: Latency in ms
+        """
+        if self.total == 0:
+            return 0.0
+        target = q * self.total
+        seen = 0
+        for idx, count in enumerate(self.counts):
+            if count and seen + count >= target:
+                lower = BUCKET_BOUNDS_MS[idx - 1] if idx > 0 else 0.0
+                upper = BUCKET_BOUNDS_MS[idx] if idx < len(BUCKET_BOUNDS_MS) else self.max_ms
+                return min(lower + (upper - lower) * (target - seen) / count, self.max_ms)
+            seen += count
+        return self.max_ms
+
+
+@dataclass
+class QueryStats:
+    name: str
+    calls: int
+    rollbacks: int
+    rows: int
+    total_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    pool_wait_ms: float
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+
+@dataclass
+class _FunctionMetrics:
+    calls: int = 0
+    rollbacks: int = 0
+    rows: int = 0
+    total_ms: float = 0.0
+    pool_wait_ms: float = 0.0
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+
+class QueryMetrics:
+    """
+    Singleton registry of per function query metrics, recorded by `with_session`.
+    Rows are counted per call from the cursor of every statement the call executes. The counter lives in a context
+    variable, so it is separate for every thread and for every asyncio task.
+    """
+    _instance = None
+
+    _lock: threading.Lock
+    _rows: ContextVar[Optional[list[int]]]
+    _functions: Dict[str, _FunctionMetrics]
+    _slow_query_ms: float
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(QueryMetrics, cls).__new__(cls)
+            cls._instance._lock = threading.Lock()
+            cls._instance._rows = ContextVar('query_rows', default=None)
+            cls._instance._functions = {}
+            cls._instance._slow_query_ms = DEFAULT_SLOW_QUERY_MS
+        return cls._instance
+
+    @staticmethod
+    def configure(slow_query_ms: Optional[float] = None) -> None:
+        """
+        :param slow_query_ms: Calls slower than this are logged, 0 disables the slow query log
+        :return:
+        """
+        self = QueryMetrics()
+        if slow_query_ms is not None:
+            self._slow_query_ms = slow_query_ms
+
+    @staticmethod
+    def begin_call() -> None:
+        """
+        Start counting rows for a call in the current thread or task
+        :return:
+        """
+        QueryMetrics()._rows.set([0])
+
+    @staticmethod
+    def count_rows(rows: int) -> None:
+        """
+        Add rows to the call running in the current thread or task, if there is one
+        :param rows: Rows returned or affected by a statement
+        :return:
+        """
+        counter = QueryMetrics()._rows.get()
+        if rows > 0 and counter is not None:
+            counter[0] += rows
+
+    @staticmethod
+    def on_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        """
+        `after_cursor_execute` engine event handler, counts the rows of every statement
+        """
+        QueryMetrics.count_rows(cursor.rowcount)
+
+    @staticmethod
+    def end_call(name: str, latency_s: float, rolled_back: bool, pool_wait_s: float) -> None:
+        """
+        Record a finished call, and log it if it was slow
+        :param name: Name of the wrapped function
+        :param latency_s: Time spent in the call, including the commit
+        :param rolled_back: Whether the call failed and was rolled back
+        :param pool_wait_s: Time spent checking out a connection from the pool
+        :return:
+        """
+        self = QueryMetrics()
+        counter = self._rows.get()
+        rows = counter[0] if counter is not None else 0
+        self._rows.set(None)
+        latency_ms = latency_s * 1000
+        with self._lock:
+            metrics = self._functions.setdefault(name, _FunctionMetrics())
+            metrics.calls += 1
+            metrics.rollbacks += int(rolled_back)
+            metrics.rows += rows
+            metrics.total_ms += latency_ms
+            metrics.pool_wait_ms += pool_wait_s * 1000
+            metrics.histogram.add(latency_ms)
+        if 0 < self._slow_query_ms <= latency_ms:
+            print(f'Slow query: {name} took {latency_ms:.1f} ms '
+                  f'({rows} rows, {pool_wait_s * 1000:.1f} ms pool wait{", rolled back" if rolled_back else ""})')
+
+    @staticmethod
+    def snapshot() -> Dict[str, QueryStats]:
+        """
+        :return: Stats of every function that has been called, keyed by function name
+        """
+        self = QueryMetrics()
+        with self._lock:
+            return {
+                name: QueryStats(
+                    name=name,
+                    calls=m.calls,
+                    rollbacks=m.rollbacks,
+                    rows=m.rows,
+                    total_ms=m.total_ms,
+                    p50_ms=m.histogram.percentile(0.50),
+                    p95_ms=m.histogram.percentile(0.95),
+                    p99_ms=m.histogram.percentile(0.99),
+                    max_ms=m.histogram.max_ms,
+                    pool_wait_ms=m.pool_wait_ms,
+                )
+                for name, m in self._functions.items()
+            }
+
+    @staticmethod
+    def format_snapshot() -> str:
+        """
+        :return: The snapshot as a table, slowest total time first
+        """
+        header = (f'{"function":<32} {"calls":>7} {"rollbk":>6} {"rows":>9} {"p50 ms":>9} {"p95 ms":>9} '
+                  f'{"p99 ms":>9} {"max ms":>9} {"wait ms":>9}')
+        lines = [header]
+        for s in sorted(QueryMetrics.snapshot().values(), key=lambda s: s.total_ms, reverse=True):
+            lines.append(f'{s.name:<32} {s.calls:>7} {s.rollbacks:>6} {s.rows:>9} {s.p50_ms:>9.1f} {s.p95_ms:>9.1f} '
+                         f'{s.p99_ms:>9.1f} {s.max_ms:>9.1f} {s.pool_wait_ms:>9.1f}')
+        return '\n'.join(lines)
+
+    @staticmethod
+    def reset() -> None:
+        self = QueryMetrics()
+        with self._lock:
+            self._functions.clear()
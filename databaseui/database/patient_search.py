@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import re
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Optional
+
+from databaseui.database.statements import Statement, StatementRegistry, phone_digits_sql
+
+# Name terms beyond this many are ignored, so the number of statement shapes stays small
+MAX_NAME_TERMS = 3
+# InnoDB does not index shorter words for FULLTEXT (innodb_ft_min_token_size), they are matched with LIKE instead
+FULLTEXT_MIN_TERM = 3
+
+_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_PHONE = re.compile(r'^[\d\-() +.]+$')
+_WORD = re.compile(r'[^\W_]+')
+
+
+@dataclass(frozen=True)
+class PatientQuery:
+    """
+    Filters of a server side patient search. Every name term must prefix match the first or last name
+    """
+    names: tuple[str, ...] = ()
+    dob: Optional[date] = None
+    phone: Optional[str] = None
+
+    @classmethod
+    def parse(cls, text: str) -> PatientQuery:
+        """
+        Parse free text typed in a patient picker: a YYYY-MM-DD date is a date of birth, a number (with or without
+        separators) is the start of a phone number, and every other word is a name term
+        :param text: Search text
+        :return: The query
+        """
+        names = []
+        dob = None
+        phone = None
+        for part in text.split():
+            if _DATE.match(part):
+                try:
+                    dob = date.fromisoformat(part)
+                    continue
+                except ValueError:
+                    pass
+            if _PHONE.match(part) and any(c.isdigit() for c in part):
+                phone = (phone or '') + ''.join(c for c in part if c.isdigit())
+                continue
+            names.extend(_WORD.findall(part.lower()))
+        return cls(tuple(names[:MAX_NAME_TERMS]), dob, phone)
+
+    def is_empty(self) -> bool:
+        return not self.names and self.dob is None and not self.phone
+
+
+class PatientSearch:
+    """
+    Builds the statements of the server side patient search. Filters are pushed down to the `person` and `patient`
+    tables, where they can use the search indexes (see `scripts.create_search_indexes`), and the page is cut by keyset
+    on the patient id. The full rows of the page are read by id afterwards, from `patient_info` or its summary table.
+    A search reads the rows matching its most selective indexed filter, then sorts them by id to cut the page, so its
+    cost grows with the number of matches of that filter, not with the size of the registry. Per filter:
+    - name terms (LIKE): the longest term drives, as a UNION of two branches, one per name column, so each branch is a
+      range scan of its own index (`idx_person_first`, `idx_person_last_first`) instead of an index merge or a walk of
+      the primary key for the OR. Each branch is ordered and limited to the page, the union is merged and cut again
+    - name terms (FULLTEXT): a lookup in `ft_person_name`
+    - date of birth: a range of one day on `idx_patient_dob`
+    - phone number: a prefix range on `idx_patient_phone_digits`, over the digits of the stored number
+    The other filters are checked on the rows read. Short prefixes (one letter, two digits) still match many rows.
+    Statements are built once per shape of query (number of name terms, which filters are set) and then reused.
+    """
+    _fulltext: bool = False
+    _statements: dict[tuple, Statement] = {}
+    # Searches run on pool threads, the first search of a shape registers its statement
+    _lock = threading.Lock()
+
+    @staticmethod
+    def configure(fulltext: Optional[bool] = None) -> None:
+        """
+        :param fulltext: Match name terms with the FULLTEXT index on person names instead of LIKE prefixes
+        """
+        if fulltext is not None:
+            PatientSearch._fulltext = fulltext
+
+    @staticmethod
+    def fulltext() -> bool:
+        return PatientSearch._fulltext
+
+    @staticmethod
+    def _split_terms(query: PatientQuery) -> tuple[tuple[str, ...], tuple[str, ...]]:
+        """
+        :return: Terms matched with LIKE, and terms matched with the FULLTEXT index
+        """
+        # Longest term first, it matches the fewest rows and drives the UNION of the name columns
+        names = sorted(query.names, key=len, reverse=True)
+        if not PatientSearch._fulltext:
+            return tuple(names), ()
+        like = tuple(term for term in names if len(term) < FULLTEXT_MIN_TERM)
+        fulltext = tuple(term for term in names if len(term) >= FULLTEXT_MIN_TERM)
+        return like, fulltext
+
+    @staticmethod
+    def ids_statement(query: PatientQuery) -> Statement:
+        """
+        :param query: Search
+        :return: Statement selecting one page of matching patient ids, after `:after_id`, ordered by id
+        """
+        like, fulltext = PatientSearch._split_terms(query)
+        shape = (len(like), bool(fulltext), query.dob is not None, bool(query.phone))
+        statement = PatientSearch._statements.get(shape)
+        if statement is not None:
+            return statement
+        with PatientSearch._lock:
+            statement = PatientSearch._statements.get(shape)
+            if statement is None:
+                statement = PatientSearch._register(shape)
+                PatientSearch._statements[shape] = statement
+        return statement
+
+    @staticmethod
+    def _register(shape: tuple[int, bool, bool, bool]) -> Statement:
+        like_terms, fulltext, dob, phone = shape
+        conditions = ['pa.id > :after_id']
+        for i in range(1, like_terms):
+            conditions.append(f'(pe.first_name LIKE :name_{i} OR pe.last_name LIKE :name_{i})')
+        if fulltext:
+            conditions.append('MATCH (pe.first_name, pe.last_name) AGAINST (:fulltext IN BOOLEAN MODE)')
+        if dob:
+            # DOB is a DATETIME, a range keeps the index usable
+            conditions.append('pa.DOB >= :dob AND pa.DOB < :dob_end')
+        if phone:
+            conditions.append(f"{phone_digits_sql('pa.phone_number')} LIKE :phone")
+        select = "SELECT pa.id FROM patient AS pa INNER JOIN person AS pe ON pe.id = pa.person_id "
+        name = 'search_patient_ids_' + '_'.join(str(int(part)) for part in shape)
+        if not like_terms:
+            return StatementRegistry.register(
+                name, f"{select}WHERE {' AND '.join(conditions)} ORDER BY pa.id LIMIT :page_size", prepare=True
+            )
+        branches = [
+            f"({select}WHERE pe.{column} LIKE :name_0 AND {' AND '.join(conditions)} ORDER BY pa.id LIMIT :page_size)"
+            for column in ('first_name', 'last_name')
+        ]
+        return StatementRegistry.register(
+            name,
+            f"SELECT id FROM ({' UNION '.join(branches)}) AS matches ORDER BY id LIMIT :page_size",
+            prepare=True
+        )
+
+    @staticmethod
+    def params(query: PatientQuery, after_id: int, page_size: int) -> dict[str, Any]:
+        """
+        :return: Parameters of `ids_statement` for the query
+        """
+        like, fulltext = PatientSearch._split_terms(query)
+        params: dict[str, Any] = {'after_id': after_id, 'page_size': page_size}
+        for i, term in enumerate(like):
+            params[f'name_{i}'] = f'{term}%'
+        if fulltext:
+            params['fulltext'] = ' '.join(f'+{term}*' for term in fulltext)
+        if query.dob is not None:
+            start = datetime.combine(query.dob, datetime.min.time())
+            params['dob'] = start
+            params['dob_end'] = start + timedelta(days=1)
+        if query.phone:
+            params['phone'] = f'{query.phone}%'
+        return params
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import exc
+from sqlalchemy.pool import Pool, QueuePool, AsyncAdaptedQueuePool, PoolProxiedConnection
+
+
+@dataclass
+class PoolStatistics:
+    """
+    Snapshot of the connection pool. Checkout time includes waiting for a free connection, and opening a new one when
+    the pool has to grow, so a high average means the pool is too small for the workload.
+    """
+    size: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    checkins: int
+    connects: int
+    timeouts: int
+    total_wait_s: float
+    max_wait_s: float
+
+    @property
+    def avg_wait_ms(self) -> float:
+        return self.total_wait_s / self.checkouts * 1000 if self.checkouts else 0.0
+
+
+class PoolMonitor:
+    """
+    Thread safe counters for the connection pool. The checkout time of the last checkout is also kept per thread
+    (and per asyncio task), so a caller can attribute it to the query that triggered it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_wait_s: ContextVar[float] = ContextVar('pool_last_wait_s', default=0.0)
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.total_wait_s = 0.0
+        self.max_wait_s = 0.0
+
+    def record_checkout(self, wait_s: float, timed_out: bool = False) -> None:
+        self._last_wait_s.set(wait_s)
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait_s += wait_s
+            self.max_wait_s = max(self.max_wait_s, wait_s)
+
+    def record_checkin(self, *_) -> None:
+        with self._lock:
+            self.checkins += 1
+
+    def record_connect(self, *_) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def reset_last_wait(self) -> None:
+        self._last_wait_s.set(0.0)
+
+    def last_wait_s(self) -> float:
+        """
+        Checkout time of the last connection checked out on the calling thread or task
+        :return: Seconds
+        """
+        return self._last_wait_s.get()
+
+    def attach(self, pool: Pool) -> None:
+        """
+        Report the checkouts of a pool to this monitor, if it is an `InstrumentedQueuePool`
+        """
+        if isinstance(pool, InstrumentedQueuePool):
+            pool.monitor = self
+
+    def snapshot(self, pool: Pool) -> PoolStatistics:
+        # Only a queue pool has a size and an overflow
+        size = checked_out = overflow = 0
+        if isinstance(pool, QueuePool):
+            size, checked_out, overflow = pool.size(), pool.checkedout(), pool.overflow()
+        with self._lock:
+            return PoolStatistics(
+                size=size,
+                checked_out=checked_out,
+                overflow=overflow,
+                checkouts=self.checkouts,
+                checkins=self.checkins,
+                connects=self.connects,
+                timeouts=self.timeouts,
+                total_wait_s=self.total_wait_s,
+                max_wait_s=self.max_wait_s,
+            )
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that times every checkout and reports it to its `PoolMonitor`
+    """
+    monitor: Optional[PoolMonitor] = None
+
+    def connect(self) -> PoolProxiedConnection:
+        if self.monitor is None:
+            return super().connect()
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.monitor.record_checkout(time.perf_counter() - start, timed_out=True)
+            raise
+        self.monitor.record_checkout(time.perf_counter() - start)
+        return connection
+
+    def recreate(self) -> QueuePool:
+        # Keep the same counters when the pool is recreated, e.g. after a disconnect
+        pool = super().recreate()
+        if self.monitor is not None:
+            self.monitor.attach(pool)
+        return pool
+
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """
+    `InstrumentedQueuePool` for the asyncio engine, checkouts wait on the event loop instead of blocking a thread
+    """
@@ -1,118 +1,351 @@
 import datetime
-from typing import Callable, Any, Optional
+import json
+from dataclasses import fields
+from typing import Callable, Any, Optional, Iterable, Sequence, TypeVar, get_type_hints
 
-from PyQt6.QtCore import QThreadPool
-from sqlalchemy import text, Result
+from sqlalchemy import Result
 from sqlalchemy.orm import Session
 
 from databaseui.database import with_session
-from databaseui.database.db_types import (Treatment, Disease, NamedPatient,
+from databaseui.database.availability import AvailabilityIndex
+from databaseui.database.cache import ReferenceCache
+from databaseui.database import statements
+from databaseui.database.patient_search import PatientQuery, PatientSearch
+from databaseui.database.summaries import SummaryTables
+from databaseui.database.db_types import (Treatment, Disease, NamedPatient, PatientPage, PatientSearchPage,
                                           Doctor, Patient, Availability, LabTest, DepartmentStatistics, OrderedLabTest,
                                           BaseDoctor,
-                                          NamedOrderedLabTest, Appointment, NamedAppointment, NamedDiagnosis)
+                                          NamedOrderedLabTest, Appointment, NamedAppointment, NamedDiagnosis,
+                                          NamedPrescription, PatientChart, AppointmentRequest, BatchItemResult,
+                                          BatchResult, CANCELLED_STATUS, FREE_SLOT_STATUSES)
 from databaseui.signals.signal_manager import SignalManager
-from databaseui.threads.worker import Worker
+from databaseui.threads.dispatcher import RequestGeneration
+from databaseui.threads.task_context import CancellationToken, Priority, TaskContext
+from databaseui.threads.worker import Startable, Worker
 
 
-def run_in_pool(pool: QThreadPool, fn: Callable, *args, **kwargs) -> Worker:
+def run_in_pool(pool: Startable, fn: Callable, *args, priority: Priority = Priority.INTERACTIVE,
+                token: Optional[CancellationToken] = None, max_statement_ms: Optional[int] = None, **kwargs) -> Worker:
     """
     Convenience function to run a function inside a thread pool. This function will not provide a progress signal
     :param pool: Thread Pool
     :param fn: Function to run
     :param args: Positional arguments to pass to the function
+    :param priority: Queue priority, background work yields to interactive work waiting for a thread
+    :param token: Token to cancel the work with
+    :param max_statement_ms: Server side execution time limit of the read statements, None for the default of the
+        priority (see `DatabaseManager.configure_statement_timeouts`)
     :param kwargs: Keyword arguments to pass to the function
     :return: A worker instance with signals that can be used later
     """
     worker = Worker(fn, False, *args, **kwargs)
-    pool.start(worker)
-    return worker
+    worker.context = TaskContext(priority, token, max_statement_ms)
+    return worker.start(pool)
 
 
-def run_in_pool_progress(pool: QThreadPool, fn: Callable, *args, **kwargs) -> Worker:
+def is_superseded(generation: Optional[RequestGeneration]) -> bool:
+    """
+    Check if a request dispatched by the `CoalescingDispatcher` was superseded by a newer one. Superseded results are
+    counted as dropped, and should not be emitted
+    :param generation: Generation of the request, None if the request was not dispatched by the dispatcher
+    :return: True if the result should be dropped
+    """
+    if generation is None or generation.is_current():
+        return False
+    generation.drop()
+    return True
+
+
+def run_in_pool_progress(pool: Startable, fn: Callable, *args,
+                         priority: Priority = Priority.INTERACTIVE, token: Optional[CancellationToken] = None,
+                         max_statement_ms: Optional[int] = None, **kwargs) -> Worker:
     """
     Convenience function to run a function inside a thread pool. This function will provide a progress signal,
     if a handler is passed in
     :param pool: Thread Pool
     :param fn: Function to run
     :param args: Positional arguments to pass to the function
+    :param priority: Queue priority, see `run_in_pool`
+    :param token: Token to cancel the work with
+    :param max_statement_ms: Server side execution time limit of the read statements, see `run_in_pool`
     :param kwargs: Keyword arguments to pass to the function
     :return: A worker instance with signals that can be used later
     """
     worker = Worker(fn, True, *args, **kwargs)
-    pool.start(worker)
-    return worker
+    worker.context = TaskContext(priority, token, max_statement_ms)
+    return worker.start(pool)
+
+
+T = TypeVar("T")
+
+
+def map_rows(row_type: type[T], result: Iterable[Sequence[Any]]) -> list[T]:
+    """
+    Map result rows to row type instances
+    :param row_type: Dataclass to map the rows to
+    :param result: Result rows
+    :return:
+    """
+    return list(map(lambda item: row_type(*item), result))
+
+
+# Reference data cache keys
+CACHE_TREATMENTS = 'treatments'
+CACHE_DISEASES = 'diseases'
+CACHE_TESTS = 'tests'
+CACHE_DOCTORS = 'doctors'
+
+# Number of patient_info rows read per keyset page
+PATIENT_PAGE_SIZE = 1000
+# The first page is smaller, so the patient list shows up before the larger pages arrive
+FIRST_PATIENT_PAGE_SIZE = 100
+# Patients per page of search results
+PATIENT_SEARCH_PAGE_SIZE = 50
+
+
+def _get_reference_data(key: str, fetch: Callable[[], Optional[list]], force: bool) -> Optional[list]:
+    """
+    Serve reference data from the `ReferenceCache` when it is fresh, otherwise fetch it and store it.
+    Failed fetches (None) are not cached.
+    :param key: Cache key
+    :param fetch: Session wrapped function returning the rows
+    :param force: Skip the cache and always read from the database
+    :return: The rows, or None if the fetch failed
+    """
+    if not force:
+        cached = ReferenceCache.get(key)
+        if cached is not None:
+            return cached
+    rows = fetch()
+    if rows is not None:
+        ReferenceCache.put(key, rows)
+    return rows
 
 
 @with_session
-def get_all_treatments(session: Session):
+def fetch_all_treatments(session: Session) -> list[Treatment]:
     """
-    Selects all treatments and emits to the treatments_received signal.
+    Selects all treatments.
     Maps to `Treatment` objects
     :param session:
     :return:
     """
-    result = session.execute(text("SELECT * FROM `treatment`"))
-    treatments = list(map(lambda item: Treatment(*item), result))
+    result = statements.execute(session, statements.SELECT_TREATMENTS)
+    return map_rows(Treatment, result)
+
+
+def get_all_treatments(force: bool = False):
+    """
+    Gets all treatments (from the reference cache when fresh) and emits to the treatments_received signal.
+    :param force: Bypass the cache and read from the database
+    :return: The treatments, None if they could not be read
+    """
+    treatments = _get_reference_data(CACHE_TREATMENTS, fetch_all_treatments, force)
+    if treatments is None:
+        return
     print(f'Got {len(treatments)} treatments')
     SignalManager().treatments_received.emit(treatments)
+    return treatments
 
 
 @with_session
-def get_all_tests(session: Session):
+def fetch_all_tests(session: Session) -> list[LabTest]:
     """
-    Selects all tests and emits to the tests_received signal.
+    Selects all tests.
     Maps to `LabTest` objects
     :param session:
     :return:
     """
-    result = session.execute(text("SELECT * FROM `lab_test`"))
-    tests = list(map(lambda item: LabTest(*item), result))
+    result = statements.execute(session, statements.SELECT_LAB_TESTS)
+    return map_rows(LabTest, result)
+
+
+def get_all_tests(force: bool = False):
+    """
+    Gets all tests (from the reference cache when fresh) and emits to the tests_received signal.
+    :param force: Bypass the cache and read from the database
+    :return: The tests, None if they could not be read
+    """
+    tests = _get_reference_data(CACHE_TESTS, fetch_all_tests, force)
+    if tests is None:
+        return
     print(f'Got {len(tests)} tests')
     SignalManager().tests_received.emit(tests)
+    return tests
 
 
 @with_session
 def get_department_statistics(session: Session):
     """
-    Selects all department statistics from the department_statistics view.
+    Selects all department statistics from the department_statistics view, or its summary table when enabled.
     Emits in dept_statistics_received.
     Maps to `DepartmentStatistics` objects
     :param session:
-    :return:
+    :return: The statistics
     """
-    result = session.execute(text('SELECT * FROM `department_statistics`'))
+    if SummaryTables.enabled():
+        result = statements.execute(session, statements.SELECT_DEPARTMENT_SUMMARY)
+    else:
+        result = statements.execute(session, statements.SELECT_DEPARTMENT_STATISTICS)
     statistics = list(map(lambda item: DepartmentStatistics(*item), result))
     print(f'Got {len(statistics)} departments')
     SignalManager().dept_statistics_received.emit(statistics)
+    return statistics
 
 
 @with_session
-def get_all_diseases(session: Session):
+def fetch_all_diseases(session: Session) -> list[Disease]:
     """
-    Gets all diseases and emits on diseases_received.
+    Selects all diseases.
     Maps to `Disease` objects
     :param session:
     :return:
     """
-    result = session.execute(text("SELECT * FROM `disease` "))
-    diseases = list(map(lambda item: Disease(*item), result))
+    result = statements.execute(session, statements.SELECT_DISEASES)
+    return map_rows(Disease, result)
+
+
+def get_all_diseases(force: bool = False):
+    """
+    Gets all diseases (from the reference cache when fresh) and emits on diseases_received.
+    :param force: Bypass the cache and read from the database
+    :return: The diseases, None if they could not be read
+    """
+    diseases = _get_reference_data(CACHE_DISEASES, fetch_all_diseases, force)
+    if diseases is None:
+        return
     print(f'Got {len(diseases)} diseases')
     SignalManager().diseases_received.emit(diseases)
+    return diseases
 
 
 @with_session
-def get_all_patients(session: Session, last_patient_id: int = -1):
+def fetch_patient_page(session: Session, after_id: int = -1, page_size: int = PATIENT_PAGE_SIZE) -> list[NamedPatient]:
     """
-    Gets all patients and emits on patients_received.
-    Maps to `NamedPatient` objects
+    Selects one keyset page of patients with an id greater than `after_id`, ordered by id.
+    Maps to `NamedPatient` objects. A page goes straight into the list models, so it is never column oriented
     :param session:
-    :param last_patient_id: The last patient id to emit
+    :param after_id: Cursor, the last patient id of the previous page (or -1 to start from the beginning)
+    :param page_size: Maximum number of patients in the page
     :return:
     """
-    result = session.execute(text("SELECT * FROM `patient_info`"))
-    patients = list(map(lambda item: NamedPatient(*item), result))
-    print(f'Got {len(patients)} patients')
-    SignalManager().patients_received.emit(patients, last_patient_id)
+    statement = statements.SELECT_PATIENT_SUMMARY_PAGE if SummaryTables.enabled() else statements.SELECT_PATIENT_PAGE
+    result = statements.execute(session, statement, {'after_id': after_id, 'page_size': page_size})
+    return map_rows(NamedPatient, result)
+
+
+@with_session
+def count_patients(session: Session, after_id: int = -1) -> int:
+    """
+    Counts the patients with an id greater than `after_id`, i.e. still to be loaded from that cursor
+    :param session:
+    :param after_id: Cursor
+    :return:
+    """
+    return statements.execute(session, statements.COUNT_PATIENTS_AFTER, {'after_id': after_id}).scalar_one()
+
+
+def progress_percent(loaded: int, expected: Optional[int]) -> int:
+    """
+    :return: Progress of a load in %, kept under 100 until the load is done since rows may be added meanwhile
+    """
+    if not expected:
+        return 0
+    return min(99, loaded * 100 // expected)
+
+
+def get_all_patients(last_patient_id: int = -1, after_id: int = -1, page_size: int = PATIENT_PAGE_SIZE,
+                     progress_callback=None) -> Optional[int]:
+    """
+    Gets all patients page by page and emits each `PatientPage` on patients_received as soon as it arrives.
+    The first page is small so it can be shown right away. Every page is read in its own session, so a failed load can
+    be resumed from the `next_cursor` of the last page emitted.
+    :param last_patient_id: The last patient id to emit
+    :param after_id: Cursor to resume from, or -1 to load from the beginning
+    :param page_size: Number of patients per page
+    :param progress_callback: Progress signal, passed by `run_in_pool_progress`. Emits the % of patients loaded after
+        every page, the number of patients to load is counted first
+    :return: The cursor after the last page, None if the load stopped early
+    """
+    expected = count_patients(after_id) if progress_callback is not None else None
+    cursor = after_id
+    total = 0
+    size = min(page_size, FIRST_PATIENT_PAGE_SIZE)
+    while True:
+        patients = fetch_patient_page(cursor, size)
+        if patients is None:
+            print(f'Stopped loading patients at cursor {cursor}')
+            return None
+        total += len(patients)
+        done = len(patients) < size
+        next_cursor = patients[-1].id if patients else cursor
+        SignalManager().patients_received.emit(PatientPage(patients, cursor, next_cursor, done), last_patient_id)
+        if progress_callback is not None:
+            progress_callback.emit(100 if done else progress_percent(total, expected))
+        cursor = next_cursor
+        size = page_size
+        if done:
+            print(f'Got {total} patients')
+            return cursor
+
+
+@with_session
+def search_patients(session: Session, text: str, after_id: int = -1, page_size: int = PATIENT_SEARCH_PAGE_SIZE,
+                    generation: Optional[RequestGeneration] = None) -> Optional[PatientSearchPage]:
+    """
+    Search patients on the server by name, date of birth and phone (see `PatientQuery.parse`), one keyset page at a
+    time. Emits the page on patient_search_received.
+    The matching ids are read with the filters and the limit pushed down to the indexed tables, then the full rows of
+    those ids. The id query reads the rows matching its most selective filter (see `PatientSearch`), the row query
+    only the page.
+    Maps to `NamedPatient` objects
+    :param session:
+    :param text: Search text
+    :param after_id: Cursor, the last patient id of the previous page (or -1 for the first page)
+    :param page_size: Maximum number of patients in the page
+    :param generation: Dispatcher generation, the result is dropped if it was superseded
+    :return: The page
+    """
+    query = PatientQuery.parse(text)
+    if query.is_empty():
+        return None
+    ids = statements.execute(
+        session, PatientSearch.ids_statement(query), PatientSearch.params(query, after_id, page_size)
+    ).scalars().all()
+    if is_superseded(generation):
+        return None
+    patients = []
+    if ids:
+        statement = statements.SELECT_PATIENT_SUMMARIES_BY_IDS if SummaryTables.enabled() \
+            else statements.SELECT_PATIENTS_BY_IDS
+        patients = map_rows(NamedPatient, statements.execute(session, statement, {'patient_ids': list(ids)}))
+        if is_superseded(generation):
+            return None
+    page = PatientSearchPage(text, patients, after_id, ids[-1] if ids else after_id, len(ids) < page_size)
+    print(f'Found {len(patients)} patients for {text!r} after {after_id}')
+    SignalManager().patient_search_received.emit(page)
+    return page
+
+
+@with_session
+def get_patient(session: Session, patient_id: int, select: bool = False) -> Optional[NamedPatient]:
+    """
+    Gets a single patient by id and emits it on patient_received. Used to refresh one patient after a write instead of
+    reloading the whole patient list.
+    Maps to a `NamedPatient` object
+    :param session:
+    :param patient_id: Id of the patient to fetch
+    :param select: Whether the UI should select the patient once it is received
+    :return: The patient, or None if it does not exist
+    """
+    statement = statements.SELECT_PATIENT_SUMMARY if SummaryTables.enabled() else statements.SELECT_PATIENT
+    row = statements.execute(session, statement, {'patient_id': patient_id}).first()
+    if row is None:
+        print(f'Patient {patient_id} not found')
+        return None
+    patient = NamedPatient(*row)
+    SignalManager().patient_received.emit(patient, select)
+    return patient
 
 
 @with_session
@@ -124,99 +357,149 @@ def update_patient_information(session: Session, patient: NamedPatient):
     :param patient: The patient to update
     :return:
     """
-    query = text("UPDATE person "
-                 "INNER JOIN patient ON patient.person_id = person.id "
-                 "SET first_name = :first_name, last_name = :last_name "
-                 "WHERE patient.person_id = :person_id; ")
     session.begin()
-    session.execute(
-        query,
+    statements.execute(
+        session, statements.UPDATE_PERSON,
         {"patient_id": patient.id, "person_id": patient.person_id, "first_name": patient.first_name,
          "last_name": patient.last_name}
     )
 
-    query = text("UPDATE patient "
-                 "SET gender = :gender, sex = :sex, sexual_orientation = :sexual_orientation, DOB = :dob, "
-                 "phone_number = :phone_number, email = :email, address = :address "
-                 "WHERE patient.id = :patient_id;")
-
-    session.execute(query, {"patient_id": patient.id, "gender": patient.gender, "sex": patient.sex,
-                            "sexual_orientation": patient.sexual_orientation, "dob": patient.DOB,
-                            "phone_number": patient.phone_number, "email": patient.email, "address": patient.address})
+    statements.execute(
+        session, statements.UPDATE_PATIENT,
+        {"patient_id": patient.id, "gender": patient.gender, "sex": patient.sex,
+         "sexual_orientation": patient.sexual_orientation, "dob": patient.DOB,
+         "phone_number": patient.phone_number, "email": patient.email, "address": patient.address}
+    )
+    SummaryTables.update_patient(session, patient)
 
 
 @with_session
-def get_all_doctors(session: Session):
+def fetch_all_doctors(session: Session) -> list[Doctor]:
     """
-    Get all doctors, emit on doctors_received.
+    Selects all doctors from the doctor_info view.
     Maps to `Doctor` objects
     :param session:
     :return:
     """
-    result = session.execute(text("select * from `doctor_info`"))
-    doctors = list(map(lambda item: Doctor(*item), result))
+    result = statements.execute(session, statements.SELECT_DOCTORS)
+    return map_rows(Doctor, result)
+
+
+def get_all_doctors(force: bool = False):
+    """
+    Get all doctors (from the reference cache when fresh), emit on doctors_received.
+    :param force: Bypass the cache and read from the database
+    :return: The doctors, None if they could not be read
+    """
+    doctors = _get_reference_data(CACHE_DOCTORS, fetch_all_doctors, force)
+    if doctors is None:
+        return
     print(f'Got {len(doctors)} doctors')
     SignalManager().doctors_received.emit(doctors)
+    return doctors
 
 
 @with_session
-def get_all_availability(session: Session):
+def get_all_availability(session: Session, since: Optional[datetime.datetime] = None) -> Optional[AvailabilityIndex]:
     """
-    Get all availability entries. Emit on availability_received.
-    Maps to `Availability` objects
+    Get all availability entries and the booked appointment slots, and build the availability index from them.
+    Emit on availability_received.
     :param session:
-    :return:
+    :param since: Ignore appointments booked before this time, defaults to today
+    :return: The index
     """
-    query = "SELECT * from availability"
-    result = session.execute(text(query))
+    if since is None:
+        since = datetime.datetime.combine(datetime.date.today(), datetime.time.min)
+    result = statements.execute(session, statements.SELECT_AVAILABILITY)
     availability = list(map(lambda item: Availability(*item), result))
-    print(f'Got {len(availability)} availability entries')
-    SignalManager().availability_received.emit(availability)
+    booked = statements.execute(session, statements.SELECT_BOOKED_SLOTS,
+                                {'since': since, 'free_statuses': list(FREE_SLOT_STATUSES)}).all()
+    index = AvailabilityIndex.build(availability, booked)
+    print(f'Got {len(availability)} availability entries and {len(booked)} booked slots')
+    SignalManager().availability_received.emit(index)
+    return index
 
 
 @with_session
-def get_appointments(session: Session, patient: Patient | int):
+def get_appointments(session: Session, patient: Patient | int, generation: Optional[RequestGeneration] = None):
     """
     Get all appointments, include patient first name and last name. Emit on appointments_received.
     Maps to `NamedAppointment` objects
     :param session:
     :param patient:
+    :param generation: Dispatcher generation, the result is dropped if it was superseded
     :return:
     """
-    query = ("SELECT appointment.*, CONCAT(pe.first_name, ' ', pe.last_name) AS patient_name "
-             "FROM appointment "
-             "INNER JOIN patient AS pa ON pa.id = appointment.patient_id "
-             "LEFT JOIN person AS pe on pe.id = pa.person_id "
-             "WHERE pa.id = :patient_id")
+    if is_superseded(generation):
+        return
     if isinstance(patient, Patient):
         patient = patient.id
-    result = session.execute(text(query), {'patient_id': patient})
+    result = statements.execute(session, statements.SELECT_APPOINTMENTS, {'patient_id': patient})
     appointments = list(map(lambda item: NamedAppointment(*item), result))
     print(f'Got {len(appointments)} appointment entries for patient {patient}')
+    if is_superseded(generation):
+        return
     SignalManager().appointments_received.emit(appointments)
 
 
 @with_session
-def get_tests_for_patient(session: Session, patient: Patient | int, doctor: BaseDoctor | int) -> None:
+def get_day_appointments(session: Session, day: datetime.date, doctor: Optional[BaseDoctor | int] = None,
+                         department: Optional[DepartmentStatistics | int] = None,
+                         generation: Optional[RequestGeneration] = None) -> Optional[list[NamedAppointment]]:
+    """
+    Get the appointments of a doctor or of a department on one day, for the bulk admin operations. Emit on
+    day_appointments_received.
+    Maps to `NamedAppointment` objects
+    :param session:
+    :param day: Day of the appointments
+    :param doctor: Doctor or ID, takes precedence over the department
+    :param department: Department or ID
+    :param generation: Dispatcher generation, the result is dropped if it was superseded
+    :return: The appointments, ordered by time, or None if the request was superseded
+    """
+    if is_superseded(generation):
+        return None
+    start = datetime.datetime.combine(day, datetime.time.min)
+    params: dict[str, Any] = {'start': start, 'end': start + datetime.timedelta(days=1)}
+    if doctor is not None:
+        params['doctor_id'] = doctor.id if isinstance(doctor, BaseDoctor) else doctor
+        statement = statements.SELECT_DOCTOR_DAY_APPOINTMENTS
+    elif department is not None:
+        params['department_id'] = department.id if isinstance(department, DepartmentStatistics) else department
+        statement = statements.SELECT_DEPARTMENT_DAY_APPOINTMENTS
+    else:
+        raise ValueError('A doctor or a department is required')
+    appointments = map_rows(NamedAppointment, statements.execute(session, statement, params))
+    print(f'Got {len(appointments)} appointments on {day}')
+    if is_superseded(generation):
+        return None
+    SignalManager().day_appointments_received.emit(appointments)
+    return appointments
+
+
+@with_session
+def get_tests_for_patient(session: Session, patient: Patient | int, doctor: BaseDoctor | int,
+                          generation: Optional[RequestGeneration] = None) -> None:
     """
     Queries the database for all ordered test information, and lab test names. Emits on patient_tests_received.
     Maps to `NamedOrderedLabTest` objects
     :param session:
     :param patient:
     :param doctor:
+    :param generation: Dispatcher generation, the result is dropped if it was superseded
     :return:
     """
-    query = text("SELECT ordered_lab_test.*, lt.test_name FROM "
-                 "`ordered_lab_test` "
-                 "LEFT JOIN lab_test as lt ON ordered_lab_test.lab_test_id = lt.id "
-                 "WHERE doctor_id = :dr_id AND patient_id = :pt_id")
+    if is_superseded(generation):
+        return
     if isinstance(patient, Patient):
         patient = patient.id
     if isinstance(doctor, Doctor):
         doctor = doctor.id
-    result = session.execute(query, {'dr_id': doctor, 'pt_id': patient})
+    result = statements.execute(session, statements.SELECT_PATIENT_TESTS, {'dr_id': doctor, 'pt_id': patient})
     tests = list(map(lambda item: NamedOrderedLabTest(*item), result))
     print(f'Got {len(tests)} test for patient {patient} and doctor {doctor}')
+    if is_superseded(generation):
+        return
     SignalManager().patient_tests_received.emit(tests)
 
 
@@ -237,38 +520,38 @@ def create_diagnosis(session: Session, patient: Patient | int, doctor: Doctor |
     if isinstance(disease, Disease):
         disease = disease.id
 
-    query = text("insert into diagnosis (patient_id, doctor_id, disease_id) VALUES (:p, :dr, :ds)")
     session.begin()
-    session.execute(
-        query,
+    statements.execute(
+        session, statements.INSERT_DIAGNOSIS,
         {'p': patient, 'dr': doctor, 'ds': disease}
     )
+    SummaryTables.add_diagnosis(session, patient, disease)
 
 
 @with_session
-def create_new_patient(session: Session, patient: NamedPatient):
+def create_new_patient(session: Session, patient: NamedPatient) -> int:
     """
     Creates a new patient given name information
     :param session:
     :param patient:
-    :return:
+    :return: Id of the new patient
     """
-    query = text("INSERT INTO person (first_name, last_name) VALUES (:first_name, :last_name);")
     session.begin()
-    session.execute(
-        query,
+    statements.execute(
+        session, statements.INSERT_PERSON,
         {'first_name': patient.first_name, 'last_name': patient.last_name}
     )
 
-    session.execute(text("SET @person_id = LAST_INSERT_ID();"))
+    statements.execute(session, statements.SET_PERSON_ID)
 
-    query = text("INSERT INTO patient (person_id, gender, sex, sexual_orientation, DOB, phone_number, email, address) "
-                 "VALUES (@person_id, :gender, :sex, :sexual_orientation, :DOB, :phone_number, :email, :address);")
-    session.execute(
-        query,
+    statements.execute(
+        session, statements.INSERT_PATIENT,
         {"gender": patient.gender, "sex": patient.sex, "sexual_orientation": patient.sexual_orientation,
          "DOB": patient.DOB, "phone_number": patient.phone_number, "email": patient.email, "address": patient.address}
     )
+    patient_id = statements.execute(session, statements.SELECT_LAST_INSERT_ID).scalar_one()
+    SummaryTables.add_patient(session, patient_id, patient)
+    return patient_id
 
 
 @with_session
@@ -282,12 +565,12 @@ def create_room_assignment(session: Session, patient: Patient | int, room: int):
     """
     if isinstance(patient, Patient):
         patient = patient.id
-    query = text("INSERT INTO room_assignment (room_number, patient_id) VALUES (:r_n, :p_id)")
     session.begin()
-    result = session.execute(
-        query,
+    result = statements.execute(
+        session, statements.INSERT_ROOM_ASSIGNMENT,
         {'r_n': room, 'p_id': patient}
     )
+    SummaryTables.add_room_patient(session, room)
     return result
 
 
@@ -307,14 +590,12 @@ def order_lab_test(session: Session, patient: Patient | int, doctor: Doctor | in
     if isinstance(doctor, Doctor):
         doctor = doctor.id
 
-    query = text("INSERT INTO ordered_lab_test (patient_id, lab_test_id, doctor_id) "
-                 "VALUES (:p_id, :test_id, :dr_id);")
-
     session.begin()
-    result = session.execute(
-        query,
+    result = statements.execute(
+        session, statements.INSERT_ORDERED_LAB_TEST,
         {'d_id': test.disease_id, 'test_id': test.id, 'p_id': patient, 'dr_id': doctor}
     )
+    SummaryTables.add_test(session, patient, test.id)
     print('Returning Lab Test Result')
     return result
 
@@ -341,17 +622,13 @@ def order_prescription(session: Session, patient: Patient | int, disease: Diseas
         treatment = treatment.id
     print(f'Ordering Rx for {patient = }, {disease = }, {treatment = }')
 
-    query = text(
-        "INSERT INTO patient_prescription "
-        "(patient_id, disease_id, treatment_id, start_date, end_date, dosage_instructions) "
-        "VALUES (:patient_id, :disease_id, :treatment_id, :start_date, :end_date, :comments);")
-
     session.begin()
-    session.execute(
-        query,
+    statements.execute(
+        session, statements.INSERT_PRESCRIPTION,
         {'patient_id': patient, 'disease_id': disease, 'treatment_id': treatment, 'start_date': start_date,
          'end_date': end_date, 'comments': comments}
     )
+    SummaryTables.add_treatment(session, patient, treatment)
 
 
 @with_session
@@ -372,37 +649,145 @@ def make_appointment(session: Session, patient: Patient | int, doctor: Doctor |
     if isinstance(doctor, Doctor):
         doctor = doctor.id
 
-    query = text("CALL ScheduleAppointment(:patient_id, :doctor_id, :appointment, :description);")
-
     session.begin()
-    result = session.execute(
-        query,
+    result = statements.execute(
+        session, statements.CALL_SCHEDULE_APPOINTMENT,
         {'patient_id': patient, 'doctor_id': doctor, 'appointment': appointment, 'description': description}
     )
+    SummaryTables.add_appointments(session, [AppointmentRequest(patient, doctor, appointment, description)])
+    # The doctor_info view lists appointment times, so the cached doctors are stale once this commits
+    ReferenceCache.invalidate_on_commit(session, CACHE_DOCTORS)
     print('Returning appointment result')
     return result
 
 
 @with_session
-def update_appointment_status(session: Session, appointment: Appointment | str, status: str):
+def update_appointment_status(session: Session, appointment: Appointment, status: str):
     """
     Updates the appointment status of a patient. e.g. when they check in
     :param session:
-    :param appointment: Appointment to update
+    :param appointment: Appointment to update, with the status it has before the update
     :param status: New Status
     :return:
     """
     print('Updating appointment')
 
-    query = text("CALL UpdateAppointmentStatus(:appointment_id, :status);")
-
     session.begin()
-    result = session.execute(
-        query, {"appointment_id": appointment, "status": status}
+    result = statements.execute(
+        session, statements.CALL_UPDATE_APPOINTMENT_STATUS, {"appointment_id": appointment.time, "status": status}
     )
+    SummaryTables.change_appointment_statuses(session, [appointment], status)
+    # The doctor_info view lists appointments, a cancelled one drops out of it
+    ReferenceCache.invalidate_on_commit(session, CACHE_DOCTORS)
     return result
 
 
+def _run_batch(session: Session, items: Sequence[T], statement: statements.Statement | Sequence[statements.Statement],
+               params: Callable[[T], dict[str, Any]], atomic: bool) -> BatchResult[T]:
+    """
+    Run a statement for every item in the current transaction, see `statements.execute_batch`
+    :param session: Session, with a transaction begun
+    :param items: Items to write
+    :param statement: Statement writing one item, or the statements writing one item together
+    :param params: Parameters of the statements for an item
+    :param atomic: Raise on the first failure instead, so `with_session` rolls back the whole batch
+    :return: Per item results
+    """
+    errors = statements.execute_batch(session, statement, [params(item) for item in items], atomic)
+    results: list[BatchItemResult[T]] = []
+    for item, error in zip(items, errors):
+        if error is not None:
+            print(f'Batch item {item} failed: {error}')
+        results.append(BatchItemResult(item, error is None, error))
+    return BatchResult(results)
+
+
+@with_session
+def make_appointments(session: Session, requests: Sequence[AppointmentRequest],
+                      atomic: bool = False) -> BatchResult[AppointmentRequest]:
+    """
+    Creates many appointments in one transaction, e.g. to rebook the day of a doctor. Each appointment is scheduled by
+    the ScheduleAppointment procedure like `make_appointment`, but the batch shares one connection, one commit and
+    one refresh of the summaries.
+    :param session:
+    :param requests: Appointments to make
+    :param atomic: Make all of the appointments or none of them. Otherwise the ones that fail are reported and skipped
+    :return: Per appointment results
+    """
+    print(f'Making {len(requests)} appointments')
+    session.begin()
+    batch = _run_batch(session, requests, statements.CALL_SCHEDULE_APPOINTMENT, lambda request: {
+        'patient_id': request.patient_id, 'doctor_id': request.doctor_id, 'appointment': request.time,
+        'description': request.description
+    }, atomic)
+    made = [result.item for result in batch.succeeded]
+    SummaryTables.add_appointments(session, made)
+    if made:
+        ReferenceCache.invalidate_on_commit(session, CACHE_DOCTORS)
+    print(f'Made {len(made)} of {len(requests)} appointments')
+    return batch
+
+
+@with_session
+def update_appointment_statuses(session: Session, appointments: Sequence[Appointment], status: str,
+                                atomic: bool = False) -> BatchResult[Appointment]:
+    """
+    Updates the status of many appointments in one transaction, e.g. to check in a whole clinic
+    :param session:
+    :param appointments: Appointments to update, with the status they have before the update
+    :param status: New status
+    :param atomic: Update all of the appointments or none of them. Otherwise the ones that fail are reported and
+        skipped
+    :return: Per appointment results
+    """
+    print(f'Updating {len(appointments)} appointments')
+    session.begin()
+    batch = _run_batch(session, appointments, statements.CALL_UPDATE_APPOINTMENT_STATUS,
+                       lambda appointment: {'appointment_id': appointment.time, 'status': status}, atomic)
+    SummaryTables.change_appointment_statuses(session, [result.item for result in batch.succeeded], status)
+    if batch.succeeded:
+        ReferenceCache.invalidate_on_commit(session, CACHE_DOCTORS)
+    print(f'Updated {len(batch.succeeded)} of {len(appointments)} appointments')
+    return batch
+
+
+@with_session
+def rebook_appointments(session: Session, appointments: Sequence[Appointment], doctor: BaseDoctor | int,
+                        atomic: bool = False) -> BatchResult[Appointment]:
+    """
+    Moves appointments to another doctor at the same times, e.g. when a doctor is away for the day. Per appointment,
+    the original is cancelled and the new one is scheduled in the same savepoint, so an appointment is either moved or
+    left as it was, never booked twice or lost.
+    :param session:
+    :param appointments: Appointments to move, with the status they have before the move
+    :param doctor: Doctor or ID to move them to
+    :param atomic: Move all of the appointments or none of them. Otherwise the ones that fail are reported and skipped
+    :return: Per original appointment results
+    """
+    if isinstance(doctor, BaseDoctor):
+        doctor = doctor.id
+    print(f'Rebooking {len(appointments)} appointments with doctor {doctor}')
+    session.begin()
+    # Cancel first, so the new appointment is not taken for the original one
+    batch = _run_batch(
+        session, appointments,
+        (statements.CALL_UPDATE_APPOINTMENT_STATUS, statements.CALL_SCHEDULE_APPOINTMENT),
+        lambda appointment: {
+            'appointment_id': appointment.time, 'status': CANCELLED_STATUS, 'patient_id': appointment.patient_id,
+            'doctor_id': doctor, 'appointment': appointment.time, 'description': appointment.description
+        }, atomic)
+    moved = [result.item for result in batch.succeeded]
+    SummaryTables.change_appointment_statuses(session, moved, CANCELLED_STATUS)
+    SummaryTables.add_appointments(session, [
+        AppointmentRequest(appointment.patient_id, doctor, appointment.time, appointment.description)
+        for appointment in moved
+    ])
+    if moved:
+        ReferenceCache.invalidate_on_commit(session, CACHE_DOCTORS)
+    print(f'Rebooked {len(moved)} of {len(appointments)} appointments')
+    return batch
+
+
 @with_session
 def update_test_status(session: Session, ordered_test: OrderedLabTest, result: str):
     """
@@ -413,36 +798,95 @@ def update_test_status(session: Session, ordered_test: OrderedLabTest, result: s
     :return:
     """
     print('Updating test')
-    query = text("CALL UpdateTestStatus(:patient_id, :labtest_id, :doctor_id, :result);")
     session.begin()
-    session.execute(
-        query,
+    statements.execute(
+        session, statements.CALL_UPDATE_TEST_STATUS,
         {"patient_id": ordered_test.patient_id, "labtest_id": ordered_test.lab_test_id,
          "doctor_id": ordered_test.doctor_id, "result": result}
     )
+    # The summaries list the names of the ordered tests, which don't change with the result
 
 
 @with_session
-def get_diagnoses_for_patient(session: Session, patient: Patient):
+def get_diagnoses_for_patient(session: Session, patient: Patient,
+                              generation: Optional[RequestGeneration] = None):
     """
     Gets all diagnoses for a patient. Emits on diagnoses_received.
     Maps to `NamedDiagnosis` objects
     :param session:
     :param patient:
+    :param generation: Dispatcher generation, the result is dropped if it was superseded
     :return:
     """
-    query = text("SELECT dia.*, dis.name "
-                 "FROM diagnosis AS dia "
-                 "LEFT JOIN disease AS dis ON dia.disease_id = dis.id "
-                 "WHERE patient_id = :pt_id")
-    result = session.execute(
-        query, {"pt_id": patient.id}
-    )
+    if is_superseded(generation):
+        return
+    result = statements.execute(session, statements.SELECT_PATIENT_DIAGNOSES, {"pt_id": patient.id})
     diagnoses = list(map(lambda item: NamedDiagnosis(*item), result))
     print(f'Got {len(diagnoses)} test for patient {patient}')
+    if is_superseded(generation):
+        return
     SignalManager().diagnoses_received.emit(diagnoses)
 
 
+def map_json_rows(row_type: type[T], value: Optional[str]) -> list[T]:
+    """
+    Map a JSON array of objects (JSON_ARRAYAGG of JSON_OBJECT) to row type instances. Objects must use the field
+    names of the row type as keys. JSON has no date type, so datetime fields are parsed from their string form
+    :param row_type: Dataclass to map the objects to
+    :param value: JSON array, or None if the aggregate had no rows
+    :return:
+    """
+    if value is None:
+        return []
+    hints = get_type_hints(row_type)
+    names = [f.name for f in fields(row_type) if f.init]  # type: ignore[arg-type]
+    dates = {name for name in names if hints.get(name) is datetime.datetime}
+    rows = []
+    for item in json.loads(value):
+        for name in dates:
+            if isinstance(item[name], str):
+                item[name] = datetime.datetime.fromisoformat(item[name])
+        rows.append(row_type(*(item[name] for name in names)))
+    return rows
+
+
+@with_session
+def get_patient_chart(session: Session, patient: Patient | int, doctor: Optional[BaseDoctor | int] = None,
+                      generation: Optional[RequestGeneration] = None) -> Optional[PatientChart]:
+    """
+    Gets the tests, diagnoses, prescriptions and appointments of a patient in a single query. Emits on
+    patient_chart_received.
+    :param session:
+    :param patient: Patient or ID
+    :param doctor: Only include the tests ordered by this doctor, or None for all tests
+    :param generation: Dispatcher generation, the result is dropped if it was superseded
+    :return: The chart, or None if the request was superseded
+    """
+    if is_superseded(generation):
+        return None
+    if isinstance(patient, Patient):
+        patient = patient.id
+    if isinstance(doctor, BaseDoctor):
+        doctor = doctor.id
+    tests, diagnoses, prescriptions, appointments = statements.execute(
+        session, statements.SELECT_PATIENT_CHART, {'pt_id': patient, 'dr_id': doctor}
+    ).one()
+    chart = PatientChart(
+        patient_id=patient,
+        doctor_id=doctor,
+        tests=map_json_rows(NamedOrderedLabTest, tests),
+        diagnoses=map_json_rows(NamedDiagnosis, diagnoses),
+        prescriptions=map_json_rows(NamedPrescription, prescriptions),
+        appointments=map_json_rows(NamedAppointment, appointments)
+    )
+    print(f'Got chart for patient {patient}: {len(chart.tests)} tests, {len(chart.diagnoses)} diagnoses, '
+          f'{len(chart.prescriptions)} prescriptions, {len(chart.appointments)} appointments')
+    if is_superseded(generation):
+        return None
+    SignalManager().patient_chart_received.emit(chart)
+    return chart
+
+
 @with_session
 def add_comments(session: Session, diagnosis: NamedDiagnosis, comment: str):
     """
@@ -452,14 +896,9 @@ def add_comments(session: Session, diagnosis: NamedDiagnosis, comment: str):
     :param comment: new comments
     :return:
     """
-    query = text("UPDATE diagnosis "
-                 "SET comments = :comment "
-                 "WHERE patient_id = :patient_id "
-                 "AND doctor_id = :doctor_id "
-                 "AND disease_id = :disease_id;")
     session.begin()
-    session.execute(
-        query,
+    statements.execute(
+        session, statements.UPDATE_DIAGNOSIS_COMMENTS,
         {"comment": comment, "patient_id": diagnosis.patient_id, "doctor_id": diagnosis.doctor_id,
          "disease_id": diagnosis.disease_id}
     )
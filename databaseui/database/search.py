@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+import heapq
+import re
+from bisect import bisect_left
+from collections import Counter
+from typing import Callable, Generic, Hashable, Iterable, Optional, TypeVar
+
+from databaseui.database.db_types import Doctor, NamedPatient
+
+T = TypeVar("T")
+K = TypeVar("K", bound=Hashable)
+
+_WORD = re.compile(r'[^\W_]+')
+
+# Scores of a query term matching a token. A fuzzy match scores its trigram similarity or its edit similarity,
+# which are at most 1
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+# Minimum trigram similarity of a fuzzy match, and the shortest term that is matched fuzzily
+FUZZY_THRESHOLD = 0.5
+FUZZY_MIN_LENGTH = 3
+# Short words share too few trigrams with their typos (a swapped pair of letters breaks three of the five trigrams of
+# "john"), so from this length a term also matches the tokens within a few edits, a transposition counting as one
+EDIT_MIN_LENGTH = 4
+# Edits allowed for terms shorter than LONG_TERM_LENGTH, and for longer terms
+SHORT_TERM_EDITS = 1
+LONG_TERM_EDITS = 2
+LONG_TERM_LENGTH = 7
+# Below this many candidate rows, the next query term is checked against the candidates' tokens instead of the index
+CANDIDATE_SCAN_LIMIT = 1000
+# Rows scored per query term at most. A short prefix ("j") or a common word ("gmail") matches a large part of the
+# index, scoring all of it would cost far more than a key press allows for rows nobody scrolls to
+TERM_POSTINGS_LIMIT = 2000
+
+
+def tokenize(text: Optional[str]) -> list[str]:
+    """
+    Split text into lower case search tokens (words and numbers). The parts of a phone number are also joined into one
+    token, so it can be searched with or without separators
+    :param text: Text to split, may be None
+    :return: Tokens
+    """
+    if not text:
+        return []
+    tokens = _WORD.findall(text.lower())
+    if len(tokens) > 1 and all(token.isdigit() for token in tokens):
+        tokens.append(''.join(tokens))
+    return tokens
+
+
+def trigrams(token: str) -> set[str]:
+    # Padded so short tokens and the start of words still have trigrams
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(shared: int, term_trigrams: int, token: str) -> float:
+    # Dice coefficient, a token of n characters has about n + 1 padded trigrams
+    return 2 * shared / (term_trigrams + len(token) + 1)
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal string alignment distance: insertions, deletions, substitutions and transpositions of adjacent characters
+    all count as one edit
+    :param a: First string
+    :param b: Second string
+    :param limit: Stop once the distance is known to be above this
+    :return: The distance, or `limit + 1` if it is above the limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before: Optional[list[int]] = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if before is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        before, previous = previous, current
+    return min(previous[-1], limit + 1)
+
+
+def max_edits(term: str) -> int:
+    """
+    :return: Edits a fuzzy match of the term may have, 0 if the term is too short to match by edits
+    """
+    if len(term) < EDIT_MIN_LENGTH:
+        return 0
+    return LONG_TERM_EDITS if len(term) >= LONG_TERM_LENGTH else SHORT_TERM_EDITS
+
+
+def fuzzy_score(term: str, term_trigrams: int, token: str, shared: int) -> float:
+    """
+    Score of a fuzzy match of a term and a token, the better of their trigram similarity and their edit similarity
+    :param term: Query term
+    :param term_trigrams: Number of trigrams of the term
+    :param token: Token sharing trigrams with the term
+    :param shared: Number of trigrams they share
+    :return: The score, at most 1, or 0 if they don't match
+    """
+    score = _similarity(shared, term_trigrams, token)
+    if score < FUZZY_THRESHOLD:
+        score = 0.0
+    edits = max_edits(term)
+    if edits:
+        distance = edit_distance(term, token, edits)
+        if distance <= edits:
+            score = max(score, 1 - distance / max(len(term), len(token)))
+    return score
+
+
+class SearchIndex(Generic[T, K]):
+    """
+    In memory type-ahead index over a few text fields of rows, e.g. names, phone and email of patients.
+
+    Every distinct token is kept in a sorted list, so every token starting with a query term is found with a binary
+    search. Word tokens are also kept in a trigram index, so a misspelled word still finds the words sharing most of
+    its trigrams or a few edits (e.g. two swapped letters) away from it (numbers are only matched by prefix). Rows are
+    kept in posting lists per token. A query matches the rows that match all of its terms, ranked by exact, then
+    prefix, then fuzzy matches. Lookups only touch the matching tokens and at most `TERM_POSTINGS_LIMIT` rows per
+    term, not every row.
+    Not thread safe, it is owned by the GUI thread.
+    """
+
+    def __init__(self, fields: Callable[[T], Iterable[Optional[str]]], key: Callable[[T], K],
+                 display: Callable[[T], str]):
+        """
+        :param fields: Text fields of a row to index
+        :param key: Unique key of a row
+        :param display: Display string of a row, used to order results with the same score
+        """
+        self._fields = fields
+        self._key = key
+        self._display = display
+        self._rows: dict[K, T] = {}
+        self._tokens_of: dict[K, frozenset[str]] = {}
+        self._postings: dict[str, list[K]] = {}
+        self._sorted_tokens: list[str] = []
+        # Tokens added since the last lookup, merged into the sorted tokens lazily
+        self._unsorted_tokens: list[str] = []
+        self._trigrams: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _row_tokens(self, row: T) -> frozenset[str]:
+        return frozenset(token for text in self._fields(row) for token in tokenize(text))
+
+    def _tokens(self) -> list[str]:
+        """
+        :return: Every distinct token, sorted
+        """
+        if self._unsorted_tokens:
+            # The new tokens are sorted as one run, merging two sorted runs is linear
+            self._unsorted_tokens.sort()
+            self._sorted_tokens.extend(self._unsorted_tokens)
+            self._sorted_tokens.sort()
+            self._unsorted_tokens.clear()
+        return self._sorted_tokens
+
+    def _add_token(self, token: str, key: K) -> None:
+        posting = self._postings.get(token)
+        if posting is not None:
+            posting.append(key)
+            return
+        self._postings[token] = [key]
+        self._unsorted_tokens.append(token)
+        if token.isalpha():
+            for trigram in trigrams(token):
+                self._trigrams.setdefault(trigram, set()).add(token)
+
+    def _remove_token(self, token: str, key: K) -> None:
+        posting = self._postings[token]
+        posting.remove(key)
+        if posting:
+            return
+        del self._postings[token]
+        tokens = self._tokens()
+        del tokens[bisect_left(tokens, token)]
+        if not token.isalpha():
+            return
+        for trigram in trigrams(token):
+            bucket = self._trigrams[trigram]
+            bucket.discard(token)
+            if not bucket:
+                del self._trigrams[trigram]
+
+    def clear(self) -> None:
+        self._rows.clear()
+        self._tokens_of.clear()
+        self._postings.clear()
+        self._sorted_tokens.clear()
+        self._unsorted_tokens.clear()
+        self._trigrams.clear()
+
+    def set_rows(self, rows: Iterable[T]) -> None:
+        """
+        Replace every row in the index
+        :param rows: New rows
+        :return:
+        """
+        self.clear()
+        self.add_rows(rows)
+
+    def add_rows(self, rows: Iterable[T]) -> None:
+        """
+        Add or update rows, e.g. when another page arrives
+        :param rows: Rows
+        :return:
+        """
+        for row in rows:
+            self.upsert(row)
+        # Merge the new tokens now, while the rows arrive, instead of on the next key press
+        self._tokens()
+
+    def upsert(self, row: T) -> None:
+        """
+        Add a row, or update the row with the same key after it was created or changed
+        :param row: Row
+        :return:
+        """
+        key = self._key(row)
+        old = self._tokens_of.get(key, frozenset())
+        new = self._row_tokens(row)
+        for token in old - new:
+            self._remove_token(token, key)
+        for token in new - old:
+            self._add_token(token, key)
+        self._rows[key] = row
+        self._tokens_of[key] = new
+
+    def remove(self, key: K) -> None:
+        for token in self._tokens_of.pop(key, frozenset()):
+            self._remove_token(token, key)
+        self._rows.pop(key, None)
+
+    def _prefix_tokens(self, term: str) -> Iterable[str]:
+        tokens = self._tokens()
+        i = bisect_left(tokens, term)
+        while i < len(tokens) and tokens[i].startswith(term):
+            yield tokens[i]
+            i += 1
+
+    def _fuzzy_tokens(self, term: str) -> dict[str, float]:
+        """
+        :return: Tokens similar to the term, by shared trigrams or by edit distance, with their score
+        """
+        term_trigrams = trigrams(term)
+        shared: Counter[str] = Counter()
+        for trigram in term_trigrams:
+            shared.update(self._trigrams.get(trigram, ()))
+        similar = {}
+        for token, count in shared.items():
+            score = fuzzy_score(term, len(term_trigrams), token, count)
+            if score > 0.0:
+                similar[token] = score
+        return similar
+
+    def _term_scores(self, term: str) -> tuple[dict[K, float], bool]:
+        """
+        Best score of the term against the tokens of each matching row. Exact matches are scored first, then prefix,
+        then fuzzy matches, up to `TERM_POSTINGS_LIMIT` rows
+        :return: The scores, and whether rows were left out because of the limit
+        """
+        scores: dict[K, float] = {}
+
+        def add(token: str, score: float) -> bool:
+            for key in self._postings[token]:
+                if len(scores) >= TERM_POSTINGS_LIMIT and key not in scores:
+                    return False
+                if scores.get(key, 0.0) < score:
+                    scores[key] = score
+            return True
+
+        # The exact token sorts first among the tokens it prefixes
+        for token in self._prefix_tokens(term):
+            if not add(token, EXACT_SCORE if token == term else PREFIX_SCORE):
+                return scores, True
+        if len(term) >= FUZZY_MIN_LENGTH and term.isalpha():
+            for token, score in sorted(self._fuzzy_tokens(term).items(), key=lambda item: -item[1]):
+                if not add(token, score):
+                    return scores, True
+        return scores, False
+
+    def _candidate_scores(self, term: str, candidates: Iterable[K]) -> dict[K, float]:
+        """
+        Same as `_term_scores`, for a few candidate rows only: their own tokens are checked, instead of every token
+        matching the term
+        """
+        fuzzy = len(term) >= FUZZY_MIN_LENGTH and term.isalpha()
+        term_trigrams = trigrams(term) if fuzzy else set()
+        scores: dict[K, float] = {}
+        for key in candidates:
+            best = 0.0
+            for token in self._tokens_of[key]:
+                if token == term:
+                    best = EXACT_SCORE
+                    break
+                if token.startswith(term):
+                    best = PREFIX_SCORE
+                elif fuzzy and best < PREFIX_SCORE and token.isalpha():
+                    shared = len(term_trigrams & trigrams(token))
+                    best = max(best, fuzzy_score(term, len(term_trigrams), token, shared))
+            if best > 0.0:
+                scores[key] = best
+        return scores
+
+    def search(self, query: str, limit: int = 20) -> list[T]:
+        """
+        Find the rows matching every term of a query, best first. Terms matching more than `TERM_POSTINGS_LIMIT` rows
+        only count the best of them, unless another term narrows the rows down first
+        :param query: Search text, e.g. part of a name, a phone number or an email
+        :param limit: Maximum number of rows to return
+        :return: Matching rows
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        scored = {term: self._term_scores(term) for term in terms}
+        # Start from the term matching the fewest rows, preferring the ones whose matches are complete
+        order = sorted(terms, key=lambda t: (scored[t][1], len(scored[t][0]), -len(t)))
+        totals, _ = scored[order[0]]
+        for term in order[1:]:
+            if not totals:
+                return []
+            scores, truncated = scored[term]
+            # A truncated term may have left out the candidates, check their tokens instead
+            if truncated or len(totals) <= CANDIDATE_SCAN_LIMIT:
+                scores = self._candidate_scores(term, totals)
+            totals = {key: total + scores[key] for key, total in totals.items() if key in scores}
+        if not totals:
+            return []
+        # Only the best rows are ordered by their display string, a short query can match most of the index
+        best = heapq.nsmallest(limit, totals.items(), key=lambda item: (-item[1], item[0]))
+        best.sort(key=lambda item: (-item[1], self._display(self._rows[item[0]])))
+        return [self._rows[key] for key, _ in best]
+
+
+class PatientSearchIndex(SearchIndex[NamedPatient, int]):
+    def __init__(self):
+        super().__init__(lambda p: (p.first_name, p.last_name, p.phone_number, p.email),
+                         lambda p: p.id, lambda p: f'{p.first_name} {p.last_name}')
+
+
+class DoctorSearchIndex(SearchIndex[Doctor, int]):
+    def __init__(self):
+        super().__init__(lambda d: (d.first_name, d.last_name, d.department_name, d.specialty_name),
+                         lambda d: d.id, lambda d: f'{d.first_name} {d.last_name}')
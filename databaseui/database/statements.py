@@ -0,0 +1,534 @@
+from __future__ import annotations
+
+from typing import Any, Optional, Sequence
+
+from mysql.connector import Error as MySQLError
+from sqlalchemy import text, bindparam, TextClause, Result
+from sqlalchemy.dialects.mysql.mysqlconnector import MySQLDialect_mysqlconnector
+from sqlalchemy.engine.result import IteratorResult, SimpleResultMetaData
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from databaseui.database.metrics import QueryMetrics
+
+# Key of the prepared cursors in the `info` dict of a pooled connection, which lives as long as the DBAPI connection
+PREPARED_CURSORS_KEY = 'prepared_cursors'
+
+# Dialect used to rewrite named parameters to the positional `?` markers of server side prepared statements
+_POSITIONAL_DIALECT = MySQLDialect_mysqlconnector(paramstyle='qmark')
+# Dialect used to render the `%s` markers mysql-connector fills in on the client, for multi-statement batches
+_FORMAT_DIALECT = MySQLDialect_mysqlconnector(paramstyle='format')
+# Savepoint of the batch item running, reused by every item
+_BATCH_SAVEPOINT = 'batch_item'
+
+
+class Statement:
+    """
+    A SQL statement compiled once at import time. `clause` is reused on every call, so SQLAlchemy's compiled cache is
+    hit without building and hashing a new `text()` object each time.
+    Statements registered with `prepare=True` can also run as server side prepared statements, see `execute`.
+    """
+    __slots__ = ('name', 'sql', 'clause', 'prepare', 'positional_sql', 'positional_names')
+
+    def __init__(self, name: str, sql: str, prepare: bool = False, expanding: tuple[str, ...] = ()):
+        self.name = name
+        self.sql = sql
+        self.clause: TextClause = text(sql)
+        if expanding:
+            # Lists bound to `IN :name`, rendered with one marker per item at execution time
+            self.clause = self.clause.bindparams(*(bindparam(name, expanding=True) for name in expanding))
+        self.prepare = prepare
+        compiled = self.clause.compile(dialect=_POSITIONAL_DIALECT)
+        self.positional_sql: str = compiled.string
+        self.positional_names: tuple[str, ...] = tuple(compiled.positiontup or ())
+
+    def __repr__(self) -> str:
+        return f'Statement({self.name!r})'
+
+
+class StatementRegistry:
+    """
+    Registry of every statement used by the query functions, and the switch for server side prepared statements
+    """
+    _statements: dict[str, Statement] = {}
+    _use_prepared: bool = False
+
+    @staticmethod
+    def register(name: str, sql: str, prepare: bool = False, expanding: tuple[str, ...] = ()) -> Statement:
+        """
+        Compile and register a statement
+        :param name: Unique name of the statement
+        :param sql: SQL with named (`:name`) parameters
+        :param prepare: Run the statement server side prepared when prepared statements are enabled. Only useful for
+            hot, parameterized statements
+        :param expanding: Parameters bound to a list, for `IN :name`. The number of markers changes with the list, so
+            these statements can't be prepared
+        :return: The statement
+        """
+        if name in StatementRegistry._statements:
+            raise ValueError(f'Statement {name} is already registered')
+        if prepare and expanding:
+            raise ValueError(f'Statement {name} has list parameters and can not be prepared')
+        statement = Statement(name, sql, prepare, expanding)
+        StatementRegistry._statements[name] = statement
+        return statement
+
+    @staticmethod
+    def configure(use_prepared: Optional[bool] = None) -> None:
+        if use_prepared is not None:
+            StatementRegistry._use_prepared = use_prepared
+
+    @staticmethod
+    def use_prepared() -> bool:
+        return StatementRegistry._use_prepared
+
+    @staticmethod
+    def get(name: str) -> Statement:
+        return StatementRegistry._statements[name]
+
+    @staticmethod
+    def all() -> list[Statement]:
+        return list(StatementRegistry._statements.values())
+
+
+def execute(session: Session, statement: Statement, params: Optional[dict[str, Any]] = None,
+            prepared: Optional[bool] = None) -> Result[Any]:
+    """
+    Execute a registered statement in the session's transaction
+    :param session:
+    :param statement: Statement to execute
+    :param params: Named parameters
+    :param prepared: Force (or prevent) server side preparation, None follows the registry configuration
+    :return: Result of the statement
+    """
+    if prepared is None:
+        prepared = statement.prepare and StatementRegistry.use_prepared()
+    if prepared and session.get_bind().dialect.driver == 'mysqlconnector':
+        return _execute_prepared(session, statement, params or {})
+    return session.execute(statement.clause, params)
+
+
+def _execute_prepared(session: Session, statement: Statement, params: dict[str, Any]) -> Result[Any]:
+    """
+    Run a statement with a prepared cursor of mysql-connector. The statement is prepared on the server the first time it
+    runs on a connection, and the cursor is kept in the connection's `info`, so later calls on that connection only
+    send the parameters (COM_STMT_EXECUTE) and the server skips parsing and planning.
+    """
+    connection = session.connection().connection
+    cursors = connection.info.setdefault(PREPARED_CURSORS_KEY, {})
+    cursor = cursors.get(statement.name)
+    if cursor is None:
+        # mysql-connector connection, its cursors take `prepared`
+        dbapi_connection: Any = connection.dbapi_connection
+        cursor = dbapi_connection.cursor(prepared=True)
+        cursors[statement.name] = cursor
+    cursor.execute(statement.positional_sql, tuple(params[name] for name in statement.positional_names))
+    if cursor.description is None:
+        QueryMetrics.count_rows(cursor.rowcount)
+        return IteratorResult(SimpleResultMetaData([]), iter(()))
+    rows = cursor.fetchall()
+    # Engine events don't see raw cursors, count the rows here instead
+    QueryMetrics.count_rows(len(rows))
+    return IteratorResult(SimpleResultMetaData([d[0] for d in cursor.description]), iter(rows))
+
+
+
+def execute_batch(session: Session, statement: Statement | Sequence[Statement], params: Sequence[dict[str, Any]],
+                  atomic: bool = False) -> list[Optional[str]]:
+    """
+    Execute a statement once per parameter set in the session's transaction. On mysql-connector the whole batch is
+    sent as one multi-statement query, so it costs one round trip instead of one (or three, with a savepoint) per item.
+    Unless `atomic`, every item runs in a savepoint: a failing item is rolled back to it (a procedure may have run part
+    of its statements) and reported, and the rest of the batch is sent again, one more round trip per failure.
+    An item can run several statements, which all take their parameters from the item's parameters and succeed or
+    fail together. The statements must not have expanding parameters.
+    :param session: Session, with a transaction begun
+    :param statement: Statement to execute, or the statements of each item, in order
+    :param params: Named parameters of each item
+    :param atomic: Raise on the first failure instead, so the caller rolls back the whole transaction
+    :return: Per item, the error message if it failed, None if it succeeded
+    """
+    item_statements = (statement,) if isinstance(statement, Statement) else tuple(statement)
+    if session.get_bind().dialect.driver != 'mysqlconnector':
+        return _execute_batch_each(session, item_statements, params, atomic)
+    compiled = [s.clause.compile(dialect=_FORMAT_DIALECT) for s in item_statements]
+    item_sql = [c.string for c in compiled]
+    names = tuple(name for c in compiled for name in c.positiontup or ())
+    # mysql-connector connection, its cursors take `multi`
+    connection: Any = session.connection().connection.dbapi_connection
+    errors: list[Optional[str]] = []
+    while len(errors) < len(params):
+        start = len(errors)
+        # The index of the last item that made it, in a user variable as it survives the rollback of a failed item
+        queries = [f'SET @batch_done = {start - 1}']
+        args: list[Any] = []
+        for index, item in enumerate(params[start:], start):
+            if atomic:
+                queries += item_sql
+            else:
+                queries += [f'SAVEPOINT {_BATCH_SAVEPOINT}', *item_sql, f'RELEASE SAVEPOINT {_BATCH_SAVEPOINT}',
+                            f'SET @batch_done = {index}']
+            args.extend(item[name] for name in names)
+        cursor = connection.cursor()
+        try:
+            for result in cursor.execute('; '.join(queries), args, multi=True):
+                if result.with_rows:
+                    result.fetchall()
+        except MySQLError as e:
+            if atomic:
+                raise
+            # The server stops at the failing statement, roll back the item and find out which one it was
+            cursor.close()
+            cursor = connection.cursor()
+            done = start - 1
+            for result in cursor.execute(f'ROLLBACK TO SAVEPOINT {_BATCH_SAVEPOINT}; SELECT @batch_done', multi=True):
+                if result.with_rows:
+                    (done,) = result.fetchall()[0]
+            errors += [None] * (int(done) + 1 - start)
+            errors.append(str(e))
+            continue
+        finally:
+            cursor.close()
+        errors += [None] * (len(params) - start)
+    return errors
+
+
+def _execute_batch_each(session: Session, item_statements: Sequence[Statement], params: Sequence[dict[str, Any]],
+                        atomic: bool) -> list[Optional[str]]:
+    """
+    `execute_batch` for other drivers, one round trip per statement
+    """
+    errors: list[Optional[str]] = []
+    for item in params:
+        if atomic:
+            for statement in item_statements:
+                execute(session, statement, item).close()
+            errors.append(None)
+            continue
+        savepoint = session.begin_nested()
+        try:
+            for statement in item_statements:
+                execute(session, statement, item).close()
+            savepoint.commit()
+        except DBAPIError as e:
+            savepoint.rollback()
+            errors.append(str(e.orig))
+            continue
+        errors.append(None)
+    return errors
+
+
+# Reference data
+SELECT_TREATMENTS = StatementRegistry.register('select_treatments', "SELECT * FROM `treatment`")
+SELECT_LAB_TESTS = StatementRegistry.register('select_lab_tests', "SELECT * FROM `lab_test`")
+SELECT_DISEASES = StatementRegistry.register('select_diseases', "SELECT * FROM `disease`")
+SELECT_DOCTORS = StatementRegistry.register('select_doctors', "SELECT * FROM `doctor_info`")
+SELECT_DEPARTMENT_STATISTICS = StatementRegistry.register('select_department_statistics',
+                                                          "SELECT * FROM `department_statistics`")
+SELECT_AVAILABILITY = StatementRegistry.register('select_availability', "SELECT * FROM `availability`")
+# Booked slots of every doctor, for the availability index. Cancelled appointments don't hold their slot
+SELECT_BOOKED_SLOTS = StatementRegistry.register(
+    'select_booked_slots',
+    "SELECT doctor_id, time FROM appointment "
+    "WHERE time >= :since AND (status IS NULL OR status NOT IN :free_statuses)",
+    expanding=('free_statuses',)
+)
+
+# Patients
+COUNT_PATIENTS_AFTER = StatementRegistry.register(
+    'count_patients_after', "SELECT COUNT(*) FROM patient WHERE id > :after_id"
+)
+SELECT_PATIENT_PAGE = StatementRegistry.register(
+    'select_patient_page',
+    "SELECT * FROM `patient_info` WHERE id > :after_id ORDER BY id LIMIT :page_size",
+    prepare=True
+)
+SELECT_PATIENT = StatementRegistry.register(
+    'select_patient',
+    "SELECT * FROM `patient_info` WHERE id = :patient_id",
+    prepare=True
+)
+# Full rows of a page of patient search results, by id. MySQL 8.0.22+ pushes the id list down into the view
+SELECT_PATIENTS_BY_IDS = StatementRegistry.register(
+    'select_patients_by_ids',
+    "SELECT * FROM `patient_info` WHERE id IN :patient_ids ORDER BY id",
+    expanding=('patient_ids',)
+)
+UPDATE_PERSON = StatementRegistry.register(
+    'update_person',
+    "UPDATE person "
+    "INNER JOIN patient ON patient.person_id = person.id "
+    "SET first_name = :first_name, last_name = :last_name "
+    "WHERE patient.person_id = :person_id"
+)
+UPDATE_PATIENT = StatementRegistry.register(
+    'update_patient',
+    "UPDATE patient "
+    "SET gender = :gender, sex = :sex, sexual_orientation = :sexual_orientation, DOB = :dob, "
+    "phone_number = :phone_number, email = :email, address = :address "
+    "WHERE patient.id = :patient_id"
+)
+INSERT_PERSON = StatementRegistry.register(
+    'insert_person',
+    "INSERT INTO person (first_name, last_name) VALUES (:first_name, :last_name)"
+)
+SET_PERSON_ID = StatementRegistry.register('set_person_id', "SET @person_id = LAST_INSERT_ID()")
+INSERT_PATIENT = StatementRegistry.register(
+    'insert_patient',
+    "INSERT INTO patient (person_id, gender, sex, sexual_orientation, DOB, phone_number, email, address) "
+    "VALUES (@person_id, :gender, :sex, :sexual_orientation, :DOB, :phone_number, :email, :address)"
+)
+SELECT_LAST_INSERT_ID = StatementRegistry.register('select_last_insert_id', "SELECT LAST_INSERT_ID()")
+INSERT_ROOM_ASSIGNMENT = StatementRegistry.register(
+    'insert_room_assignment',
+    "INSERT INTO room_assignment (room_number, patient_id) VALUES (:r_n, :p_id)"
+)
+
+# Appointments
+SELECT_APPOINTMENTS = StatementRegistry.register(
+    'select_appointments',
+    "SELECT appointment.*, CONCAT(pe.first_name, ' ', pe.last_name) AS patient_name "
+    "FROM appointment "
+    "INNER JOIN patient AS pa ON pa.id = appointment.patient_id "
+    "LEFT JOIN person AS pe on pe.id = pa.person_id "
+    "WHERE pa.id = :patient_id",
+    prepare=True
+)
+CALL_SCHEDULE_APPOINTMENT = StatementRegistry.register(
+    'call_schedule_appointment',
+    "CALL ScheduleAppointment(:patient_id, :doctor_id, :appointment, :description)"
+)
+CALL_UPDATE_APPOINTMENT_STATUS = StatementRegistry.register(
+    'call_update_appointment_status',
+    "CALL UpdateAppointmentStatus(:appointment_id, :status)"
+)
+# Appointments of one day, for the bulk admin operations on a doctor's or a department's day
+SELECT_DOCTOR_DAY_APPOINTMENTS = StatementRegistry.register(
+    'select_doctor_day_appointments',
+    "SELECT appointment.*, CONCAT(pe.first_name, ' ', pe.last_name) AS patient_name "
+    "FROM appointment "
+    "INNER JOIN patient AS pa ON pa.id = appointment.patient_id "
+    "LEFT JOIN person AS pe on pe.id = pa.person_id "
+    "WHERE appointment.doctor_id = :doctor_id AND appointment.time >= :start AND appointment.time < :end "
+    "ORDER BY appointment.time"
+)
+SELECT_DEPARTMENT_DAY_APPOINTMENTS = StatementRegistry.register(
+    'select_department_day_appointments',
+    "SELECT appointment.*, CONCAT(pe.first_name, ' ', pe.last_name) AS patient_name "
+    "FROM appointment "
+    "INNER JOIN patient AS pa ON pa.id = appointment.patient_id "
+    "LEFT JOIN person AS pe on pe.id = pa.person_id "
+    "WHERE appointment.department_id = :department_id AND appointment.time >= :start AND appointment.time < :end "
+    "ORDER BY appointment.time"
+)
+
+# Lab tests
+SELECT_PATIENT_TESTS = StatementRegistry.register(
+    'select_patient_tests',
+    "SELECT ordered_lab_test.*, lt.test_name FROM "
+    "`ordered_lab_test` "
+    "LEFT JOIN lab_test as lt ON ordered_lab_test.lab_test_id = lt.id "
+    "WHERE doctor_id = :dr_id AND patient_id = :pt_id",
+    prepare=True
+)
+INSERT_ORDERED_LAB_TEST = StatementRegistry.register(
+    'insert_ordered_lab_test',
+    "INSERT INTO ordered_lab_test (patient_id, lab_test_id, doctor_id) VALUES (:p_id, :test_id, :dr_id)"
+)
+CALL_UPDATE_TEST_STATUS = StatementRegistry.register(
+    'call_update_test_status',
+    "CALL UpdateTestStatus(:patient_id, :labtest_id, :doctor_id, :result)"
+)
+
+# Diagnoses and prescriptions
+SELECT_PATIENT_DIAGNOSES = StatementRegistry.register(
+    'select_patient_diagnoses',
+    "SELECT dia.*, dis.name "
+    "FROM diagnosis AS dia "
+    "LEFT JOIN disease AS dis ON dia.disease_id = dis.id "
+    "WHERE patient_id = :pt_id",
+    prepare=True
+)
+INSERT_DIAGNOSIS = StatementRegistry.register(
+    'insert_diagnosis',
+    "INSERT INTO diagnosis (patient_id, doctor_id, disease_id) VALUES (:p, :dr, :ds)"
+)
+UPDATE_DIAGNOSIS_COMMENTS = StatementRegistry.register(
+    'update_diagnosis_comments',
+    "UPDATE diagnosis "
+    "SET comments = :comment "
+    "WHERE patient_id = :patient_id "
+    "AND doctor_id = :doctor_id "
+    "AND disease_id = :disease_id"
+)
+INSERT_PRESCRIPTION = StatementRegistry.register(
+    'insert_prescription',
+    "INSERT INTO patient_prescription "
+    "(patient_id, disease_id, treatment_id, start_date, end_date, dosage_instructions) "
+    "VALUES (:patient_id, :disease_id, :treatment_id, :start_date, :end_date, :comments)"
+)
+
+# Every part of the chart is aggregated into a JSON array by a scalar subquery, so the whole chart is one statement
+# and one result row, however many tests, diagnoses, prescriptions and appointments the patient has
+SELECT_PATIENT_CHART = StatementRegistry.register(
+    'select_patient_chart',
+    "SELECT "
+    "(SELECT JSON_ARRAYAGG(JSON_OBJECT("
+    "'patient_id', olt.patient_id, 'lab_test_id', olt.lab_test_id, 'doctor_id', olt.doctor_id, "
+    "'result', olt.result, 'test_name', lt.test_name)) "
+    "FROM ordered_lab_test AS olt "
+    "LEFT JOIN lab_test AS lt ON olt.lab_test_id = lt.id "
+    "WHERE olt.patient_id = :pt_id AND (:dr_id IS NULL OR olt.doctor_id = :dr_id)) AS tests, "
+    "(SELECT JSON_ARRAYAGG(JSON_OBJECT("
+    "'patient_id', dia.patient_id, 'doctor_id', dia.doctor_id, 'disease_id', dia.disease_id, 'date', dia.date, "
+    "'comments', dia.comments, 'disease_name', dis.name)) "
+    "FROM diagnosis AS dia "
+    "LEFT JOIN disease AS dis ON dia.disease_id = dis.id "
+    "WHERE dia.patient_id = :pt_id) AS diagnoses, "
+    "(SELECT JSON_ARRAYAGG(JSON_OBJECT("
+    "'patient_id', pp.patient_id, 'disease_id', pp.disease_id, 'treatment_id', pp.treatment_id, "
+    "'start_date', pp.start_date, 'end_date', pp.end_date, 'dosage_instructions', pp.dosage_instructions, "
+    "'treatment_name', tr.name)) "
+    "FROM patient_prescription AS pp "
+    "LEFT JOIN treatment AS tr ON pp.treatment_id = tr.id "
+    "WHERE pp.patient_id = :pt_id) AS prescriptions, "
+    "(SELECT JSON_ARRAYAGG(JSON_OBJECT("
+    "'id', ap.id, 'patient_id', ap.patient_id, 'doctor_id', ap.doctor_id, 'department_id', ap.department_id, "
+    "'time', ap.time, 'status', ap.status, 'description', ap.description, "
+    "'patient_name', CONCAT(pe.first_name, ' ', pe.last_name))) "
+    "FROM appointment AS ap "
+    "INNER JOIN patient AS pa ON pa.id = ap.patient_id "
+    "LEFT JOIN person AS pe ON pe.id = pa.person_id "
+    "WHERE ap.patient_id = :pt_id) AS appointments",
+    prepare=True
+)
+
+# Summary tables, materialized copies of the department_statistics and patient_info views. Rows are maintained by the
+# write functions, in the same transaction as the write
+SELECT_DEPARTMENT_SUMMARY = StatementRegistry.register(
+    'select_department_summary', "SELECT * FROM `department_summary` ORDER BY id"
+)
+SELECT_PATIENT_SUMMARY_PAGE = StatementRegistry.register(
+    'select_patient_summary_page',
+    "SELECT * FROM `patient_summary` WHERE id > :after_id ORDER BY id LIMIT :page_size",
+    prepare=True
+)
+SELECT_PATIENT_SUMMARY = StatementRegistry.register(
+    'select_patient_summary',
+    "SELECT * FROM `patient_summary` WHERE id = :patient_id",
+    prepare=True
+)
+SELECT_PATIENT_SUMMARIES_BY_IDS = StatementRegistry.register(
+    'select_patient_summaries_by_ids',
+    "SELECT * FROM `patient_summary` WHERE id IN :patient_ids ORDER BY id",
+    expanding=('patient_ids',)
+)
+# New patients get their summary row inserted, the other writes update the counters and aggregates of the rows they
+# touched in place, which only locks those rows. Only `rebuild` re-reads the views
+INSERT_PATIENT_SUMMARY = StatementRegistry.register(
+    'insert_patient_summary',
+    "INSERT INTO `patient_summary` (id, person_id, gender, sex, sexual_orientation, DOB, phone_number, email, address, "
+    "first_name, last_name) "
+    "VALUES (:patient_id, @person_id, :gender, :sex, :sexual_orientation, :DOB, :phone_number, :email, :address, "
+    ":first_name, :last_name)"
+)
+UPDATE_PATIENT_SUMMARY = StatementRegistry.register(
+    'update_patient_summary',
+    "UPDATE `patient_summary` "
+    "SET first_name = :first_name, last_name = :last_name, gender = :gender, sex = :sex, "
+    "sexual_orientation = :sexual_orientation, DOB = :dob, phone_number = :phone_number, email = :email, "
+    "address = :address "
+    "WHERE id = :patient_id"
+)
+APPEND_PATIENT_SUMMARY_APPOINTMENT = StatementRegistry.register(
+    'append_patient_summary_appointment',
+    "UPDATE `patient_summary` SET appts = CONCAT_WS(',', appts, :time) WHERE id = :patient_id"
+)
+APPEND_PATIENT_SUMMARY_DIAGNOSIS = StatementRegistry.register(
+    'append_patient_summary_diagnosis',
+    "UPDATE `patient_summary` "
+    "SET diagnoses = CONCAT_WS(',', diagnoses, (SELECT name FROM disease WHERE id = :disease_id)) "
+    "WHERE id = :patient_id"
+)
+APPEND_PATIENT_SUMMARY_TREATMENT = StatementRegistry.register(
+    'append_patient_summary_treatment',
+    "UPDATE `patient_summary` "
+    "SET treatments = CONCAT_WS(',', treatments, (SELECT name FROM treatment WHERE id = :treatment_id)) "
+    "WHERE id = :patient_id"
+)
+APPEND_PATIENT_SUMMARY_TEST = StatementRegistry.register(
+    'append_patient_summary_test',
+    "UPDATE `patient_summary` "
+    "SET tests = CONCAT_WS(',', tests, (SELECT test_name FROM lab_test WHERE id = :test_id)) "
+    "WHERE id = :patient_id"
+)
+ADD_DEPARTMENT_SUMMARY_APPOINTMENTS = StatementRegistry.register(
+    'add_department_summary_appointments',
+    "UPDATE `department_summary` SET scheduled_appointments = scheduled_appointments + :delta "
+    "WHERE id = :department_id"
+)
+ADD_DOCTOR_DEPARTMENT_SUMMARY_APPOINTMENTS = StatementRegistry.register(
+    'add_doctor_department_summary_appointments',
+    "UPDATE `department_summary` SET scheduled_appointments = scheduled_appointments + :delta "
+    "WHERE id = (SELECT department_id FROM doctor WHERE id = :doctor_id)"
+)
+ADD_ROOM_DEPARTMENT_SUMMARY_PATIENT = StatementRegistry.register(
+    'add_room_department_summary_patient',
+    "UPDATE `department_summary` SET number_of_patients = number_of_patients + 1 "
+    "WHERE id = (SELECT dept_id FROM room WHERE room_number = :room_number)"
+)
+CREATE_DEPARTMENT_SUMMARY = StatementRegistry.register(
+    'create_department_summary',
+    "CREATE TABLE IF NOT EXISTS `department_summary` (PRIMARY KEY (id)) "
+    "SELECT * FROM `department_statistics` WHERE FALSE"
+)
+CREATE_PATIENT_SUMMARY = StatementRegistry.register(
+    'create_patient_summary',
+    "CREATE TABLE IF NOT EXISTS `patient_summary` (PRIMARY KEY (id)) "
+    "SELECT * FROM `patient_info` WHERE FALSE"
+)
+CLEAR_DEPARTMENT_SUMMARY = StatementRegistry.register('clear_department_summary', "DELETE FROM `department_summary`")
+CLEAR_PATIENT_SUMMARY = StatementRegistry.register('clear_patient_summary', "DELETE FROM `patient_summary`")
+FILL_DEPARTMENT_SUMMARY = StatementRegistry.register(
+    'fill_department_summary', "INSERT INTO `department_summary` SELECT * FROM `department_statistics`"
+)
+FILL_PATIENT_SUMMARY = StatementRegistry.register(
+    'fill_patient_summary', "INSERT INTO `patient_summary` SELECT * FROM `patient_info`"
+)
+
+# Separators a phone number may be stored or typed with, the same as `patient_search._PHONE`
+PHONE_SEPARATORS = ('-', ' ', '(', ')', '.', '+')
+
+
+def phone_digits_sql(column: str) -> str:
+    """
+    SQL expression stripping the separators from a phone number column, so stored numbers compare as digits whatever
+    their format. The functional index `idx_patient_phone_digits` is on the same expression, MySQL only uses it when
+    the query repeats the expression exactly
+    :param column: Column, e.g. pa.phone_number
+    :return: The expression
+    """
+    expression = column
+    for separator in PHONE_SEPARATORS:
+        expression = f"REPLACE({expression}, '{separator}', '')"
+    return expression
+
+
+# Indexes of the server side patient search, see `databaseui.database.patient_search`
+CREATE_PERSON_NAME_INDEX = StatementRegistry.register(
+    'create_person_name_index', "CREATE INDEX idx_person_last_first ON person (last_name, first_name)"
+)
+CREATE_PERSON_FIRST_NAME_INDEX = StatementRegistry.register(
+    'create_person_first_name_index', "CREATE INDEX idx_person_first ON person (first_name)"
+)
+CREATE_PATIENT_DOB_INDEX = StatementRegistry.register(
+    'create_patient_dob_index', "CREATE INDEX idx_patient_dob ON patient (DOB)"
+)
+# Functional index (MySQL 8.0.13+) on the digits of the phone number
+CREATE_PATIENT_PHONE_DIGITS_INDEX = StatementRegistry.register(
+    'create_patient_phone_digits_index',
+    f"CREATE INDEX idx_patient_phone_digits ON patient (({phone_digits_sql('phone_number')}))"
+)
+CREATE_PERSON_NAME_FULLTEXT = StatementRegistry.register(
+    'create_person_name_fulltext', "CREATE FULLTEXT INDEX ft_person_name ON person (first_name, last_name)"
+)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from collections import Counter
+from typing import Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from databaseui.database import statements
+from databaseui.database.db_types import Appointment, AppointmentRequest, NamedPatient, occupies_slot
+
+
+class SummaryTables:
+    """
+    Materialized copies of the `department_statistics` and `patient_info` views, so the admin dashboard and the patient
+    list read O(departments) / O(page) rows instead of aggregating every room, patient and appointment on each read.
+
+    The write functions apply their change to the summary rows of the keys they touched, in their own transaction, so
+    the summaries commit or roll back with the write. Changes are deltas (`count = count + 1`, an item appended to an
+    aggregate) on the primary key, so a write only locks the summary rows it changes and never re-aggregates the views.
+    The deltas follow the rules of the views: `scheduled_appointments` counts the appointments that hold their slot
+    (see `occupies_slot`), `number_of_patients` the room assignments. `rebuild` recomputes the tables from the views,
+    to repair them or after loading data outside of the application.
+    Both reading from and maintaining the summaries only happen once they are enabled, after the tables were created.
+    """
+    _enabled: bool = False
+
+    @staticmethod
+    def configure(enabled: Optional[bool] = None) -> None:
+        if enabled is not None:
+            SummaryTables._enabled = enabled
+
+    @staticmethod
+    def enabled() -> bool:
+        return SummaryTables._enabled
+
+    @staticmethod
+    def add_patient(session: Session, patient_id: int, patient: NamedPatient) -> None:
+        """
+        Insert the summary row of a new patient, right after the patient and its person were inserted
+        :param session: Session of the write, with `@person_id` set to the new person
+        :param patient_id: Id of the new patient
+        :param patient: Patient information
+        :return:
+        """
+        if not SummaryTables._enabled:
+            return
+        statements.execute(session, statements.INSERT_PATIENT_SUMMARY, {
+            'patient_id': patient_id, 'gender': patient.gender, 'sex': patient.sex,
+            'sexual_orientation': patient.sexual_orientation, 'DOB': patient.DOB, 'phone_number': patient.phone_number,
+            'email': patient.email, 'address': patient.address, 'first_name': patient.first_name,
+            'last_name': patient.last_name
+        })
+
+    @staticmethod
+    def update_patient(session: Session, patient: NamedPatient) -> None:
+        if not SummaryTables._enabled:
+            return
+        statements.execute(session, statements.UPDATE_PATIENT_SUMMARY, {
+            'patient_id': patient.id, 'first_name': patient.first_name, 'last_name': patient.last_name,
+            'gender': patient.gender, 'sex': patient.sex, 'sexual_orientation': patient.sexual_orientation,
+            'dob': patient.DOB, 'phone_number': patient.phone_number, 'email': patient.email,
+            'address': patient.address
+        })
+
+    @staticmethod
+    def add_diagnosis(session: Session, patient_id: int, disease_id: int) -> None:
+        if not SummaryTables._enabled:
+            return
+        statements.execute(session, statements.APPEND_PATIENT_SUMMARY_DIAGNOSIS,
+                           {'patient_id': patient_id, 'disease_id': disease_id})
+
+    @staticmethod
+    def add_treatment(session: Session, patient_id: int, treatment_id: int) -> None:
+        if not SummaryTables._enabled:
+            return
+        statements.execute(session, statements.APPEND_PATIENT_SUMMARY_TREATMENT,
+                           {'patient_id': patient_id, 'treatment_id': treatment_id})
+
+    @staticmethod
+    def add_test(session: Session, patient_id: int, test_id: int) -> None:
+        if not SummaryTables._enabled:
+            return
+        statements.execute(session, statements.APPEND_PATIENT_SUMMARY_TEST,
+                           {'patient_id': patient_id, 'test_id': test_id})
+
+    @staticmethod
+    def add_room_patient(session: Session, room_number: int) -> None:
+        if not SummaryTables._enabled:
+            return
+        statements.execute(session, statements.ADD_ROOM_DEPARTMENT_SUMMARY_PATIENT, {'room_number': room_number})
+
+    @staticmethod
+    def add_appointments(session: Session, appointments: Sequence[AppointmentRequest]) -> None:
+        """
+        Count new appointments: their times are appended to the patients' rows, and the departments of the doctors
+        get one more scheduled appointment per appointment
+        :param session: Session of the write
+        :param appointments: Appointments that were made
+        :return:
+        """
+        if not SummaryTables._enabled:
+            return
+        for appointment in appointments:
+            statements.execute(session, statements.APPEND_PATIENT_SUMMARY_APPOINTMENT,
+                               {'patient_id': appointment.patient_id, 'time': appointment.time})
+        for doctor_id, delta in sorted(Counter(a.doctor_id for a in appointments).items()):
+            statements.execute(session, statements.ADD_DOCTOR_DEPARTMENT_SUMMARY_APPOINTMENTS,
+                               {'doctor_id': doctor_id, 'delta': delta})
+
+    @staticmethod
+    def change_appointment_statuses(session: Session, appointments: Sequence[Appointment], status: str) -> None:
+        """
+        Count status changes of appointments. Only changes between a status holding the slot and one giving it back
+        change the scheduled appointments of the departments
+        :param session: Session of the write
+        :param appointments: Appointments that were updated, with the status they had before
+        :param status: New status
+        :return:
+        """
+        if not SummaryTables._enabled:
+            return
+        deltas: Counter[int] = Counter()
+        for appointment in appointments:
+            deltas[appointment.department_id] += occupies_slot(status) - occupies_slot(appointment.status)
+        # Sorted, so concurrent writes lock the department rows in the same order
+        for department_id, delta in sorted(deltas.items()):
+            if delta:
+                statements.execute(session, statements.ADD_DEPARTMENT_SUMMARY_APPOINTMENTS,
+                                   {'department_id': department_id, 'delta': delta})
+
+    @staticmethod
+    def create(session: Session) -> None:
+        """
+        Create the summary tables if they don't exist, with the columns of their views
+        """
+        statements.execute(session, statements.CREATE_DEPARTMENT_SUMMARY)
+        statements.execute(session, statements.CREATE_PATIENT_SUMMARY)
+
+    @staticmethod
+    def rebuild(session: Session) -> tuple[int, int]:
+        """
+        Recompute both summary tables from their views, in the session's transaction
+        :return: Number of department and patient rows written
+        """
+        # An INSERT returns a CursorResult, which has the row count
+        statements.execute(session, statements.CLEAR_DEPARTMENT_SUMMARY)
+        departments = session.execute(statements.FILL_DEPARTMENT_SUMMARY.clause).rowcount  # type: ignore[attr-defined]
+        statements.execute(session, statements.CLEAR_PATIENT_SUMMARY)
+        patients = session.execute(statements.FILL_PATIENT_SUMMARY.clause).rowcount  # type: ignore[attr-defined]
+        return departments, patients
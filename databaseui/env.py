@@ -1,6 +1,7 @@
 import os
 from dataclasses import dataclass
 from pprint import pprint
+from typing import Any
 
 from dotenv import load_dotenv
 from strenum import StrEnum
@@ -13,12 +14,73 @@ class EnvConfig(StrEnum):
     Database = 'DB_DATABASE'
 
 
+class OptionalEnvConfig(StrEnum):
+    PoolSize = 'DB_POOL_SIZE'
+    PoolMaxOverflow = 'DB_POOL_MAX_OVERFLOW'
+    PoolTimeout = 'DB_POOL_TIMEOUT'
+    PoolRecycle = 'DB_POOL_RECYCLE'
+    PoolPrePing = 'DB_POOL_PRE_PING'
+    PoolPrewarm = 'DB_POOL_PREWARM'
+    ExecutorQueueSize = 'DB_EXECUTOR_QUEUE_SIZE'
+    ExecutorPolicy = 'DB_EXECUTOR_POLICY'
+    SlowQueryMs = 'DB_SLOW_QUERY_MS'
+    CacheTtlS = 'DB_CACHE_TTL_S'
+    CacheDoctorsTtlS = 'DB_CACHE_DOCTORS_TTL_S'
+    MaxStatementMs = 'DB_MAX_STATEMENT_MS'
+    BackgroundMaxStatementMs = 'DB_BACKGROUND_MAX_STATEMENT_MS'
+    SelectionDebounceMs = 'UI_SELECTION_DEBOUNCE_MS'
+    ExecutionMode = 'DB_EXECUTION_MODE'
+    AsyncDriver = 'DB_ASYNC_DRIVER'
+    PreparedStatements = 'DB_PREPARED_STATEMENTS'
+    UseSummaries = 'DB_USE_SUMMARIES'
+    SearchFulltext = 'DB_SEARCH_FULLTEXT'
+    PatientSearchOnly = 'UI_PATIENT_SEARCH_ONLY'
+
+
 @dataclass
 class Config:
     Host: str
     User: str
     Password: str
     Database: str
+    # Optional entries, these keep their default when they are not set
+    PoolSize: int = 5
+    PoolMaxOverflow: int = 10
+    PoolTimeout: float = 30.0
+    PoolRecycle: int = -1
+    PoolPrePing: bool = False
+    PoolPrewarm: int = 0
+    # Database work waiting for a thread, beyond this the executor policy ('shed_background' or 'reject') applies
+    ExecutorQueueSize: int = 64
+    ExecutorPolicy: str = 'shed_background'
+    SlowQueryMs: float = 500.0
+    # Seconds reference data (treatments, diseases, tests) stays cached, and the doctors, which change more often
+    CacheTtlS: float = 900.0
+    CacheDoctorsTtlS: float = 900.0
+    # Server side execution time limits of read statements, for interactive and background work, 0 for none
+    MaxStatementMs: int = 0
+    BackgroundMaxStatementMs: int = 0
+    SelectionDebounceMs: int = 150
+    # 'threads' runs queries on the QThreadPool, 'async' runs reads on the Qt event loop with an async driver
+    ExecutionMode: str = 'threads'
+    AsyncDriver: str = 'aiomysql'
+    PreparedStatements: bool = False
+    UseSummaries: bool = False
+    SearchFulltext: bool = False
+    # Patient pickers search the database as you type instead of loading every patient
+    PatientSearchOnly: bool = False
+
+
+def _parse_value(value: str, default: Any) -> Any:
+    """
+    Parse an env value to the type of the config entry's default
+    :param value: Raw value
+    :param default: Default of the config entry
+    :return: Parsed value
+    """
+    if isinstance(default, bool):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return type(default)(value)
 
 
 def load_config() -> Config:
@@ -28,6 +90,15 @@ def load_config() -> Config:
     items = {k: os.getenv(v) for k, v in config_entries.items()}
     if None in items.values():
         raise ValueError('Invalid value in config file')
+    # noinspection PyUnresolvedReferences
+    for entry in OptionalEnvConfig:
+        value = os.getenv(entry.value)
+        if value is None:
+            continue
+        try:
+            items[entry.name] = _parse_value(value, Config.__dataclass_fields__[entry.name].default)
+        except ValueError:
+            raise ValueError(f'Invalid value for {entry.value} in config file')
     return Config(**items)  # type: ignore
 
 
@@ -8,13 +8,17 @@ class SignalManager(QObject, metaclass=QSingleton):
     treatments_received = pyqtSignal(list)
     diseases_received = pyqtSignal(list)
     tests_received = pyqtSignal(list)
-    patients_received = pyqtSignal(list, int)
+    patients_received = pyqtSignal(object, int)
+    patient_received = pyqtSignal(object, bool)
+    patient_search_received = pyqtSignal(object)
     doctors_received = pyqtSignal(list)
-    availability_received = pyqtSignal(list)
+    availability_received = pyqtSignal(object)
     dept_statistics_received = pyqtSignal(list)
     patient_tests_received = pyqtSignal(list)
     appointments_received = pyqtSignal(list)
+    day_appointments_received = pyqtSignal(list)
     diagnoses_received = pyqtSignal(list)
+    patient_chart_received = pyqtSignal(object)
 
     def __init__(self, parent=None, **kwargs):
         # noinspection PyArgumentList
@@ -0,0 +1,69 @@
+import asyncio
+import sys
+import traceback
+from typing import Callable, Awaitable
+
+from databaseui.threads.task_context import TaskContext, enter_task, exit_task
+from databaseui.threads.worker import WorkerSignals
+
+
+class AsyncTask:
+    """
+    Runs a coroutine function as a task on the asyncio event loop, and reports through the same `WorkerSignals` as a
+    `Worker`, so callers can connect to `finished` / `result` / `error` either way.
+    Signals are emitted from the event loop thread, which is the GUI thread when the loop is the qasync loop.
+
+    :param fn: Coroutine function to run
+    :param args: Arguments to pass to the function
+    :param progress: Whether to add the progress signal into the kwargs passed to the function, like `Worker`
+    :param kwargs: Keywords to pass to the function
+
+    Set `context` before starting the task to give it a priority, a cancellation token or a statement time limit, like
+    a worker. A task cancelled before it starts skips its function and only emits `finished`.
+    """
+    # Tasks that are still running. The event loop only keeps weak references to its tasks
+    _running: set['AsyncTask'] = set()
+
+    def __init__(self, fn: Callable[..., Awaitable], *args, progress: bool = False, **kwargs):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.context = TaskContext()
+        self._task = None
+        if progress:
+            self.kwargs['progress_callback'] = self.signals.progress
+
+    def start(self) -> 'AsyncTask':
+        AsyncTask._running.add(self)
+        self._task = asyncio.ensure_future(self.run())
+        return self
+
+    def cancel(self) -> None:
+        if self.context.token is not None:
+            self.context.token.cancel()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def run(self):
+        if self.context.is_cancelled():
+            AsyncTask._running.discard(self)
+            self.signals.finished.emit()
+            return
+        # Each asyncio task runs in a copy of the context, so the task context is only visible to this task
+        task = enter_task(self.context)
+        # noinspection PyBroadException
+        try:
+            result = await self.fn(*self.args, **self.kwargs)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            traceback.print_exc()
+            exctype, value = sys.exc_info()[:2]
+            self.signals.error.emit((exctype, value, traceback.format_exc()))
+        else:
+            self.signals.result.emit(result)
+        finally:
+            exit_task(task)
+            AsyncTask._running.discard(self)
+            self.signals.finished.emit()
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import inspect
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from PyQt6.QtCore import QObject, QTimer
+
+from databaseui.threads.async_task import AsyncTask
+from databaseui.threads.task_context import CancellationToken, Priority, TaskContext
+from databaseui.threads.worker import Startable, Worker
+
+
+@dataclass
+class _Channel:
+    timer: QTimer
+    generation: int = 0
+    pending: Optional[tuple[Callable, tuple, dict, bool]] = None
+    in_flight: set[Worker | AsyncTask] = field(default_factory=set)
+    submitted: int = 0
+    dispatched: int = 0
+    dropped: int = 0
+
+
+class RequestGeneration:
+    """
+    Tags one dispatched request. Once a newer request is submitted on the same channel the generation is superseded,
+    and its results should be dropped instead of emitted.
+    """
+    __slots__ = ('_channel', 'id')
+
+    def __init__(self, channel: _Channel, generation_id: int):
+        self._channel = channel
+        self.id = generation_id
+
+    def is_current(self) -> bool:
+        return self._channel.generation == self.id
+
+    def drop(self) -> None:
+        """
+        Count a result of this generation that was dropped because it was superseded
+        :return:
+        """
+        self._channel.dropped += 1
+
+
+@dataclass
+class ChannelStats:
+    submitted: int
+    dispatched: int
+    dropped: int
+
+    @property
+    def coalesced(self) -> int:
+        return self.submitted - self.dispatched
+
+
+class CoalescingDispatcher(QObject):
+    """
+    Debounces selection driven queries. Requests are submitted on a named channel, and a burst of submissions
+    (e.g. scrolling through a dropdown) is coalesced into the latest one, which runs once the channel has been quiet
+    for `delay_ms`. Every dispatched request is passed a `generation` keyword argument, submitting a newer request
+    supersedes it right away so its results can be dropped before they are emitted. Superseded requests on the thread
+    pool are also cancelled: a request still queued never runs, and the statement of a running one is killed.
+    Coroutine functions are run on the asyncio event loop, other functions on the thread pool, and requests submitted
+    with `submit_local` on the GUI thread.
+    Must be used from the GUI thread.
+    """
+
+    def __init__(self, pool: Startable, delay_ms: int = 150, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._pool = pool
+        self._delay_ms = delay_ms
+        self._channels: dict[str, _Channel] = {}
+
+    def submit(self, key: str, fn: Callable, *args, **kwargs) -> None:
+        """
+        Submit a request on a channel, replacing any request on that channel that has not been dispatched yet
+        :param key: Channel name
+        :param fn: Function to run, must accept a `generation` keyword argument
+        :param args: Positional arguments to pass to the function
+        :param kwargs: Keyword arguments to pass to the function
+        :return: None
+        """
+        channel = self._supersede(key, fn, args, kwargs)
+        channel.timer.start(self._delay_ms)
+
+    def submit_local(self, key: str, fn: Callable, *args, **kwargs) -> None:
+        """
+        Like `submit`, but the latest request runs on the GUI thread, without a `generation` argument. Used to debounce
+        work on state owned by the GUI thread, e.g. a lookup in an in memory index on every key press
+        :param key: Channel name
+        :param fn: Function to run
+        :param args: Positional arguments to pass to the function
+        :param kwargs: Keyword arguments to pass to the function
+        :return: None
+        """
+        channel = self._supersede(key, fn, args, kwargs, local=True)
+        channel.timer.start(self._delay_ms)
+
+    def submit_now(self, key: str, fn: Callable, *args, **kwargs) -> None:
+        """
+        Like `submit`, but dispatch right away without waiting for the channel to be quiet.
+        Used to refresh after a write, where there is no burst to coalesce
+        """
+        channel = self._supersede(key, fn, args, kwargs)
+        channel.timer.stop()
+        self._dispatch(channel)
+
+    def _supersede(self, key: str, fn: Callable, args: tuple, kwargs: dict, local: bool = False) -> _Channel:
+        channel = self._channels.get(key)
+        if channel is None:
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            channel = _Channel(timer)
+            timer.timeout.connect(lambda: self._dispatch(channel))
+            self._channels[key] = channel
+        # Supersede the request in flight now, not when the debounce ends
+        channel.generation += 1
+        for worker in channel.in_flight:
+            if isinstance(worker, Worker):
+                worker.cancel()
+        channel.submitted += 1
+        channel.pending = (fn, args, kwargs, local)
+        return channel
+
+    def _dispatch(self, channel: _Channel) -> None:
+        if channel.pending is None:
+            return
+        fn, args, kwargs, local = channel.pending
+        channel.pending = None
+        channel.dispatched += 1
+        if local:
+            fn(*args, **kwargs)
+            return
+        generation = RequestGeneration(channel, channel.generation)
+        worker: Worker | AsyncTask
+        if inspect.iscoroutinefunction(fn):
+            worker = AsyncTask(fn, *args, generation=generation, **kwargs)
+        else:
+            worker = Worker(fn, False, *args, generation=generation, **kwargs)
+            worker.context = TaskContext(Priority.INTERACTIVE, CancellationToken())
+        # Keep the worker alive until it is done, nothing else holds a reference to it
+        channel.in_flight.add(worker)
+        worker.signals.finished.connect(lambda: channel.in_flight.discard(worker))
+        if isinstance(worker, AsyncTask):
+            worker.start()
+        else:
+            worker.start(self._pool)
+
+    def stats(self) -> dict[str, ChannelStats]:
+        """
+        :return: Submitted, dispatched and dropped request counts per channel
+        """
+        return {key: ChannelStats(c.submitted, c.dispatched, c.dropped) for key, c in self._channels.items()}
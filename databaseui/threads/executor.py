@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+from PyQt6.QtCore import QObject, QThreadPool, QTimer
+from strenum import StrEnum
+
+from databaseui.threads.task_context import Priority
+from databaseui.threads.worker import Worker
+
+
+class Rejected(Exception):
+    """
+    Error of a worker the executor did not accept, emitted on the worker's `error` signal
+    """
+
+
+class RejectionPolicy(StrEnum):
+    # Reject whatever is submitted once the queue is full
+    REJECT = 'reject'
+    # Make room for interactive work by dropping the oldest queued background work, reject background work
+    SHED_BACKGROUND = 'shed_background'
+
+
+@dataclass
+class ExecutorStats:
+    threads: int
+    capacity: int
+    running: int
+    queued: int
+    max_queued: int
+    submitted: int
+    rejected: int
+    shed: int
+    avg_queue_wait_ms: float
+    max_queue_wait_ms: float
+
+    def __str__(self) -> str:
+        return (f'{self.running}/{self.threads} running, {self.queued}/{self.capacity} queued '
+                f'(max {self.max_queued}), {self.submitted} submitted, {self.rejected} rejected, {self.shed} shed, '
+                f'queue wait avg {self.avg_queue_wait_ms:.1f} ms max {self.max_queue_wait_ms:.1f} ms')
+
+
+class DatabaseExecutor(QObject):
+    """
+    Runs database workers with at most one thread per connection the engine pool can hand out, so a burst never
+    leaves threads blocked on a pool checkout until it times out. Work beyond that waits in a bounded queue, interactive
+    work first, and once the queue is full the rejection policy decides what is turned away. A rejected worker emits
+    `error` with `Rejected`, then `finished`, like a worker that failed.
+    A `Startable` like `QThreadPool`, so it can be passed wherever a pool is expected.
+    Must be used from the GUI thread.
+    """
+
+    def __init__(self, threads: int, capacity: int, policy: RejectionPolicy = RejectionPolicy.SHED_BACKGROUND,
+                 parent: Optional[QObject] = None):
+        """
+        :param threads: Maximum number of workers running at once
+        :param capacity: Maximum number of workers waiting for a thread
+        :param policy: What to do with work submitted while the queue is full
+        """
+        super().__init__(parent)
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(threads)
+        self._capacity = capacity
+        self._policy = policy
+        # Queued workers with the time they were queued at, interactive ones are run first
+        self._queues: dict[Priority, deque[tuple[Worker, float]]] = {
+            Priority.INTERACTIVE: deque(), Priority.BACKGROUND: deque()
+        }
+        self._running: set[Worker] = set()
+        self._max_queued = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._shed = 0
+        self._dispatched = 0
+        self._queue_wait_s = 0.0
+        self._max_queue_wait_s = 0.0
+
+    @classmethod
+    def for_engine_pool(cls, size: int, max_overflow: int, capacity: int,
+                        policy: RejectionPolicy = RejectionPolicy.SHED_BACKGROUND,
+                        parent: Optional[QObject] = None) -> DatabaseExecutor:
+        """
+        :param size: Size of the engine's connection pool
+        :param max_overflow: Connections the engine pool opens beyond its size, a negative overflow (unlimited) is
+            not counted
+        :param capacity: Maximum number of workers waiting for a thread
+        :param policy: Rejection policy
+        :return: An executor with one thread per connection of the pool
+        """
+        return cls(max(1, size + max(0, max_overflow)), capacity, policy, parent)
+
+    def start(self, worker: Worker, priority: int = Priority.INTERACTIVE) -> bool:
+        """
+        Run the worker when a thread is free
+        :param worker: Worker
+        :param priority: Priority, as passed by `Worker.start`
+        :return: False if the worker was rejected
+        """
+        self._submitted += 1
+        priority = Priority.BACKGROUND if priority < Priority.INTERACTIVE else Priority.INTERACTIVE
+        if len(self._running) < self._pool.maxThreadCount():
+            self._run(worker)
+            return True
+        if self.queued() >= self._capacity and not self._make_room(priority):
+            self._reject(worker, f'the queue is full ({self._capacity} workers)')
+            return False
+        self._queues[priority].append((worker, time.perf_counter()))
+        self._max_queued = max(self._max_queued, self.queued())
+        return True
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _make_room(self, priority: Priority) -> bool:
+        """
+        Free a queue slot for work of the given priority, according to the policy
+        :return: True if there is room now
+        """
+        for queue in self._queues.values():
+            # Queued work that was cancelled will not run anyway
+            for entry in [entry for entry in queue if entry[0].context.is_cancelled()]:
+                queue.remove(entry)
+                entry[0].run()
+        if self.queued() < self._capacity:
+            return True
+        if self._policy == RejectionPolicy.SHED_BACKGROUND and priority == Priority.INTERACTIVE:
+            background = self._queues[Priority.BACKGROUND]
+            if background:
+                worker, _ = background.popleft()
+                self._shed += 1
+                self._reject(worker, 'shed for interactive work')
+                return True
+        return False
+
+    def _reject(self, worker: Worker, reason: str) -> None:
+        self._rejected += 1
+        error = Rejected(reason)
+        print(f'Rejected {getattr(worker.fn, "__name__", worker.fn)}: {error}')
+
+        # Callers connect to the signals once `start` returned
+        def emit():
+            worker.signals.error.emit((Rejected, error, ''))
+            worker.signals.finished.emit()
+
+        QTimer.singleShot(0, emit)
+
+    def _run(self, worker: Worker) -> None:
+        self._running.add(worker)
+        worker.signals.finished.connect(lambda: self._on_finished(worker))
+        self._pool.start(worker, int(worker.context.priority))
+
+    def _on_finished(self, worker: Worker) -> None:
+        self._running.discard(worker)
+        for queue in self._queues.values():
+            if queue and len(self._running) < self._pool.maxThreadCount():
+                next_worker, queued_at = queue.popleft()
+                wait = time.perf_counter() - queued_at
+                self._dispatched += 1
+                self._queue_wait_s += wait
+                self._max_queue_wait_s = max(self._max_queue_wait_s, wait)
+                self._run(next_worker)
+                return
+
+    def stats(self) -> ExecutorStats:
+        """
+        :return: Thread and queue usage, rejections and the time workers waited in the queue
+        """
+        return ExecutorStats(
+            threads=self._pool.maxThreadCount(),
+            capacity=self._capacity,
+            running=len(self._running),
+            queued=self.queued(),
+            max_queued=self._max_queued,
+            submitted=self._submitted,
+            rejected=self._rejected,
+            shed=self._shed,
+            avg_queue_wait_ms=self._queue_wait_s / self._dispatched * 1000 if self._dispatched else 0.0,
+            max_queue_wait_ms=self._max_queue_wait_s * 1000,
+        )
+
+    def wait_for_done(self, timeout_ms: int = -1) -> bool:
+        return self._pool.waitForDone(timeout_ms)
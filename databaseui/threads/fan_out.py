@@ -0,0 +1,168 @@
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from databaseui.threads.async_task import AsyncTask
+from databaseui.threads.task_context import CancellationToken, Priority, TaskContext
+from databaseui.threads.worker import Startable, Worker
+
+
+@dataclass
+class TaskTiming:
+    name: str
+    latency_s: float
+    ok: bool
+
+
+@dataclass
+class FanOutReport:
+    """
+    Timings of every task in a fan out, plus the wall time from dispatch until the last task finished
+    """
+    timings: list[TaskTiming] = field(default_factory=list)
+    wall_s: float = 0.0
+
+    def format(self) -> str:
+        lines = [f'  {t.name:<28} {t.latency_s * 1000:8.1f} ms{"" if t.ok else "  (failed)"}'
+                 for t in sorted(self.timings, key=lambda t: t.latency_s, reverse=True)]
+        lines.append(f'  {"wall time":<28} {self.wall_s * 1000:8.1f} ms')
+        return '\n'.join(lines)
+
+
+class FanOut(QObject):
+    """
+    Runs independent tasks concurrently on a thread pool and emits `completed` once every task has finished
+    (a completion barrier). Each task runs on its own pool thread, and so on its own scoped session and connection.
+    Task timings are measured on the worker thread, so they are the query latency and not the signal delivery time.
+    A task failed if it raised or returned None, like the functions wrapped by `with_session` do on an error.
+    """
+    completed = pyqtSignal(object)
+
+    def __init__(self, pool: Startable, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._pool = pool
+        self._tasks: list[tuple[str, Callable, tuple, dict, Optional[Callable[[int], None]]]] = []
+        self._workers: list[Worker | AsyncTask] = []
+        # Cancellation token of the tasks queued at background priority, by name
+        self._background: dict[str, Optional[CancellationToken]] = {}
+        self._report = FanOutReport()
+        self._pending = 0
+        self._started_at = 0.0
+
+    def add(self, name: str, fn: Callable, *args, **kwargs) -> 'FanOut':
+        """
+        Add a task to the fan out. Must be called before `start`
+        :param name: Name of the task in the report
+        :param fn: Function to run, returning None if it failed
+        :param args: Positional arguments to pass to the function
+        :param kwargs: Keyword arguments to pass to the function
+        :return: self, so calls can be chained
+        """
+        self._tasks.append((name, fn, args, kwargs, None))
+        return self
+
+    def add_with_progress(self, name: str, on_progress: Callable[[int], None], fn: Callable, *args,
+                          **kwargs) -> 'FanOut':
+        """
+        Add a task that reports its progress. The function is passed a `progress_callback` keyword argument, like with
+        `run_in_pool_progress`, and every progress it emits is delivered to `on_progress`
+        :param name: Name of the task in the report
+        :param on_progress: Called with the task's progress, in %
+        :param fn: Function to run, returning None if it failed
+        :param args: Positional arguments to pass to the function
+        :param kwargs: Keyword arguments to pass to the function
+        :return: self, so calls can be chained
+        """
+        self._tasks.append((name, fn, args, kwargs, on_progress))
+        return self
+
+    def in_background(self, token: Optional[CancellationToken] = None) -> 'FanOut':
+        """
+        Run the task added last at background priority, so the other tasks are started first when the pool is busy
+        :param token: Token to cancel the task with
+        :return: self, so calls can be chained
+        """
+        self._background[self._tasks[-1][0]] = token
+        return self
+
+    def start(self) -> None:
+        """
+        Dispatch every task to the pool at once
+        :return: None
+        """
+        self._pending = len(self._tasks)
+        self._started_at = time.perf_counter()
+        for name, fn, args, kwargs, on_progress in self._tasks:
+            worker = Worker(self._timed, on_progress is not None, name, fn, args, kwargs)
+            if name in self._background:
+                worker.context = TaskContext(Priority.BACKGROUND, self._background[name])
+            worker.signals.result.connect(self._on_task_result)
+            worker.signals.finished.connect(lambda task_name=name: self._on_task_done(task_name))
+            if on_progress is not None:
+                worker.signals.progress.connect(on_progress)
+            # Keep a reference, so the worker's signals live until the barrier completes
+            self._workers.append(worker)
+            worker.start(self._pool)
+        if self._pending == 0:
+            self.completed.emit(self._report)
+
+    def start_async(self) -> None:
+        """
+        Run every task concurrently on the asyncio event loop instead of the pool. Tasks must be coroutine functions
+        :return: None
+        """
+        self._pending = len(self._tasks)
+        self._started_at = time.perf_counter()
+        for name, fn, args, kwargs, on_progress in self._tasks:
+            task = AsyncTask(self._timed_async, name, fn, args, kwargs, progress=on_progress is not None)
+            task.signals.result.connect(self._on_task_result)
+            task.signals.finished.connect(lambda task_name=name: self._on_task_done(task_name))
+            if on_progress is not None:
+                task.signals.progress.connect(on_progress)
+            self._workers.append(task)
+            task.start()
+        if self._pending == 0:
+            self.completed.emit(self._report)
+
+    @staticmethod
+    async def _timed_async(name: str, fn: Callable, args: tuple, kwargs: dict, progress_callback=None) -> TaskTiming:
+        if progress_callback is not None:
+            kwargs = {**kwargs, 'progress_callback': progress_callback}
+        start = time.perf_counter()
+        # noinspection PyBroadException
+        try:
+            ok = await fn(*args, **kwargs) is not None
+        except Exception:
+            traceback.print_exc()
+            ok = False
+        return TaskTiming(name, time.perf_counter() - start, ok)
+
+    @staticmethod
+    def _timed(name: str, fn: Callable, args: tuple, kwargs: dict, progress_callback=None) -> TaskTiming:
+        if progress_callback is not None:
+            kwargs = {**kwargs, 'progress_callback': progress_callback}
+        start = time.perf_counter()
+        # noinspection PyBroadException
+        try:
+            ok = fn(*args, **kwargs) is not None
+        except Exception:
+            # Still count the task towards the barrier, or the fan out would never complete
+            traceback.print_exc()
+            ok = False
+        return TaskTiming(name, time.perf_counter() - start, ok)
+
+    def _on_task_result(self, timing: TaskTiming) -> None:
+        self._report.timings.append(timing)
+
+    def _on_task_done(self, name: str) -> None:
+        # A task cancelled before it started finishes without a result
+        if not any(timing.name == name for timing in self._report.timings):
+            self._report.timings.append(TaskTiming(name, 0.0, False))
+        self._pending -= 1
+        if self._pending == 0:
+            self._report.wall_s = time.perf_counter() - self._started_at
+            self._workers.clear()
+            self.completed.emit(self._report)
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Callable, Optional
+
+
+class Priority(IntEnum):
+    """
+    Priority of pool work. Queued work with a higher priority is started first, so a background reload never delays
+    what a user clicked on
+    """
+    BACKGROUND = 0
+    INTERACTIVE = 10
+
+
+class Cancelled(Exception):
+    """
+    Raised by `CancellationToken.raise_if_cancelled`
+    """
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation of pool work. The GUI thread cancels the token, the work checks it between steps, and
+    `with_session` skips the calls of a cancelled task and kills the statement it has running on the server.
+    Thread safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._callbacks: list[Callable[[], None]] = []
+
+    def cancel(self) -> None:
+        """
+        Cancel the work, and run every callback registered with `on_cancel`
+        :return:
+        """
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled
+
+    def raise_if_cancelled(self) -> None:
+        if self._cancelled:
+            raise Cancelled()
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        Register a callback to run on the thread that cancels the token, right away if it is already cancelled
+        :param callback: Callback
+        :return: Function unregistering the callback
+        """
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+@dataclass(frozen=True, slots=True)
+class TaskContext:
+    """
+    How a piece of pool work runs. Set by the worker while its function runs, and read by `with_session`
+    :param priority: Queue priority
+    :param token: Cancellation token, None if the work can not be cancelled
+    :param max_statement_ms: Server side execution time limit of its read statements, 0 for none, None for the default
+        of its priority
+    """
+    priority: Priority = Priority.INTERACTIVE
+    token: Optional[CancellationToken] = None
+    max_statement_ms: Optional[int] = None
+
+    def is_cancelled(self) -> bool:
+        return self.token is not None and self.token.is_cancelled()
+
+
+_current_task: ContextVar[Optional[TaskContext]] = ContextVar('current_task', default=None)
+
+
+def current_task() -> Optional[TaskContext]:
+    """
+    :return: Context of the work running on this thread, None outside of a worker
+    """
+    return _current_task.get()
+
+
+def enter_task(context: TaskContext):
+    """
+    :return: Token to pass to `exit_task` once the work is done
+    """
+    return _current_task.set(context)
+
+
+def exit_task(token) -> None:
+    _current_task.reset(token)
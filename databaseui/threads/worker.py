@@ -1,8 +1,11 @@
 import sys
 import traceback
+from typing import Protocol
 
 from PyQt6.QtCore import pyqtSlot, pyqtSignal, QRunnable, QObject
 
+from databaseui.threads.task_context import TaskContext, enter_task, exit_task
+
 
 ###############################################################################################################
 # Reference material for multithreading in PyQT6.
@@ -35,6 +38,15 @@ class WorkerSignals(QObject):
     progress = pyqtSignal(int)
 
 
+class Startable(Protocol):
+    """
+    Anything a worker can be started on: a `QThreadPool`, or a `DatabaseExecutor`
+    """
+
+    def start(self, runnable: 'Worker', priority: int = ..., /) -> object:
+        ...
+
+
 class Worker(QRunnable):
     """
     Worker thread
@@ -48,6 +60,9 @@ class Worker(QRunnable):
     :param args: Arguments to pass to the callback function
     :param kwargs: Keywords to pass to the callback function
 
+    Set `context` before starting the worker to give it a priority, a cancellation token or a statement time limit.
+    A worker cancelled before it starts skips its function and only emits `finished`.
+
     """
 
     def __init__(self, fn, progress=False, *args, **kwargs):
@@ -58,18 +73,40 @@ class Worker(QRunnable):
         self.args = args
         self.kwargs = kwargs
         self.signals = WorkerSignals()
+        self.context = TaskContext()
 
         # Add the callback to our kwargs
         if progress:
             self.kwargs['progress_callback'] = self.signals.progress
 
+    def start(self, pool: Startable) -> 'Worker':
+        """
+        Queue the worker on a pool at the priority of its context
+        :param pool: Thread pool, or a `DatabaseExecutor`
+        :return: self
+        """
+        pool.start(self, int(self.context.priority))
+        return self
+
+    def cancel(self) -> None:
+        """
+        Cancel the worker, if it has a cancellation token
+        """
+        if self.context.token is not None:
+            self.context.token.cancel()
+
     @pyqtSlot()
     def run(self):
         """
         Initialise the runner function with passed args, kwargs.
         """
 
+        if self.context.is_cancelled():
+            self.signals.finished.emit()
+            return
         # Retrieve args/kwargs here; and fire processing using them
+        # The context is visible to `with_session` for the duration of the call
+        task = enter_task(self.context)
         # noinspection PyBroadException
         try:
             result = self.fn(*self.args, **self.kwargs)
@@ -80,4 +117,5 @@ class Worker(QRunnable):
         else:
             self.signals.result.emit(result)  # Return the result of the processing
         finally:
+            exit_task(task)
             self.signals.finished.emit()  # Done
@@ -0,0 +1,283 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Generic, Iterable, Optional, TypeVar
+
+from PyQt6.QtCore import QAbstractListModel, QAbstractTableModel, QModelIndex, QObject, QSortFilterProxyModel, Qt
+
+from databaseui.database.db_types import Doctor, NamedAppointment, NamedOrderedLabTest, NamedPatient
+
+T = TypeVar("T")
+
+# Rows handed to the views at a time by `RowTableModel.fetchMore`
+FETCH_BATCH = 200
+
+
+class RowListModel(QAbstractListModel, Generic[T]):
+    """
+    List model over database rows, meant to be shared by every view that shows the same rows.
+    Display strings are formatted lazily, only when a view asks for them, and the row itself is returned for the
+    UserRole so `QComboBox.currentData()` keeps working like it did with `addItem(..., userData=row)`.
+    """
+
+    def __init__(self, display: Callable[[T], str], key: Callable[[T], int], parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._display = display
+        self._key = key
+        self._rows: list[T] = []
+        self._row_of_key: dict[int, int] = {}
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self._display(row)
+        if role == Qt.ItemDataRole.UserRole:
+            return row
+        return None
+
+    def set_rows(self, rows: Iterable[T]) -> None:
+        """
+        Replace every row in the model
+        :param rows: New rows
+        :return:
+        """
+        self.beginResetModel()
+        self._rows = list(rows)
+        self._row_of_key = {self._key(r): i for i, r in enumerate(self._rows)}
+        self.endResetModel()
+
+    def append_rows(self, rows: list[T]) -> None:
+        """
+        Append rows to the end of the model, e.g. when another page arrives
+        :param rows: Rows to append
+        :return:
+        """
+        if not rows:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._rows.extend(rows)
+        for i, r in enumerate(rows, start=first):
+            self._row_of_key[self._key(r)] = i
+        self.endInsertRows()
+
+    def upsert_row(self, row: T) -> int:
+        """
+        Replace the row with the same key in place, or append it if the model does not have it yet.
+        Views are told about the single changed row only.
+        :param row: New row data
+        :return: Row number of the item
+        """
+        idx = self._row_of_key.get(self._key(row))
+        if idx is None:
+            self.append_rows([row])
+            return len(self._rows) - 1
+        self._rows[idx] = row
+        model_index = self.index(idx)
+        self.dataChanged.emit(model_index, model_index)
+        return idx
+
+    def row_of(self, key: int) -> int:
+        """
+        Find the row holding the item with the given key
+        :param key: Item key (e.g. the patient id)
+        :return: Row number, or -1 if the key is not in the model
+        """
+        return self._row_of_key.get(key, -1)
+
+    def row_at(self, row: int) -> Optional[T]:
+        if 0 <= row < len(self._rows):
+            return self._rows[row]
+        return None
+
+    def rows(self) -> list[T]:
+        return self._rows
+
+
+class PatientListModel(RowListModel[NamedPatient]):
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(lambda p: f'{p.first_name} {p.last_name}', lambda p: p.id, parent)
+
+
+class DoctorListModel(RowListModel[Doctor]):
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(lambda d: f'{d.first_name} {d.last_name}', lambda d: d.id, parent)
+
+
+class RowTableModel(QAbstractTableModel, Generic[T]):
+    """
+    Table model over database rows, one column per `(header, display)` pair.
+    Cells are formatted lazily, only when a view asks for them, and the rows are handed to the views `FETCH_BATCH` at
+    a time with `fetchMore`, as they are scrolled into view, so a long history does not lay out thousands of rows at
+    once. Sorting applies to every row, not only the fetched ones. The row itself is returned for the UserRole.
+    """
+
+    def __init__(self, columns: list[tuple[str, Callable[[T], str]]], parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._columns = columns
+        self._rows: list[T] = []
+        self._fetched = 0
+        self._sort_column = -1
+        self._sort_order = Qt.SortOrder.AscendingOrder
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return self._fetched
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._columns)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid() or index.row() >= self._fetched:
+            return None
+        row = self._rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self._columns[index.column()][1](row)
+        if role == Qt.ItemDataRole.UserRole:
+            return row
+        return None
+
+    def headerData(self, section: int, orientation: Qt.Orientation,
+                   role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self._columns[section][0] if 0 <= section < len(self._columns) else None
+        return section + 1
+
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return not parent.isValid() and self._fetched < len(self._rows)
+
+    def fetchMore(self, parent: QModelIndex = QModelIndex()) -> None:
+        if parent.isValid():
+            return
+        count = min(FETCH_BATCH, len(self._rows) - self._fetched)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._fetched, self._fetched + count - 1)
+        self._fetched += count
+        self.endInsertRows()
+
+    def fetch_all(self) -> None:
+        """
+        Hand every remaining row to the views at once
+        :return:
+        """
+        if self._fetched >= len(self._rows):
+            return
+        self.beginInsertRows(QModelIndex(), self._fetched, len(self._rows) - 1)
+        self._fetched = len(self._rows)
+        self.endInsertRows()
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.SortOrder.AscendingOrder) -> None:
+        """
+        Sort every row by the display string of a column. The sort is kept when the rows are replaced
+        :param column: Column to sort by, -1 to keep the order the rows were set in
+        :param order: Sort order
+        :return:
+        """
+        self._sort_column = column
+        self._sort_order = order
+        if not 0 <= column < len(self._columns):
+            return
+        self.beginResetModel()
+        self._sort_rows()
+        self.endResetModel()
+
+    def _sort_rows(self) -> None:
+        if not 0 <= self._sort_column < len(self._columns):
+            return
+        display = self._columns[self._sort_column][1]
+        self._rows.sort(key=lambda r: display(r) or '', reverse=self._sort_order == Qt.SortOrder.DescendingOrder)
+
+    def set_rows(self, rows: Iterable[T]) -> None:
+        """
+        Replace every row in the model. Only the first `FETCH_BATCH` rows are handed to the views until they fetch more
+        :param rows: New rows
+        :return:
+        """
+        self.beginResetModel()
+        self._rows = list(rows)
+        self._sort_rows()
+        self._fetched = min(FETCH_BATCH, len(self._rows))
+        self.endResetModel()
+
+    def clear(self) -> None:
+        self.set_rows([])
+
+    def row_at(self, row: int) -> Optional[T]:
+        if 0 <= row < len(self._rows):
+            return self._rows[row]
+        return None
+
+    def rows(self) -> list[T]:
+        return self._rows
+
+
+class RowSortFilterProxyModel(QSortFilterProxyModel):
+    """
+    Filters the rows of a `RowTableModel` on the text of any column. Sorting is passed on to the source model, which
+    sorts all of its rows instead of the fetched ones only, and filtering fetches every row first, so both apply to the
+    whole result
+    """
+
+    def __init__(self, source: RowTableModel, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._source = source
+        self.setSourceModel(source)
+        self.setFilterKeyColumn(-1)
+        self.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        source.modelReset.connect(self._on_source_reset)
+
+    def _on_source_reset(self) -> None:
+        # New rows are filtered as a whole too
+        if self.filterRegularExpression().pattern():
+            self._source.fetch_all()
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.SortOrder.AscendingOrder) -> None:
+        self._source.sort(column, order)
+
+    def set_filter(self, text: str) -> None:
+        """
+        Only show the rows with a column containing the text, case insensitive
+        :param text: Filter text, empty to show every row
+        :return:
+        """
+        if text:
+            self._source.fetch_all()
+        self.setFilterFixedString(text)
+
+    def row_at(self, row: int) -> Optional[Any]:
+        """
+        :param row: Row number in the proxy
+        :return: Source row shown at that row
+        """
+        source = self.mapToSource(self.index(row, 0))
+        return self._source.row_at(source.row()) if source.isValid() else None
+
+
+class AppointmentTableModel(RowTableModel[NamedAppointment]):
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__([
+            ('Patient Name', lambda a: a.patient_name),
+            ('Appointment Time', lambda a: a.time),
+            ('Reason For Appointment', lambda a: a.description),
+            ('Status', lambda a: a.status),
+        ], parent)
+
+
+class OrderedTestTableModel(RowTableModel[NamedOrderedLabTest]):
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__([
+            ('Test Name', lambda t: t.test_name or 'Unknown Test'),
+            ('Result', lambda t: t.result or 'Not Started'),
+        ], parent)
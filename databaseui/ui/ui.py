@@ -1,41 +1,181 @@
+import asyncio
+import inspect
 import sys
-from typing import List, Optional, Tuple
+import time
+from datetime import datetime, date, timedelta
+from typing import Callable, List, Optional
 
-from PyQt6.QtCore import QThreadPool
-from PyQt6.QtWidgets import QApplication, QMainWindow, QHeaderView, QTableWidgetItem, QListWidgetItem
+from PyQt6.QtCore import QModelIndex, Qt, QTimer
+from PyQt6.QtGui import QShortcut, QKeySequence
+from PyQt6.QtWidgets import QApplication, QMainWindow, QHeaderView, QComboBox, QCompleter, QProgressBar, \
+    QListView, QLineEdit, QAbstractItemView, QScrollBar, QMessageBox
 
-from databaseui.database import DatabaseManager
+from databaseui.database import DatabaseManager, QueryMetrics, ReferenceCache, StatementRegistry, SummaryTables, \
+    query_manager, async_query_manager
+from databaseui.database.availability import AvailabilityIndex, format_slot
+from databaseui.database.patient_search import PatientSearch
+from databaseui.database.search import SearchIndex, PatientSearchIndex, DoctorSearchIndex
+from databaseui.database.async_db_manager import AsyncDatabaseManager, async_mode_available
 from databaseui.database.db_types import DBCredentials, Treatment, Disease, NamedPatient, Doctor, LabTest, \
     DepartmentStatistics, BaseDoctor, Patient, NamedOrderedLabTest, NamedAppointment, \
-    Diagnosis, NamedDiagnosis
-from databaseui.database.query_manager import get_all_treatments, run_in_pool, get_all_diseases, get_all_patients, \
-    get_all_doctors, get_all_tests, get_department_statistics, get_all_availability, get_tests_for_patient, \
-    order_lab_test, make_appointment, update_appointment_status, get_appointments, update_test_status, add_comments, \
-    get_diagnoses_for_patient, update_patient_information, create_new_patient, create_diagnosis, order_prescription
+    Diagnosis, NamedDiagnosis, PatientPage, PoolOptions, PatientChart, BatchResult, PatientSearchPage, \
+    Appointment, occupies_slot
+from databaseui.database.async_query_manager import run_async, run_async_progress
+from databaseui.database.query_manager import run_in_pool, run_in_pool_progress, order_lab_test, make_appointment, \
+    update_appointment_status, update_appointment_statuses, rebook_appointments, update_test_status, add_comments, \
+    update_patient_information, create_new_patient, create_diagnosis, order_prescription, CACHE_DOCTORS
 from databaseui.env import load_config
 from databaseui.signals.signal_manager import SignalManager
+from databaseui.threads.dispatcher import CoalescingDispatcher
+from databaseui.threads.async_task import AsyncTask
+from databaseui.threads.executor import DatabaseExecutor, RejectionPolicy, Rejected
+from databaseui.threads.fan_out import FanOut, FanOutReport
+from databaseui.threads.task_context import CancellationToken, Priority
+from databaseui.threads.worker import Worker
 from databaseui.ui.app import Ui_MainWindow
+from databaseui.ui.models import PatientListModel, DoctorListModel, AppointmentTableModel, OrderedTestTableModel, \
+    RowSortFilterProxyModel
+
+# How far ahead free appointment slots are offered
+AVAILABILITY_DAYS = 14
+# Number of type-ahead results listed under a dropdown
+SEARCH_RESULTS = 50
+# An interrupted patient list load is resumed after this delay, at most this many times in a row
+PATIENT_LOAD_RETRY_MS = 5000
+PATIENT_LOAD_RETRIES = 3
+
+
+def _line_edit(combo: QComboBox) -> QLineEdit:
+    """
+    :return: The line edit of an editable dropdown
+    """
+    line_edit = combo.lineEdit()
+    if line_edit is None:
+        raise ValueError(f'Dropdown {combo.objectName()} is not editable')
+    return line_edit
+
+
+def _popup(completer: QCompleter) -> QAbstractItemView:
+    """
+    :return: The popup of a completer, which it creates on first use
+    """
+    popup = completer.popup()
+    if popup is None:
+        raise ValueError('Completer has no popup')
+    return popup
+
+
+def _scroll_bar(completer: QCompleter) -> QScrollBar:
+    """
+    :return: The vertical scroll bar of a completer's popup
+    """
+    scroll_bar = _popup(completer).verticalScrollBar()
+    if scroll_bar is None:
+        raise ValueError('Completer popup has no scroll bar')
+    return scroll_bar
 
 
 # noinspection DuplicatedCode
 class MainWindow(QMainWindow):
-    def __init__(self) -> None:
+    def __init__(self, use_async: bool = False) -> None:
+        """
+        :param use_async: Run the read queries on the asyncio event loop (which must be the qasync loop) instead of
+            the thread pool. Writes always run on the thread pool
+        """
         super().__init__()
+        # Start of the time-to-interactive measurement
+        self._created_at = time.perf_counter()
+        self.startup_report: Optional[FanOutReport] = None
+        # What the window waits for before it is interactive, see `on_startup_step_done`
+        self._startup_steps = {'startup queries'}
+        self.time_to_interactive_s: Optional[float] = None
+        self.patient_load_s: Optional[float] = None
+
         # Init UI
         self._ui = Ui_MainWindow()
         self._ui.setupUi(self)
 
+        # The tables show models over the received rows, sorted and filtered through a proxy
+        self._ordered_tests_model = OrderedTestTableModel(self)
+        self._ordered_tests_proxy = RowSortFilterProxyModel(self._ordered_tests_model, self)
+        self._ui.activeTests_Table.setModel(self._ordered_tests_proxy)
+        self._appointments_model = AppointmentTableModel(self)
+        self._appointments_proxy = RowSortFilterProxyModel(self._appointments_model, self)
+        self._ui.appointmentTable.setModel(self._appointments_proxy)
+        self._ui.appointmentTable.sortByColumn(1, Qt.SortOrder.AscendingOrder)
+        self._ui.appointmentFilter.textChanged.connect(self._appointments_proxy.set_filter)
+
         # Set up tables to stretch properly, since you can't do that in QT creator
         self._ui.activeTests_Table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
         for i in range(3):
             self._ui.appointmentTable.horizontalHeader().setSectionResizeMode(i, QHeaderView.ResizeMode.Stretch)
 
+        # Progress of the patient list load, the first page is shown as soon as it arrives
+        self._patient_load_progress = QProgressBar()
+        self._patient_load_progress.setRange(0, 100)
+        self._patient_load_progress.setFormat('Loading patients %p%')
+        self._patient_load_progress.setMaximumWidth(200)
+        self._patient_load_progress.hide()
+        self._ui.statusbar.addPermanentWidget(self._patient_load_progress)
+
         # Load configs, set up thread pool and init singleton signal manager
         self.config = load_config()
-        self._pool = QThreadPool()
+        try:
+            policy = RejectionPolicy(self.config.ExecutorPolicy)
+        except ValueError:
+            policy = RejectionPolicy.SHED_BACKGROUND
+            print(f'Unknown executor policy {self.config.ExecutorPolicy!r}, using {policy.value!r} instead')
+        # One thread per connection of the engine pool, so bursts queue here instead of waiting on a checkout
+        self._pool = DatabaseExecutor.for_engine_pool(self.config.PoolSize, self.config.PoolMaxOverflow,
+                                                      self.config.ExecutorQueueSize, policy, self)
         self._signal_manager = SignalManager()
+        self._use_async = use_async
+        # Read queries come from the module of the execution mode, both have the same functions
+        self._queries = async_query_manager if use_async else query_manager
+        # Selection driven queries go through the dispatcher, so scrolling a dropdown only queries the last selection
+        self._dispatcher = CoalescingDispatcher(self._pool, self.config.SelectionDebounceMs, self)
+
+        # Cancels the background work (the patient list load) when the window closes
+        self._background_token = CancellationToken()
+        # Keyset cursor of the patient list, so an interrupted load can be resumed
+        self._patient_cursor = -1
+        self._patients_loaded = False
+        self._patient_load_retries = 0
+        # Free and booked slots of every doctor, None until the startup query returns
+        self._availability: Optional[AvailabilityIndex] = None
+        # Arguments of `get_day_appointments` while the admin appointment table shows a day, None while it shows the
+        # appointments of the selected patient
+        self._admin_day: Optional[tuple[date, Optional[BaseDoctor], Optional[DepartmentStatistics]]] = None
+        self._ui.adminDay_t1_date.setDate(date.today())
 
         # Set up components
+        # Every patient and doctor dropdown shares a single model, so a refresh only touches the rows once
+        self._patient_model = PatientListModel(self)
+        self._doctor_model = DoctorListModel(self)
+        self._patient_combos = (
+            self._ui.patientSelectList_1, self._ui.patientSelectList_2, self._ui.updateAppointment_t1_name
+        )
+        self._doctor_combos = (self._ui.doctorSelectList_1, self._ui.doctorSelectList_2, self._ui.adminRebookDoctor,
+                               self._ui.adminDay_t2_doctor)
+        # Typing in a patient or doctor dropdown searches an index of the loaded rows instead of scrolling the list.
+        # In search-only mode the patient list is never loaded, patient dropdowns search the database instead and
+        # only hold the patients that were picked
+        self._search_only = self.config.PatientSearchOnly
+        self._patient_index = PatientSearchIndex()
+        self._doctor_index = DoctorSearchIndex()
+        self._server_search_results = PatientListModel(self)
+        self._server_search_completers: dict[QComboBox, QCompleter] = {}
+        self._server_search_combo: Optional[QComboBox] = None
+        self._server_search_page: Optional[PatientSearchPage] = None
+        for combo in self._patient_combos:
+            self.use_shared_model(combo, self._patient_model)
+            if self._search_only:
+                self.attach_server_search(combo)
+            else:
+                self.attach_search(combo, self._patient_model, self._patient_index, PatientListModel(combo))
+        for combo in self._doctor_combos:
+            self.use_shared_model(combo, self._doctor_model)
+            self.attach_search(combo, self._doctor_model, self._doctor_index, DoctorListModel(combo))
 
         # Set up signals and listeners
         # "Do things when we get data from the Database"
@@ -43,11 +183,16 @@ class MainWindow(QMainWindow):
         self._signal_manager.tests_received.connect(self.on_test_types_received)
         self._signal_manager.diseases_received.connect(self.on_diseases_received)
         self._signal_manager.patients_received.connect(self.on_patients_received)
+        self._signal_manager.patient_received.connect(self.on_patient_received)
+        self._signal_manager.patient_search_received.connect(self.on_patient_search_received)
         self._signal_manager.doctors_received.connect(self.on_doctors_received)
+        self._signal_manager.availability_received.connect(self.on_availability_received)
         self._signal_manager.dept_statistics_received.connect(self.on_dept_rooms_received)
         self._signal_manager.patient_tests_received.connect(self.on_ordered_tests_received)
         self._signal_manager.appointments_received.connect(self.on_appointments_received)
+        self._signal_manager.day_appointments_received.connect(self.on_day_appointments_received)
         self._signal_manager.diagnoses_received.connect(self.on_diagnoses_received)
+        self._signal_manager.patient_chart_received.connect(self.on_patient_chart_received)
 
         # UI Listeners
         # "Do things when the UI changes"
@@ -61,6 +206,10 @@ class MainWindow(QMainWindow):
         self._ui.activeTests_OrderTestButton.clicked.connect(self.on_doctor_order_test)
         self._ui.patientAppointmentSave.clicked.connect(self.on_make_appointment)
         self._ui.adminCheckIn.clicked.connect(self.on_admin_update_appointment)
+        self._ui.adminCheckInSelected.clicked.connect(self.on_admin_update_selected_appointments)
+        self._ui.adminRebookSelected.clicked.connect(self.on_admin_rebook_selected_appointments)
+        self._ui.adminShowDoctorDay.clicked.connect(self.see_doctor_day)
+        self._ui.adminShowDepartmentDay.clicked.connect(self.see_department_day)
         self._ui.updateAppointment_t1_name.currentIndexChanged.connect(self.see_pt_appointments)
         self._ui.saveTestStatus.clicked.connect(self.update_test_results)
         self._ui.saveComments.clicked.connect(self.update_comments)
@@ -68,6 +217,7 @@ class MainWindow(QMainWindow):
         self._ui.addComments_t1_diagnosis.currentIndexChanged.connect(self.on_cur_diagnosis_changed)
         self._ui.patientEditAddDiagnosis_1.clicked.connect(self.on_add_diagnosis)
         self._ui.patientEditsave_3.clicked.connect(self.on_add_treatment)
+        QShortcut(QKeySequence('Ctrl+Shift+M'), self).activated.connect(self.dump_metrics)
 
         # Connect to Database and run pool to get data
         self.setup_connections()
@@ -86,16 +236,260 @@ class MainWindow(QMainWindow):
         """
         print('Fetching')
 
-        def get():
-            get_all_treatments()
-            get_all_diseases()
-            get_all_patients()
-            get_all_doctors()
-            get_all_tests()
-            get_department_statistics()
-            get_all_availability()
+        # The queries are independent, so run them all at once, each on its own pooled connection
+        queries = self._queries
+        self._startup = FanOut(self._pool, self)
+        self._startup.add('treatments', queries.get_all_treatments) \
+            .add('diseases', queries.get_all_diseases) \
+            .add('doctors', queries.get_all_doctors) \
+            .add('tests', queries.get_all_tests) \
+            .add('department statistics', queries.get_department_statistics).in_background() \
+            .add('availability', queries.get_all_availability)
+        self._startup.completed.connect(self.on_initial_data_loaded)
+        if self._use_async:
+            self._startup.start_async()
+        else:
+            self._startup.start()
+        # The full patient list is not part of the barrier: the window is usable once the first page is shown, the
+        # rest keeps loading in the background and its time is reported on its own
+        if not self._search_only:
+            self._startup_steps.add('first patient page')
+            worker = self.run_query_progress(self._queries.get_all_patients, priority=Priority.BACKGROUND,
+                                             token=self._background_token)
+            worker.signals.progress.connect(self.on_patient_load_progress)
+            worker.signals.result.connect(self.on_patient_load_result)
 
-        run_in_pool(self._pool, get)
+    def on_initial_data_loaded(self, report: FanOutReport) -> None:
+        """
+        Called once every startup query has finished. Prints the per query latency
+        :param report: Timings of the startup queries
+        :return: None
+        """
+        self.startup_report = report
+        print(f'Startup timing:\n{report.format()}')
+        self.on_startup_step_done('startup queries')
+
+    def on_startup_step_done(self, step: str) -> None:
+        """
+        Called when something the window needs before it is interactive is done: the startup queries, and the first
+        page of patients. Once all of them are, prints the time to interactive
+        :param step: Step that is done
+        :return: None
+        """
+        self._startup_steps.discard(step)
+        if self._startup_steps or self.time_to_interactive_s is not None:
+            return
+        self.time_to_interactive_s = time.perf_counter() - self._created_at
+        print(f'  {"time to interactive":<28} {self.time_to_interactive_s * 1000:8.1f} ms')
+
+    @staticmethod
+    def use_shared_model(combo: QComboBox, model: PatientListModel | DoctorListModel) -> None:
+        """
+        Point a dropdown at a shared list model. The popup uses uniform item sizes and the combo does not size itself
+        to its contents, otherwise Qt would format and measure every row.
+        :param combo: Dropdown
+        :param model: Shared model
+        :return: None
+        """
+        combo.setModel(model)
+        combo.setSizeAdjustPolicy(QComboBox.SizeAdjustPolicy.AdjustToMinimumContentsLengthWithIcon)
+        view = combo.view()
+        if isinstance(view, QListView):
+            view.setUniformItemSizes(True)
+
+    def attach_search(self, combo: QComboBox, model: PatientListModel | DoctorListModel, index: SearchIndex,
+                      results: PatientListModel | DoctorListModel) -> None:
+        """
+        Make a dropdown searchable: the text typed in it is looked up in the search index, and the best matches are
+        listed in a popup. Picking one selects its row in the dropdown.
+        :param combo: Dropdown using the shared model
+        :param model: Shared model of the dropdown
+        :param index: Search index over the rows of the shared model
+        :param results: Model for the matches, with the same display as the shared model
+        :return: None
+        """
+        completer = self.make_searchable(combo, model, results)
+        _line_edit(combo).textEdited.connect(lambda text: self.on_search_edited(combo, text, completer, index, results))
+
+    def attach_server_search(self, combo: QComboBox) -> None:
+        """
+        Make a patient dropdown search the database: the text typed in it is sent to `search_patients`, debounced, and
+        the matches are listed in a popup that loads the next page when scrolled to the end
+        :param combo: Patient dropdown
+        :return: None
+        """
+        completer = self.make_searchable(combo, self._patient_model, self._server_search_results)
+        self._server_search_completers[combo] = completer
+        _line_edit(combo).textEdited.connect(lambda text: self.on_server_search_edited(combo, text))
+        _scroll_bar(completer).valueChanged.connect(self.on_server_search_scrolled)
+
+    def make_searchable(self, combo: QComboBox, model: PatientListModel | DoctorListModel,
+                        results: PatientListModel | DoctorListModel) -> QCompleter:
+        """
+        Make a dropdown editable, with a popup listing search results. Picking one selects its row in the dropdown.
+        :param combo: Dropdown using the shared model
+        :param model: Shared model of the dropdown
+        :param results: Model for the matches, with the same display as the shared model
+        :return: The popup's completer
+        """
+        combo.setEditable(True)
+        combo.setInsertPolicy(QComboBox.InsertPolicy.NoInsert)
+        # The default completer would filter every row of the model on each key press
+        combo.setCompleter(None)
+        completer = QCompleter(results, combo)
+        completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        completer.setWidget(combo.lineEdit())
+        completer.activated[QModelIndex].connect(
+            lambda item: self.on_search_activated(combo, model, item.data(Qt.ItemDataRole.UserRole))
+        )
+        return completer
+
+    def on_search_edited(self, combo: QComboBox, text: str, completer: QCompleter, index: SearchIndex,
+                         results: PatientListModel | DoctorListModel) -> None:
+        """
+        Search the index for the text typed in a searchable dropdown once typing pauses, so a burst of key presses
+        runs one search
+        :param combo: Dropdown
+        :param text: Search text
+        :param completer: Popup of the dropdown
+        :param index: Search index
+        :param results: Model of the popup
+        :return: None
+        """
+        # The index is owned by the GUI thread, the search runs there after the debounce
+        self._dispatcher.submit_local(f'search_{combo.objectName()}', self.show_search_results, text, completer,
+                                      index, results)
+
+    @staticmethod
+    def show_search_results(text: str, completer: QCompleter, index: SearchIndex,
+                            results: PatientListModel | DoctorListModel) -> None:
+        """
+        List the best matches of the text typed in a searchable dropdown
+        :param text: Search text
+        :param completer: Popup of the dropdown
+        :param index: Search index
+        :param results: Model of the popup
+        :return: None
+        """
+        if not text.strip():
+            _popup(completer).hide()
+            return
+        results.set_rows(index.search(text, SEARCH_RESULTS))
+        completer.complete()
+
+    @staticmethod
+    def on_search_activated(combo: QComboBox, model: PatientListModel | DoctorListModel, row) -> None:
+        """
+        Select the search result picked in the popup of a dropdown
+        :param combo: Dropdown
+        :param model: Shared model of the dropdown
+        :param row: Picked row
+        :return: None
+        """
+        if row is None:
+            return
+        # Search results of the database may not be loaded in the dropdown yet
+        if model.row_of(row.id) == -1:
+            model.upsert_row(row)
+        combo.setCurrentIndex(model.row_of(row.id))
+
+    def on_server_search_edited(self, combo: QComboBox, text: str) -> None:
+        """
+        Search the database for the text typed in a patient dropdown, once typing pauses
+        :param combo: Patient dropdown
+        :param text: Search text
+        :return: None
+        """
+        self._server_search_combo = combo
+        if not text.strip():
+            # Results still on their way are dropped, they no longer match the text
+            _popup(self._server_search_completers[combo]).hide()
+            return
+        self._dispatcher.submit('patient_search', self._queries.search_patients, text)
+
+    def on_patient_search_received(self, page: PatientSearchPage) -> None:
+        """
+        When a page of search results is received, list it in the popup of the dropdown being typed in. The first page
+        replaces the results, later pages are appended.
+        :param page: Page of search results
+        :return: None
+        """
+        combo = self._server_search_combo
+        if combo is None or _line_edit(combo).text() != page.text:
+            return
+        self._server_search_page = page
+        completer = self._server_search_completers[combo]
+        if page.after_id == -1:
+            self._server_search_results.set_rows(page.patients)
+            completer.complete()
+        else:
+            self._server_search_results.append_rows(page.patients)
+
+    def on_server_search_scrolled(self, value: int) -> None:
+        """
+        Load the next page of search results when the popup is scrolled to the end
+        :param value: Scroll bar position
+        :return: None
+        """
+        page = self._server_search_page
+        if page is None or page.done or self._server_search_combo is None:
+            return
+        if value < _scroll_bar(self._server_search_completers[self._server_search_combo]).maximum():
+            return
+        # Only ask once for the page after this one
+        self._server_search_page = None
+        self._dispatcher.submit_now('patient_search', self._queries.search_patients, page.text, page.next_cursor)
+
+    def resume_patient_load(self) -> None:
+        """
+        Continue loading the patient list from the last page we received, if it did not finish
+        :return: None
+        """
+        if self._patients_loaded or self._search_only:
+            return
+        print(f'Resuming the patient list load at cursor {self._patient_cursor}')
+        worker = self.run_query_progress(self._queries.get_all_patients, -1, self._patient_cursor,
+                                         priority=Priority.BACKGROUND, token=self._background_token)
+        worker.signals.progress.connect(self.on_patient_load_progress)
+        worker.signals.result.connect(self.on_patient_load_result)
+
+    def on_patient_load_result(self, cursor: Optional[int]) -> None:
+        """
+        Called when a patient list load returns, at startup or resumed. Prints the time the full list took to load
+        :param cursor: Cursor after the last page, None if the load stopped early
+        :return: None
+        """
+        if cursor is None:
+            self.on_patient_load_stopped()
+            return
+        self._patient_load_retries = 0
+        if self.patient_load_s is None:
+            self.patient_load_s = time.perf_counter() - self._created_at
+            print(f'  {"full patient list":<28} {self.patient_load_s * 1000:8.1f} ms')
+
+    def on_patient_load_stopped(self) -> None:
+        """
+        Called when the patient list load stopped before the last page, e.g. the database went away. Resume it from the
+        last page we received after a delay, unless the window is closing or it failed too many times in a row
+        :return: None
+        """
+        self._patient_load_progress.hide()
+        # Without a first page there is nothing left to wait for, the window is as interactive as it gets
+        self.on_startup_step_done('first patient page')
+        if self._background_token.is_cancelled() or self._patient_load_retries >= PATIENT_LOAD_RETRIES:
+            print('Patient list load stopped')
+            return
+        self._patient_load_retries += 1
+        QTimer.singleShot(PATIENT_LOAD_RETRY_MS, self.resume_patient_load)
+
+    def on_patient_load_progress(self, percent: int) -> None:
+        """
+        Show how much of the patient list was loaded, hidden again once it is complete
+        :param percent: % of the patients loaded
+        :return: None
+        """
+        self._patient_load_progress.setValue(percent)
+        self._patient_load_progress.setVisible(percent < 100)
 
     def on_treatments_received(self, treatments: list[Treatment]) -> None:
         """
@@ -133,35 +527,59 @@ class MainWindow(QMainWindow):
         for t in tests:
             self._ui.activeTests_OrderTestDropdown.addItem(t.test_name, userData=t)
 
-    def on_patients_received(self, patients: list[NamedPatient], last_patient_id: int):
+    def on_patients_received(self, page: PatientPage, last_patient_id: int):
         """
-        When we receive the global list of patients we update all dropdowns where you could choose a patient.
+        When we receive a page of the global list of patients we append it to all dropdowns where you could choose a
+        patient. The first page of a load clears the dropdowns, later pages are appended as they arrive.
         If a last_patient_id is provided, then make sure to set the dropdowns back to where they were.
         This cascades an 'onIndexChanged' event, populating the UI with the latest data from a patient operation.
-        :param patients: List of patients
+        :param page: Page of patients
         :param last_patient_id: Last id, or -1 if not used
         :return:
         """
-        print('Received Patients List')
-        self._ui.patientSelectList_1.clear()
-        self._ui.patientSelectList_2.clear()
-        self._ui.updateAppointment_t1_name.clear()
-        cur_select_idx: Optional[Tuple[int, int, int]] = None
-        for p in patients:
-            self._ui.patientSelectList_1.addItem(f'{p.first_name} {p.last_name}', userData=p)
-            self._ui.patientSelectList_2.addItem(f'{p.first_name} {p.last_name}', userData=p)
-            self._ui.updateAppointment_t1_name.addItem(f'{p.first_name} {p.last_name}', userData=p)
-            if p.id == last_patient_id:
-                cur_select_idx = (
-                    self._ui.patientSelectList_1.count() - 1,
-                    self._ui.patientSelectList_2.count() - 1,
-                    self._ui.updateAppointment_t1_name.count() - 1
-                )
-        if cur_select_idx is None:
-            return
-        self._ui.patientSelectList_1.setCurrentIndex(cur_select_idx[0])
-        self._ui.patientSelectList_2.setCurrentIndex(cur_select_idx[1])
-        self._ui.updateAppointment_t1_name.setCurrentIndex(cur_select_idx[2])
+        print(f'Received Patients Page after {page.after_id}')
+        if page.after_id == -1:
+            self._patient_model.set_rows(page.patients)
+            self._patient_index.set_rows(page.patients)
+            self.on_startup_step_done('first patient page')
+        else:
+            self._patient_model.append_rows(page.patients)
+            self._patient_index.add_rows(page.patients)
+        self._patient_cursor = page.next_cursor
+        self._patients_loaded = page.done
+        if last_patient_id == -1 or not any(p.id == last_patient_id for p in page.patients):
+            return
+        self.select_patient(last_patient_id)
+
+    def on_patient_received(self, patient: NamedPatient, select: bool):
+        """
+        When we receive a single refreshed patient, update it in place in the shared patient model.
+        If requested, select it in all patient dropdowns so the fields show the latest data from the patient operation.
+        :param patient: Refreshed patient
+        :param select: Whether to select the patient
+        :return:
+        """
+        print(f'Received Patient {patient.id}')
+        self._patient_model.upsert_row(patient)
+        self._patient_index.upsert(patient)
+        if select:
+            self.select_patient(patient.id)
+
+    def select_patient(self, patient_id: int):
+        """
+        Set all patient dropdowns to a patient. Dropdowns that already show the patient re-emit their index change,
+        since the row's data may have changed underneath them.
+        :param patient_id: Patient to select
+        :return:
+        """
+        cur_select_idx = self._patient_model.row_of(patient_id)
+        if cur_select_idx == -1:
+            return
+        for combo in self._patient_combos:
+            if combo.currentIndex() == cur_select_idx:
+                combo.currentIndexChanged.emit(cur_select_idx)
+            else:
+                combo.setCurrentIndex(cur_select_idx)
 
     def on_doctors_received(self, doctors: list[Doctor]):
         """
@@ -170,11 +588,18 @@ class MainWindow(QMainWindow):
         :return:
         """
         print('Received Doctors List')
-        self._ui.doctorSelectList_1.clear()
-        self._ui.doctorSelectList_2.clear()
-        for d in doctors:
-            self._ui.doctorSelectList_1.addItem(f'{d.first_name} {d.last_name}', userData=d)
-            self._ui.doctorSelectList_2.addItem(f'{d.first_name} {d.last_name}', userData=d)
+        self._doctor_model.set_rows(doctors)
+        self._doctor_index.set_rows(doctors)
+
+    def on_availability_received(self, index: AvailabilityIndex):
+        """
+        When we receive the availability index, keep it to list free slots and refresh the selected doctor's slots
+        :param index: Availability index
+        :return:
+        """
+        print('Received Availability')
+        self._availability = index
+        self.see_dr_appointments()
 
     def on_dept_rooms_received(self, dept_rooms: list[DepartmentStatistics]):
         """
@@ -185,8 +610,10 @@ class MainWindow(QMainWindow):
         """
         print('Received Department Stats')
         self._ui.adminDepartmentSelectList.clear()
+        self._ui.adminDay_t3_department.clear()
         for dr in dept_rooms:
             self._ui.adminDepartmentSelectList.addItem(f'{dr.department_name}', userData=dr)
+            self._ui.adminDay_t3_department.addItem(f'{dr.department_name}', userData=dr)
 
     def on_ordered_tests_received(self, ordered_tests: List[NamedOrderedLabTest]):
         """
@@ -196,14 +623,11 @@ class MainWindow(QMainWindow):
         :param ordered_tests: Tests for a patient
         :return:
         """
-        self._ui.activeTests_Table.clearContents()
-        self._ui.activeTests_Table.setRowCount(len(ordered_tests))
+        self._ordered_tests_model.set_rows(ordered_tests)
         self._ui.editTestStatus_t1_test.clear()
-        for idx in range(len(ordered_tests)):
-            self._ui.activeTests_Table.setItem(idx, 0, QTableWidgetItem(ordered_tests[idx].test_name or 'Unknown Test'))
-            self._ui.activeTests_Table.setItem(idx, 1, QTableWidgetItem(ordered_tests[idx].result or 'Not Started'))
-            if ordered_tests[idx].result is None:
-                self._ui.editTestStatus_t1_test.addItem(ordered_tests[idx].test_name, userData=ordered_tests[idx])
+        for test in ordered_tests:
+            if test.result is None:
+                self._ui.editTestStatus_t1_test.addItem(test.test_name, userData=test)
 
     def on_diagnoses_received(self, diagnoses: List[NamedDiagnosis]):
         """
@@ -220,13 +644,41 @@ class MainWindow(QMainWindow):
 
     def on_appointments_received(self, appointments: List[NamedAppointment]):
         print('Received Appointments')
-        self._ui.appointmentTable.clearContents()
-        self._ui.appointmentTable.setRowCount(len(appointments))
-        for idx in range(len(appointments)):
-            self._ui.appointmentTable.setItem(idx, 0, QTableWidgetItem(appointments[idx].patient_name))
-            self._ui.appointmentTable.setItem(idx, 1, QTableWidgetItem(appointments[idx].time))
-            self._ui.appointmentTable.setItem(idx, 2, QTableWidgetItem(appointments[idx].description))
-            self._ui.appointmentTable.setItem(idx, 3, QTableWidgetItem(appointments[idx].status))
+        self._appointments_model.set_rows(appointments)
+
+    def on_day_appointments_received(self, appointments: List[NamedAppointment]):
+        """
+        When the appointments of a doctor's or a department's day are received, show them in the admin appointment
+        table, all selected so the bulk operations apply to the whole day unless the admin narrows the selection
+        :param appointments: Appointments of the day
+        :return:
+        """
+        if self._admin_day is None:
+            return
+        self.on_appointments_received(appointments)
+        self._ui.appointmentTable.selectAll()
+
+    def on_patient_chart_received(self, chart: PatientChart):
+        """
+        Called when the chart of a patient is received. Update the doctor tab if the chart is for its selected patient
+        and doctor, and the admin appointments if it is for the patient selected there
+        :param chart: Tests, diagnoses, prescriptions and appointments of the patient
+        :return:
+        """
+        doctor_patient = self._ui.patientSelectList_2.currentData()
+        doctor = self._ui.doctorSelectList_2.currentData()
+        if (isinstance(doctor_patient, Patient) and doctor_patient.id == chart.patient_id and
+                isinstance(doctor, BaseDoctor) and doctor.id == chart.doctor_id):
+            self.on_ordered_tests_received(chart.tests)
+            self.on_diagnoses_received(chart.diagnoses)
+        admin_patient = self._ui.updateAppointment_t1_name.currentData()
+        if isinstance(admin_patient, Patient) and admin_patient.id == chart.patient_id and chart.doctor_id is None:
+            if self._admin_day is None:
+                self.on_appointments_received(chart.appointments)
+            # The status updates need the appointment rows, with their department and current status
+            self._ui.updateAppointment_t2_time.clear()
+            for appointment in chart.appointments:
+                self._ui.updateAppointment_t2_time.addItem(appointment.time, userData=appointment)
 
     ################################################################################
     # Handle Updating Elements
@@ -252,13 +704,10 @@ class MainWindow(QMainWindow):
         # Update active tests
         self._ui.editPatient_t2_activeDiagnosisList.clear()
         self._ui.editPatient_t6_activeScriptList.clear()
-        for active_diagnosis in patient_data.diagnoses.split(','):
-            self._ui.editPatient_t2_activeDiagnosisList.addItem(QListWidgetItem(active_diagnosis))
-        for cur_treatment in patient_data.treatments.split(','):
-            self._ui.editPatient_t6_activeScriptList.addItem(QListWidgetItem(cur_treatment))
+        self._ui.editPatient_t2_activeDiagnosisList.addItems(patient_data.diagnosis_names)
+        self._ui.editPatient_t6_activeScriptList.addItems(patient_data.treatment_names)
 
-        run_in_pool(self._pool, get_tests_for_patient, patient_data, doctor_data)
-        run_in_pool(self._pool, get_diagnoses_for_patient, patient_data)
+        self.request_chart('doctor_chart', patient_data, doctor_data)
 
     def self_edit_patient_fields(self):
         """
@@ -297,22 +746,30 @@ class MainWindow(QMainWindow):
 
     def see_dr_appointments(self):
         """
-        When a patient selects a doctor, populate the dropdown with the doctor's availability
+        When a patient selects a doctor, populate the dropdown with the doctor's free slots in the coming days.
+        Until the availability index is loaded, the doctor's appointment times are listed instead
         :return:
         """
         data = self._ui.doctorSelectList_1.currentData()
-        appt_time = data.appt_time.split(",")
         if data is None or not isinstance(data, Doctor):
             print(f'No doctor selected to view appointments: {data}')
             return
         self._ui.editPatient_t3_drAvailability.clear()
-        for at in appt_time:
+        if self._availability is None:
+            for at in data.appointment_times:
+                self._ui.editPatient_t3_drAvailability.addItem(at, userData=at)
+            return
+        # Slots start on the hour, so the first one offered is the next full hour
+        start = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        end = datetime.combine(date.today() + timedelta(days=AVAILABILITY_DAYS), datetime.min.time())
+        for slot in self._availability.free_slots(data.id, start, end):
+            at = format_slot(slot)
             self._ui.editPatient_t3_drAvailability.addItem(at, userData=at)
 
     def see_pt_appointments(self):
         """
         When an admin selects a patient to view their appointments, populate the table and dropdown with
-        all the available appointments to reference.
+        all the available appointments to reference, once the chart of the patient is received.
         Runs a query to get the full data from the DB
         :return:
         """
@@ -320,16 +777,50 @@ class MainWindow(QMainWindow):
         if cur_patient is None or not isinstance(cur_patient, Patient):
             print(f'Tried to get appointments for patient {cur_patient}, but encountered the wrong type')
             return
+        self._admin_day = None
         self._ui.updateAppointment_t2_time.clear()
-        self._ui.appointmentTable.clearContents()
-        self._ui.appointmentTable.setRowCount(0)
-        if cur_patient.appts is None:
+        self._appointments_model.clear()
+        if not cur_patient.appointment_times:
             print('Patient has no appointments')
             return
-        appts = cur_patient.appts.split(",")
-        for at in appts:
-            self._ui.updateAppointment_t2_time.addItem(at, userData=at)
-        run_in_pool(self._pool, get_appointments, cur_patient)
+        self.request_chart('admin_chart', cur_patient)
+
+    def see_doctor_day(self):
+        """
+        Show the appointments of the selected doctor on the selected day in the admin appointment table
+        :return:
+        """
+        doctor = self._ui.adminDay_t2_doctor.currentData()
+        if doctor is None or not isinstance(doctor, BaseDoctor):
+            print('No Doctor selected')
+            return
+        self._admin_day = (self._ui.adminDay_t1_date.date().toPyDate(), doctor, None)
+        self.refresh_admin_appointments()
+
+    def see_department_day(self):
+        """
+        Show the appointments of the selected department on the selected day in the admin appointment table
+        :return:
+        """
+        department = self._ui.adminDay_t3_department.currentData()
+        if department is None or not isinstance(department, DepartmentStatistics):
+            print('No Department selected')
+            return
+        self._admin_day = (self._ui.adminDay_t1_date.date().toPyDate(), None, department)
+        self.refresh_admin_appointments()
+
+    def refresh_admin_appointments(self):
+        """
+        Reload the admin appointment table, either the day it shows or the chart of the selected patient
+        :return:
+        """
+        if self._admin_day is not None:
+            self._appointments_model.clear()
+            self._dispatcher.submit_now('admin_day', self._queries.get_day_appointments, *self._admin_day)
+            return
+        cur_patient = self._ui.updateAppointment_t1_name.currentData()
+        if isinstance(cur_patient, Patient):
+            self.request_chart('admin_chart', cur_patient, now=True)
 
     def create_patient(self):
         """
@@ -350,10 +841,22 @@ class MainWindow(QMainWindow):
             appts=None, diagnoses=None, id=0, person_id=0, tests=None, treatments=None)
 
         print('Adding patient in pool')
-        worker = run_in_pool(self._pool, create_new_patient, new_patient)
-        worker.signals.finished.connect(lambda: run_in_pool(self._pool, get_all_patients))
+        worker = self.run_write('Creating the patient', create_new_patient, new_patient)
+        worker.signals.result.connect(self.refresh_patient)
         print('Finished updating pool')
 
+    def refresh_patient(self, patient_id: Optional[int], select: bool = False):
+        """
+        Fetch a single patient after a write, so only that row of the patient dropdowns is updated
+        :param patient_id: Patient to refresh, or None if the write failed
+        :param select: Whether to select the patient once it is received
+        :return:
+        """
+        if patient_id is None:
+            print('No patient to refresh')
+            return
+        self.run_query(self._queries.get_patient, patient_id, select)
+
     def set_pt_details(self):
         """
         Set patient name on selecting from the dropdown
@@ -384,12 +887,10 @@ class MainWindow(QMainWindow):
             print('No Patient selected')
             return
 
-        def to_run():
-            get_tests_for_patient(cur_patient, cur_doctor)
-            get_diagnoses_for_patient(cur_patient)
-
-        worker = run_in_pool(self._pool, update_test_status, data, result)
-        worker.signals.finished.connect(lambda: run_in_pool(self._pool, to_run))
+        worker = self.run_write('Updating the test result', update_test_status, data, result)
+        worker.signals.finished.connect(
+            lambda: self.request_chart('doctor_chart', cur_patient, cur_doctor, now=True)
+        )
 
     def update_comments(self):
         """
@@ -408,8 +909,10 @@ class MainWindow(QMainWindow):
         cur_diagnosis = self._ui.addComments_t1_diagnosis.currentData()
         comments = self._ui.addComments_t2_comments.toPlainText()
 
-        worker = run_in_pool(self._pool, add_comments, cur_diagnosis, comments)
-        worker.signals.finished.connect(lambda: run_in_pool(self._pool, get_diagnoses_for_patient, cur_patient))
+        worker = self.run_write('Saving the comments', add_comments, cur_diagnosis, comments)
+        worker.signals.finished.connect(
+            lambda: self.request_chart('doctor_chart', cur_patient, cur_doctor, now=True)
+        )
 
     def update_patient_details(self):
         """
@@ -433,8 +936,8 @@ class MainWindow(QMainWindow):
         cur_patient.address = self._ui.editSelf_t9_address.text()
 
         print('Updating patient in pool')
-        worker = run_in_pool(self._pool, update_patient_information, cur_patient)
-        worker.signals.finished.connect(lambda: run_in_pool(self._pool, get_all_patients, cur_patient.id))
+        worker = self.run_write('Updating the patient', update_patient_information, cur_patient)
+        worker.signals.finished.connect(lambda: self.refresh_patient(cur_patient.id, True))
         print('Finished updating pool')
 
     def on_cur_diagnosis_changed(self):
@@ -469,8 +972,8 @@ class MainWindow(QMainWindow):
             return
         print(f'Trying to add a new diagnosis to {cur_patient = }, {cur_doctor = }, {disease_to_add = }')
 
-        worker = run_in_pool(self._pool, create_diagnosis, cur_patient, cur_doctor, disease_to_add)
-        worker.signals.finished.connect(lambda: run_in_pool(self._pool, get_all_patients, cur_patient.id))
+        worker = self.run_write('Adding the diagnosis', create_diagnosis, cur_patient, cur_doctor, disease_to_add)
+        worker.signals.finished.connect(lambda: self.refresh_patient(cur_patient.id, True))
 
     def on_add_treatment(self):
         """
@@ -491,9 +994,9 @@ class MainWindow(QMainWindow):
         end_date = self._ui.editPatient_t4_endDate.dateTime().toPyDateTime()
         instructions = self._ui.editPatient_t5_scriptInstructions.text()
 
-        worker = run_in_pool(self._pool, order_prescription, cur_diagnosis.patient_id, cur_diagnosis.disease_id,
-                             treatment_to_add, start_date, end_date, instructions)
-        worker.signals.finished.connect(lambda: run_in_pool(self._pool, get_all_patients, cur_diagnosis.patient_id))
+        worker = self.run_write('Ordering the prescription', order_prescription, cur_diagnosis.patient_id,
+                                cur_diagnosis.disease_id, treatment_to_add, start_date, end_date, instructions)
+        worker.signals.finished.connect(lambda: self.refresh_patient(cur_diagnosis.patient_id, True))
 
     def on_doctor_order_test(self):
         """
@@ -514,8 +1017,10 @@ class MainWindow(QMainWindow):
             return
 
         print('Running order test in pool')
-        worker = run_in_pool(self._pool, order_lab_test, cur_patient, cur_doctor, cur_test)
-        worker.signals.finished.connect(lambda: run_in_pool(self._pool, get_tests_for_patient, cur_patient, cur_doctor))
+        worker = self.run_write('Ordering the test', order_lab_test, cur_patient, cur_doctor, cur_test)
+        worker.signals.finished.connect(
+            lambda: self.request_chart('doctor_chart', cur_patient, cur_doctor, now=True)
+        )
 
     def on_make_appointment(self):
         """
@@ -535,11 +1040,30 @@ class MainWindow(QMainWindow):
             print('No Patient selected')
             return
         cur_description = self._ui.editPatient_t4_description.text()
+        if self._availability is not None and not self._availability.is_free(cur_doctor.id, cur_appt):
+            print(f'Doctor {cur_doctor.id} is not free at {cur_appt}')
+            return
 
         print('Running make appointment in pool')
-        worker = run_in_pool(self._pool, make_appointment, cur_patient, cur_doctor, cur_appt, cur_description)
+        worker = self.run_write('Making the appointment', make_appointment, cur_patient, cur_doctor, cur_appt,
+                                cur_description)
+        worker.signals.result.connect(lambda result: self.on_appointment_made(result, cur_doctor.id, cur_appt))
         worker.signals.finished.connect(lambda: self.see_pt_appointments())
 
+    def on_appointment_made(self, result, doctor_id: int, appointment: str):
+        """
+        Called when an appointment was sent to the database. If it was made, book the slot in the availability index
+        and stop offering it
+        :param result: Result of `make_appointment`, None if it failed
+        :param doctor_id: Doctor of the appointment
+        :param appointment: Appointment time
+        :return:
+        """
+        if result is None or self._availability is None:
+            return
+        self._availability.book(doctor_id, appointment)
+        self.see_dr_appointments()
+
     def on_admin_update_appointment(self):
         """
         Called when an admin checks in a patient for an appointment
@@ -550,7 +1074,7 @@ class MainWindow(QMainWindow):
             print('No Patient selected')
             return
         cur_appointment = self._ui.updateAppointment_t2_time.currentData()
-        if cur_appointment is None:
+        if cur_appointment is None or not isinstance(cur_appointment, Appointment):
             print('No Appointment selected')
             return
         cur_status = self._ui.updateAppointment_t3_status.currentText()
@@ -559,8 +1083,214 @@ class MainWindow(QMainWindow):
             return
 
         print('Updating test status in pool')
-        worker = run_in_pool(self._pool, update_appointment_status, cur_appointment, cur_status)
-        worker.signals.finished.connect(lambda: run_in_pool(self._pool, get_appointments, cur_patient))
+        worker = self.run_write('Updating the appointment', update_appointment_status, cur_appointment, cur_status)
+        worker.signals.result.connect(
+            lambda result: self.on_appointment_status_updated(result, cur_appointment, cur_status)
+        )
+        worker.signals.finished.connect(
+            lambda: self.request_chart('admin_chart', cur_patient, now=True)
+        )
+
+    def on_admin_update_selected_appointments(self):
+        """
+        Called when an admin sets the status of every appointment selected in the appointment table at once, e.g. to
+        check in a full clinic after listing the doctor's or the department's day. The appointments are updated in one
+        transaction, the ones that fail are reported
+        :return:
+        """
+        appointments = self.selected_admin_appointments()
+        if not appointments:
+            print('No Appointments selected')
+            return
+        cur_status = self._ui.updateAppointment_t3_status.currentText()
+        if cur_status is None or cur_status == "- Select Status -":
+            print('No Status selected')
+            return
+
+        print(f'Updating {len(appointments)} appointment statuses in pool')
+        worker = self.run_write('Updating the appointments', update_appointment_statuses, appointments, cur_status)
+        worker.signals.result.connect(lambda batch: self.on_appointment_batch_updated(batch, cur_status))
+        worker.signals.finished.connect(self.refresh_admin_appointments)
+
+    def on_admin_rebook_selected_appointments(self):
+        """
+        Called when an admin moves the appointments selected in the appointment table to another doctor, e.g. the day
+        of a doctor who is away. Each appointment is cancelled and booked again at the same time with the chosen
+        doctor, in one transaction, skipping the times the doctor is not free
+        :return:
+        """
+        cur_doctor = self._ui.adminRebookDoctor.currentData()
+        if cur_doctor is None or not isinstance(cur_doctor, BaseDoctor):
+            print('No Doctor selected')
+            return
+        appointments: List[Appointment] = []
+        times = set()
+        for appointment in self.selected_admin_appointments():
+            if appointment.doctor_id == cur_doctor.id or not occupies_slot(appointment.status):
+                continue
+            # Two selected appointments at the same time can't both move to the doctor
+            if appointment.time in times or (self._availability is not None and
+                                             not self._availability.is_free(cur_doctor.id, appointment.time)):
+                print(f'Doctor {cur_doctor.id} is not free at {appointment.time}')
+                continue
+            times.add(appointment.time)
+            appointments.append(appointment)
+        if not appointments:
+            print('No Appointments to rebook')
+            return
+
+        print(f'Rebooking {len(appointments)} appointments in pool')
+        worker = self.run_write('Rebooking the appointments', rebook_appointments, appointments, cur_doctor)
+        worker.signals.result.connect(lambda batch: self.on_appointments_rebooked(batch, cur_doctor.id))
+        worker.signals.finished.connect(self.refresh_admin_appointments)
+
+    def selected_admin_appointments(self) -> List[Appointment]:
+        """
+        :return: Appointments selected in the admin appointment table, in the order shown
+        """
+        rows = sorted(index.row() for index in self._ui.appointmentTable.selectionModel().selectedRows())
+        return [appointment for appointment in map(self._appointments_proxy.row_at, rows) if appointment is not None]
+
+    def on_appointments_rebooked(self, batch: Optional[BatchResult[Appointment]], doctor_id: int):
+        """
+        Called when a batch of appointments was moved to another doctor. Release the slots of the moved appointments
+        and book the new doctor's slots in the availability index, and report the ones that were not moved
+        :param batch: Result of `rebook_appointments`, None if the whole transaction failed
+        :param doctor_id: Doctor the appointments were moved to
+        :return:
+        """
+        self.on_batch_result(batch)
+        if batch is None or self._availability is None:
+            return
+        for result in batch.succeeded:
+            self._availability.release(result.item.doctor_id, result.item.time)
+            self._availability.book(doctor_id, result.item.time)
+        self.see_dr_appointments()
+
+    def on_appointment_status_updated(self, result, appointment: Appointment, status: str):
+        """
+        Called when the status of an appointment was sent to the database
+        :param result: Result of `update_appointment_status`, None if it failed
+        :param appointment: Appointment, with the status it had before
+        :param status: New status
+        :return:
+        """
+        if result is not None:
+            self.on_appointment_statuses_updated([appointment], status)
+
+    def on_appointment_batch_updated(self, batch: Optional[BatchResult[Appointment]], status: str):
+        """
+        Called when the status of a batch of appointments was sent to the database. Report the failed ones and update
+        the availability index for the others
+        :param batch: Result of `update_appointment_statuses`, None if the whole transaction failed
+        :param status: New status
+        :return:
+        """
+        self.on_batch_result(batch)
+        if batch is not None:
+            self.on_appointment_statuses_updated([result.item for result in batch.succeeded], status)
+
+    def on_appointment_statuses_updated(self, appointments: List[Appointment], status: str):
+        """
+        Keep the availability index in step with status changes: a cancelled appointment gives its slot back, and one
+        that is no longer cancelled takes it again
+        :param appointments: Updated appointments, with the status they had before
+        :param status: New status
+        :return:
+        """
+        if self._availability is None:
+            return
+        for appointment in appointments:
+            if occupies_slot(appointment.status) and not occupies_slot(status):
+                self._availability.release(appointment.doctor_id, appointment.time)
+            elif not occupies_slot(appointment.status) and occupies_slot(status):
+                self._availability.book(appointment.doctor_id, appointment.time)
+        self.see_dr_appointments()
+
+    @staticmethod
+    def on_batch_result(batch: Optional[BatchResult]):
+        """
+        Report the items of a batch write that failed
+        :param batch: Result of the batch, None if the whole transaction failed
+        :return:
+        """
+        if batch is None:
+            print('Batch failed, nothing was written')
+            return
+        print(f'Batch wrote {len(batch.succeeded)} of {len(batch.items)} items')
+        for failed in batch.failed:
+            print(f'  {failed.item}: {failed.error}')
+
+    def run_write(self, description: str, fn: Callable, *args, **kwargs) -> Worker:
+        """
+        Run a write started by the user on the thread pool. If it fails, or the executor rejects it because its queue
+        is full, the user is told the change was not saved instead of the write being dropped silently
+        :param description: What the write does, shown in the failure message
+        :param fn: Query function
+        :param args: Positional arguments to pass to the function
+        :param kwargs: Keyword arguments to pass to the function
+        :return: Worker, its `finished` signal is emitted whether the write succeeded or not
+        """
+        worker = run_in_pool(self._pool, fn, *args, **kwargs)
+        worker.signals.error.connect(lambda error: self.on_write_failed(description, error))
+        return worker
+
+    def on_write_failed(self, description: str, error: tuple):
+        """
+        Tell the user a write was not saved. The message box does not block, so queued results keep coming in
+        :param description: What the write does
+        :param error: Error emitted by the worker, (exctype, value, traceback)
+        :return:
+        """
+        exctype, value, _ = error
+        if exctype is Rejected:
+            reason = 'the database is busy, please try again'
+        else:
+            reason = str(value) or exctype.__name__
+        print(f'{description} failed: {reason}')
+        box = QMessageBox(QMessageBox.Icon.Warning, 'Not saved', f'{description} failed: {reason}', parent=self)
+        box.open()
+
+    def request_chart(self, channel: str, patient: Patient, doctor: Optional[BaseDoctor] = None,
+                      now: bool = False) -> None:
+        """
+        Request the chart of a patient through the dispatcher, superseding any chart request in flight on the channel
+        :param channel: Dispatcher channel, one per tab showing a chart
+        :param patient: Patient
+        :param doctor: Doctor to show the ordered tests of, or None for all tests
+        :param now: Skip the debounce, used to refresh after a write
+        :return: None
+        """
+        if now:
+            self._dispatcher.submit_now(channel, self._queries.get_patient_chart, patient, doctor)
+        else:
+            self._dispatcher.submit(channel, self._queries.get_patient_chart, patient, doctor)
+
+    def run_query(self, fn: Callable, *args, priority: Priority = Priority.INTERACTIVE,
+                  token: Optional[CancellationToken] = None, **kwargs) -> Worker | AsyncTask:
+        """
+        Run a query function, coroutine functions on the event loop and other functions on the thread pool
+        :param fn: Query function
+        :param args: Positional arguments to pass to the function
+        :param priority: Queue priority on the thread pool. Tasks on the event loop are not queued, it only selects
+            their default statement time limit
+        :param token: Token to cancel the work with
+        :param kwargs: Keyword arguments to pass to the function
+        :return: Worker or task, both have the same signals
+        """
+        if inspect.iscoroutinefunction(fn):
+            return run_async(fn, *args, priority=priority, token=token, **kwargs)
+        return run_in_pool(self._pool, fn, *args, priority=priority, token=token, **kwargs)
+
+    def run_query_progress(self, fn: Callable, *args, priority: Priority = Priority.INTERACTIVE,
+                           token: Optional[CancellationToken] = None, **kwargs) -> Worker | AsyncTask:
+        """
+        Same as `run_query`, the function is passed a `progress_callback` signal to report its progress on
+        :return: Worker or task, connect to `signals.progress` for the progress
+        """
+        if inspect.iscoroutinefunction(fn):
+            return run_async_progress(fn, *args, priority=priority, token=token, **kwargs)
+        return run_in_pool_progress(self._pool, fn, *args, priority=priority, token=token, **kwargs)
 
     def setup_connections(self) -> None:
         db_params: DBCredentials = DBCredentials(
@@ -569,7 +1299,46 @@ class MainWindow(QMainWindow):
             host=self.config.Host,
             db_name=self.config.Database
         )
-        DatabaseManager.connect(db_params)
+        pool_options = PoolOptions(
+            size=self.config.PoolSize,
+            max_overflow=self.config.PoolMaxOverflow,
+            timeout_s=self.config.PoolTimeout,
+            recycle_s=self.config.PoolRecycle,
+            pre_ping=self.config.PoolPrePing,
+            prewarm=self.config.PoolPrewarm
+        )
+        DatabaseManager.connect(db_params, pool_options)
+        if self._use_async:
+            AsyncDatabaseManager.connect(db_params, pool_options, self.config.AsyncDriver)
+        QueryMetrics.configure(slow_query_ms=self.config.SlowQueryMs)
+        ReferenceCache.configure(default_ttl_s=self.config.CacheTtlS, **{CACHE_DOCTORS: self.config.CacheDoctorsTtlS})
+        StatementRegistry.configure(use_prepared=self.config.PreparedStatements)
+        SummaryTables.configure(enabled=self.config.UseSummaries)
+        PatientSearch.configure(fulltext=self.config.SearchFulltext)
+        DatabaseManager.configure_statement_timeouts(interactive_ms=self.config.MaxStatementMs,
+                                                     background_ms=self.config.BackgroundMaxStatementMs)
+
+    def closeEvent(self, event) -> None:
+        """
+        Cancel the background work when the window closes, so the application does not wait for it to exit
+        :param event: Close event
+        :return: None
+        """
+        self._background_token.cancel()
+        super().closeEvent(event)
+
+    def dump_metrics(self) -> None:
+        """
+        Print a snapshot of the query, connection pool, cache and dispatcher metrics (Ctrl+Shift+M)
+        :return: None
+        """
+        print(f'Query metrics:\n{QueryMetrics.format_snapshot()}')
+        print(f'Pool: {DatabaseManager.pool_statistics()}')
+        print(f'Executor: {self._pool.stats()}')
+        if self._use_async:
+            print(f'Async pool: {AsyncDatabaseManager.pool_statistics()}')
+        print(f'Reference cache: {ReferenceCache.stats()}')
+        print(f'Dispatcher: {self._dispatcher.stats()}')
 
 
 def create_app():
@@ -577,10 +1346,30 @@ def create_app():
 
 
 def run_app(app: QApplication) -> int:
-    main_window = MainWindow()
-    main_window.show()
-    ret_code = app.exec()
+    config = load_config()
+    use_async = config.ExecutionMode == 'async'
+    if use_async and not async_mode_available(config.AsyncDriver):
+        print(f'The async execution mode needs qasync and {config.AsyncDriver} installed, using threads instead')
+        use_async = False
+    if not use_async:
+        main_window = MainWindow()
+        main_window.show()
+        ret_code = app.exec()
+
+        # Shutdown logic
+        DatabaseManager.shutdown()
+        return ret_code
+
+    import qasync  # type: ignore[import-untyped]
+    # Run asyncio on the Qt event loop, so coroutines and the UI share the GUI thread
+    loop = qasync.QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    with loop:
+        main_window = MainWindow(use_async=True)
+        main_window.show()
+        ret_code = loop.run_forever()
 
-    # Shutdown logic
-    DatabaseManager.shutdown()
+        # Shutdown logic
+        loop.run_until_complete(AsyncDatabaseManager.shutdown())
+        DatabaseManager.shutdown()
     return ret_code
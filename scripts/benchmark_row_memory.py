@@ -0,0 +1,74 @@
+"""
+Compares the memory used by patient rows held as regular dataclasses (one __dict__ per row), slotted dataclasses
+(the `db_types` classes) and `ColumnarRows`.
+
+Rows are built the way the database driver hands them over, with fresh string objects for every row.
+
+Run from the root of the project:
+    python -m scripts.benchmark_row_memory 100000 1000000
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from dataclasses import make_dataclass, fields
+from datetime import datetime, timedelta
+from typing import Callable, Iterator
+
+from databaseui.database.columnar import ColumnarRows
+from databaseui.database.db_types import NamedPatient
+
+# The same fields as NamedPatient, without slots
+DictNamedPatient = make_dataclass('DictNamedPatient', [(f.name, f.type) for f in fields(NamedPatient) if f.init])
+
+GENDERS = ('cisgender', 'non-binary', 'prefer not to say', 'genderqueer')
+SEXES = ('Female', 'Male')
+ORIENTATIONS = ('heterosexual', 'homosexual', 'bisexual', 'pansexual', 'queer')
+
+
+def patient_rows(count: int) -> Iterator[tuple]:
+    rng = random.Random(0)
+    base = datetime(1950, 1, 1)
+    for i in range(1, count + 1):
+        # ''.join makes a new string object per row, like the driver does, instead of reusing the constant
+        yield (i, i, ''.join(rng.choice(GENDERS)), ''.join(rng.choice(SEXES)), ''.join(rng.choice(ORIENTATIONS)),
+               base + timedelta(days=rng.randrange(26000)), f'{rng.randint(201, 989)}-555-{i % 10000:04d}',
+               f'patient{i}@example.com', f'{rng.randint(1, 99999)} Main Street',
+               f'Condition {i % 97},Condition {i % 89}', f'Treatment {i % 83}', None,
+               f'2025-0{i % 9 + 1}-1{i % 9} 10:00:00', f'First{i % 5000}', f'Last{i % 7000}')
+
+
+def measure(build: Callable[[int], object], count: int) -> tuple[float, float]:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = build(count)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return current / (1024 * 1024), elapsed
+
+
+REPRESENTATIONS: dict[str, Callable[[int], object]] = {
+    'dataclass (__dict__)': lambda n: [DictNamedPatient(*r) for r in patient_rows(n)],
+    'slotted dataclass': lambda n: [NamedPatient(*r) for r in patient_rows(n)],
+    'columnar': lambda n: ColumnarRows.from_rows(NamedPatient, patient_rows(n)),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the memory use of row representations')
+    parser.add_argument('counts', nargs='*', type=int, default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f'{"rows":>10} {"representation":<22} {"MiB":>9} {"bytes/row":>10} {"build s":>8}')
+    for count in args.counts:
+        for name, build in REPRESENTATIONS.items():
+            mib, elapsed = measure(build, count)
+            print(f'{count:>10} {name:<22} {mib:>9.1f} {mib * 1024 * 1024 / count:>10.0f} {elapsed:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
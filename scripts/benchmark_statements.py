@@ -0,0 +1,95 @@
+"""
+Measures the per call cost of the hot parameterized statements, three ways:
+
+* inline:   a new `text()` object is built for every call, like the query functions used to do
+* registry: the precompiled `Statement` clause from `databaseui.database.statements` is reused
+* prepared: the statement runs server side prepared, only the parameters are sent after the first call
+
+The client side overhead (building the clause and its cache key) is always measured. Pass --connect to also run the
+statements against the database configured in .env, for a patient and doctor that exist.
+
+Run from the root of the project:
+    python -m scripts.benchmark_statements --connect --patient-id 1 --doctor-id 1 --calls 2000
+"""
+import argparse
+import time
+from typing import Callable
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from databaseui.database import DatabaseManager, with_session, StatementRegistry
+from databaseui.database.db_types import DBCredentials, PoolOptions
+from databaseui.database.statements import Statement, execute
+from databaseui.env import load_config
+
+
+def per_call_us(fn: Callable[[], object], calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1_000_000
+
+
+def client_overhead(statement: Statement, calls: int) -> tuple[float, float]:
+    """
+    :return: Microseconds per call to build the clause and its cache key, inline and from the registry
+    """
+    inline = per_call_us(lambda: text(statement.sql)._generate_cache_key(), calls)
+    registry = per_call_us(lambda: statement.clause._generate_cache_key(), calls)
+    return inline, registry
+
+
+@with_session
+def database_round_trips(session: Session, statement: Statement, params: dict, calls: int) -> tuple[float, ...]:
+    """
+    :return: Microseconds per call inline, from the registry and prepared, all on the same connection
+    """
+    # Warm up the connection, the compiled cache and the server side statement
+    session.execute(text(statement.sql), params).all()
+    execute(session, statement, params, prepared=True).all()
+    inline = per_call_us(lambda: session.execute(text(statement.sql), params).all(), calls)
+    registry = per_call_us(lambda: execute(session, statement, params, prepared=False).all(), calls)
+    prepared = per_call_us(lambda: execute(session, statement, params, prepared=True).all(), calls)
+    return inline, registry, prepared
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark precompiled and prepared statements')
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--connect', action='store_true', help='Also time the statements against the database')
+    parser.add_argument('--patient-id', type=int, default=1)
+    parser.add_argument('--doctor-id', type=int, default=1)
+    args = parser.parse_args()
+
+    hot = [statement for statement in StatementRegistry.all() if statement.prepare]
+    print('Client side cost per call (build clause + cache key)')
+    print(f'  {"statement":<28} {"inline us":>10} {"registry us":>12}')
+    for statement in hot:
+        inline, registry = client_overhead(statement, args.calls)
+        print(f'  {statement.name:<28} {inline:>10.1f} {registry:>12.1f}')
+
+    if not args.connect:
+        return
+    params = {'after_id': args.patient_id - 1, 'page_size': 100, 'patient_id': args.patient_id,
+              'pt_id': args.patient_id, 'dr_id': args.doctor_id}
+    config = load_config()
+    DatabaseManager.connect(
+        DBCredentials(user=config.User, passwd=config.Password, host=config.Host, db_name=config.Database),
+        PoolOptions(size=1, max_overflow=0)
+    )
+    try:
+        print('Database round trip per call')
+        print(f'  {"statement":<28} {"inline us":>10} {"registry us":>12} {"prepared us":>12}')
+        for statement in hot:
+            timings = database_round_trips(statement, {k: params[k] for k in statement.positional_names}, args.calls)
+            if timings is None:
+                print(f'  {statement.name:<28} failed')
+                continue
+            print(f'  {statement.name:<28} {timings[0]:>10.1f} {timings[1]:>12.1f} {timings[2]:>12.1f}')
+    finally:
+        DatabaseManager.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Streams a patient extract (a JSON array like patient.json) straight into the database.
+
+Persons and patients are written with multi-row INSERTs, `--batch-size` rows per statement, and committed every
+`--transaction-size` entries. Persons are inserted with explicit ids, following the highest id, which is locked for
+the transaction, so the patients reference their persons whatever innodb_autoinc_lock_mode and
+auto_increment_increment are. Inserts into person from other sessions wait for the transaction to commit.
+
+Run from the root of the project:
+    python -m scripts.bulk_load_patients scripts/patient.json
+"""
+import argparse
+import json
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, Iterable
+
+from sqlalchemy import text, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import table, column
+
+from databaseui.database import DatabaseManager, with_session
+from databaseui.database.db_types import DBCredentials, PoolOptions
+from databaseui.env import load_config
+
+person_table = table('person', column('id'), column('first_name'), column('last_name'))
+patient_table = table(
+    'patient',
+    column('person_id'), column('gender'), column('sex'), column('sexual_orientation'), column('DOB'),
+    column('phone_number'), column('email'), column('address')
+)
+
+
+def iter_json_array(path: Path, read_size: int = 1 << 16) -> Iterator[dict]:
+    """
+    Incrementally parse a JSON array of objects, so the whole file never has to be in memory
+    :param path: JSON file
+    :param read_size: Characters to read at a time
+    :return: Iterator over the objects in the array
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as json_file:
+        buffer = ''
+        pos = 0
+        started = False
+        while True:
+            # Skip whitespace and separators between elements
+            while pos < len(buffer) and (buffer[pos].isspace() or (started and buffer[pos] == ',')):
+                pos += 1
+            if pos < len(buffer):
+                if not started:
+                    if buffer[pos] != '[':
+                        raise ValueError(f'{path} does not contain a JSON array')
+                    started = True
+                    pos += 1
+                    continue
+                if buffer[pos] == ']':
+                    return
+                try:
+                    entry, pos = decoder.raw_decode(buffer, pos)
+                    yield entry
+                    continue
+                except json.JSONDecodeError:
+                    # The element continues in the next chunk
+                    pass
+            chunk = json_file.read(read_size)
+            if not chunk:
+                raise ValueError(f'{path} ended before the end of the JSON array')
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+@with_session
+def insert_transaction(session: Session, entries: list[dict], batch_size: int) -> tuple[int, int]:
+    """
+    Insert a transaction's worth of entries with multi-row statements
+    :param session:
+    :param entries: Entries from the extract
+    :param batch_size: Rows per INSERT statement
+    :return: Number of persons and patients inserted
+    """
+    session.begin()
+    # Locks the end of the id range until the commit, so no other insert takes the ids handed out below
+    first_person_id = session.execute(text("SELECT COALESCE(MAX(id), 0) FROM person FOR UPDATE;")).scalar_one() + 1
+    persons = 0
+    patients = 0
+    for batch in batched(entries, batch_size):
+        session.execute(insert(person_table).values([
+            {'id': first_person_id + idx, 'first_name': e['first_name'], 'last_name': e['last_name']}
+            for idx, e in enumerate(batch)
+        ]))
+        rows = [
+            {
+                'person_id': first_person_id + idx, 'gender': e.get('gender'), 'sex': e.get('sex'),
+                'sexual_orientation': e.get('sexual_orientation'), 'DOB': e.get('DOB'),
+                'phone_number': e.get('phone_number'), 'email': e.get('email'), 'address': e.get('address')
+            }
+            for idx, e in enumerate(batch) if e.get('is_patient')
+        ]
+        if rows:
+            session.execute(insert(patient_table).values(rows))
+        first_person_id += len(batch)
+        persons += len(batch)
+        patients += len(rows)
+    return persons, patients
+
+
+def load(path: Path, batch_size: int, transaction_size: int, skip: int) -> int:
+    """
+    Stream the extract into the database
+    :param path: JSON extract
+    :param batch_size: Rows per INSERT statement
+    :param transaction_size: Entries per transaction
+    :param skip: Entries to skip, to resume an interrupted load
+    :return: Number of entries committed, including the skipped ones
+    """
+    committed = skip
+    persons = 0
+    patients = 0
+    start = time.perf_counter()
+    for entries in batched(islice(iter_json_array(path), skip, None), transaction_size):
+        inserted = insert_transaction(entries, batch_size)
+        if inserted is None:
+            print(f'Load stopped, resume with --skip {committed}')
+            return committed
+        committed += len(entries)
+        persons += inserted[0]
+        patients += inserted[1]
+        elapsed = time.perf_counter() - start
+        print(f'{committed} entries committed, {(persons + patients) / elapsed:,.0f} rows/s')
+
+    elapsed = time.perf_counter() - start
+    print(f'Inserted {persons} persons and {patients} patients in {elapsed:.1f} s '
+          f'({(persons + patients) / elapsed if elapsed else 0:,.0f} rows/s)')
+    return committed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk load a patient extract into the database')
+    parser.add_argument('path', nargs='?', type=Path, default=Path(__file__).with_name('patient.json'),
+                        help='JSON array of persons, like patient.json')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT statement')
+    parser.add_argument('--transaction-size', type=int, default=20000, help='Entries per transaction')
+    parser.add_argument('--skip', type=int, default=0, help='Entries to skip, to resume an interrupted load')
+    args = parser.parse_args()
+
+    config = load_config()
+    DatabaseManager.connect(
+        DBCredentials(user=config.User, passwd=config.Password, host=config.Host, db_name=config.Database),
+        PoolOptions(size=1, max_overflow=0)
+    )
+    try:
+        load(args.path, args.batch_size, args.transaction_size, args.skip)
+    finally:
+        DatabaseManager.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Creates the indexes used by the server side patient search (`query_manager.search_patients`): person names, patient date
+of birth and the digits of the phone number, and optionally (with --fulltext) a FULLTEXT index on person names, used
+once DB_SEARCH_FULLTEXT is enabled. Indexes that already exist are skipped.
+
+Run from the root of the project:
+    python -m scripts.create_search_indexes --fulltext
+"""
+import argparse
+import time
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from databaseui.database import DatabaseManager, with_session
+from databaseui.database import statements
+from databaseui.database.db_types import DBCredentials, PoolOptions
+from databaseui.database.statements import Statement
+from databaseui.env import load_config
+
+# MySQL error of CREATE INDEX when an index with the same name exists, it has no IF NOT EXISTS
+DUPLICATE_KEY_NAME = 1061
+
+INDEXES = [
+    statements.CREATE_PERSON_NAME_INDEX,
+    statements.CREATE_PERSON_FIRST_NAME_INDEX,
+    statements.CREATE_PATIENT_DOB_INDEX,
+    statements.CREATE_PATIENT_PHONE_DIGITS_INDEX,
+]
+
+
+@with_session
+def create_index(session: Session, statement: Statement) -> bool:
+    """
+    :return: False if the index already existed
+    """
+    try:
+        statements.execute(session, statement)
+    except DBAPIError as e:
+        if getattr(e.orig, 'errno', None) != DUPLICATE_KEY_NAME:
+            raise
+        return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create the patient search indexes')
+    parser.add_argument('--fulltext', action='store_true', help='Also create the FULLTEXT index on person names')
+    args = parser.parse_args()
+
+    indexes = INDEXES + ([statements.CREATE_PERSON_NAME_FULLTEXT] if args.fulltext else [])
+    config = load_config()
+    DatabaseManager.connect(
+        DBCredentials(user=config.User, passwd=config.Password, host=config.Host, db_name=config.Database),
+        PoolOptions(size=1, max_overflow=0)
+    )
+    try:
+        for statement in indexes:
+            start = time.perf_counter()
+            created = create_index(statement)
+            if created is None:
+                print(f'{statement.name} failed')
+            elif created:
+                print(f'{statement.name} done in {time.perf_counter() - start:.2f} s')
+            else:
+                print(f'{statement.name} skipped, the index exists')
+    finally:
+        DatabaseManager.shutdown()
+
+
+if __name__ == '__main__':
+    main()
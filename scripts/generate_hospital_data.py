@@ -0,0 +1,402 @@
+"""
+Deterministic synthetic hospital data for capacity testing.
+
+Writes one CSV file per table and shard into the output directory, plus a load.sql with the LOAD DATA statements to
+import them. Patients are split into shards of `--shard-size` and every shard gets its own random generator seeded from
+`--seed` and the shard number, so the output is the same no matter how many `--processes` generate it, and memory use
+is bounded by the shard size.
+
+Patient and doctor names and streets are drawn from patient.json, departments and specialties from specialties.json.
+Ids are assigned explicitly, so the data is meant to be loaded into an empty schema.
+
+Run from the root of the project:
+    python -m scripts.generate_hospital_data --patients 1000000 --processes 8 --out data
+"""
+import argparse
+import csv
+import json
+import math
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, date
+from itertools import accumulate
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Optional, Any
+
+SCRIPTS_DIR = Path(__file__).parent
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+NULL = r'\N'
+
+TABLE_COLUMNS = {
+    'department': ('id', 'name'),
+    'specialty': ('id', 'name', 'department_id'),
+    'disease': ('id', 'name', 'description'),
+    'treatment': ('id', 'name', 'generic_id'),
+    'lab_test': ('id', 'disease_id', 'test_name'),
+    'person': ('id', 'first_name', 'last_name'),
+    'patient': ('id', 'person_id', 'gender', 'sex', 'sexual_orientation', 'DOB', 'phone_number', 'email', 'address'),
+    'doctor': ('id', 'person_id', 'department_id', 'specialty_id'),
+    'availability': ('id', 'doctor_id', 'days_available', 'start_time', 'duration_h', 'dates'),
+    'appointment': ('patient_id', 'doctor_id', 'department_id', 'time', 'status', 'description'),
+    'diagnosis': ('patient_id', 'doctor_id', 'disease_id', 'date', 'comments'),
+    'patient_prescription': ('patient_id', 'disease_id', 'treatment_id', 'start_date', 'end_date',
+                             'dosage_instructions'),
+    'ordered_lab_test': ('patient_id', 'lab_test_id', 'doctor_id', 'result'),
+}
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+SEXES = (('Female', 50), ('Male', 50))
+GENDERS = (('cisgender', 5), ('non-binary', 1), ('prefer not to say', 1), ('genderqueer', 1))
+ORIENTATIONS = (('heterosexual', 80), ('homosexual', 5), ('bisexual', 6), ('pansexual', 2), ('queer', 2),
+                ('asexual', 1), (None, 4))
+# Age bands (min age, max age, weight), roughly the age distribution of hospital patients
+AGE_BANDS = ((0, 17, 22), (18, 44, 36), (45, 64, 25), (65, 100, 17))
+APPOINTMENT_REASONS = ('Annual checkup', 'Follow up', 'Consultation', 'Lab review', 'Medication review',
+                       'New symptoms', 'Pre-op assessment', 'Post-op check')
+TEST_RESULTS = ((None, 20), ('Positive', 25), ('Negative', 45), ('Inconclusive', 10))
+DOSAGES = ('Once daily', 'Twice daily with food', 'Every 8 hours', 'As needed for pain', 'Once weekly')
+EMAIL_DOMAINS = ('example.com', 'mail.example.org', 'inbox.example.net')
+
+
+@dataclass
+class Settings:
+    out: Path
+    seed: int
+    patients: int
+    doctors: int
+    diseases: int
+    treatments: int
+    shard_size: int
+    appointments_per_patient: float
+    start: date
+    end: date
+    today: date
+
+    @property
+    def shards(self) -> int:
+        return math.ceil(self.patients / self.shard_size)
+
+
+@dataclass
+class DoctorInfo:
+    id: int
+    department_id: int
+    days: tuple[int, ...]
+    start_hour: int
+    duration_h: int
+
+
+@dataclass
+class Vocabulary:
+    first_names: list[str]
+    last_names: list[str]
+    streets: list[str]
+    specialties: dict[str, list[str]]
+
+
+def weighted(rng: random.Random, choices: tuple) -> Any:
+    return rng.choices([c[0] for c in choices], weights=[c[1] for c in choices])[0]
+
+
+def zipf_cum_weights(n: int, exponent: float = 0.8) -> list[float]:
+    """
+    Cumulative weights for picking ids 1..n with a Zipf-like popularity skew
+    """
+    return list(accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+def fmt(value: Any) -> Any:
+    if value is None:
+        return NULL
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    return value
+
+
+class TableWriter:
+    """
+    Streams the rows of one table and shard into a CSV file
+    """
+
+    def __init__(self, out: Path, table: str, shard: Optional[int] = None):
+        directory = out / table
+        directory.mkdir(parents=True, exist_ok=True)
+        name = 'part-reference.csv' if shard is None else f'part-{shard:05d}.csv'
+        self._file = open(directory / name, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file, lineterminator='\n')
+        self.rows = 0
+
+    def write(self, *row: Any) -> None:
+        self._writer.writerow([fmt(v) for v in row])
+        self.rows += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def load_vocabulary() -> Vocabulary:
+    with open(SCRIPTS_DIR / 'patient.json', 'r') as json_file:
+        people = json.load(json_file)
+    with open(SCRIPTS_DIR / 'specialties.json', 'r') as json_file:
+        specialties = json.load(json_file)
+    return Vocabulary(
+        first_names=sorted({p['first_name'] for p in people}),
+        last_names=sorted({p['last_name'] for p in people}),
+        streets=sorted({p['address'].split(' ', 1)[1] for p in people if ' ' in p.get('address', '')}),
+        specialties=specialties,
+    )
+
+
+def build_doctors(settings: Settings, vocabulary: Vocabulary) -> list[DoctorInfo]:
+    """
+    Doctors are cheap to rebuild, so every process derives the same list from the seed instead of receiving it
+    """
+    rng = random.Random(settings.seed * 1_000_003 + 1)
+    department_count = len(vocabulary.specialties)
+    doctors = []
+    for doctor_id in range(1, settings.doctors + 1):
+        days = tuple(sorted(rng.sample(range(5), rng.randint(3, 5))))
+        if rng.random() < 0.1:
+            days += (5,)
+        doctors.append(DoctorInfo(doctor_id, rng.randint(1, department_count), days, rng.randint(7, 10),
+                                  rng.randint(4, 9)))
+    return doctors
+
+
+def write_reference(settings: Settings, vocabulary: Vocabulary, doctors: list[DoctorInfo]) -> dict[str, int]:
+    """
+    Write the tables that don't scale with the number of patients: departments, specialties, diseases, treatments,
+    lab tests, doctors and their availability.
+    :return: Rows written per table
+    """
+    rng = random.Random(settings.seed * 1_000_003)
+    out = settings.out
+    written = {}
+
+    departments = TableWriter(out, 'department')
+    specialties = TableWriter(out, 'specialty')
+    specialties_of_department: dict[int, list[int]] = {}
+    for department_id, (department, names) in enumerate(vocabulary.specialties.items(), start=1):
+        departments.write(department_id, department)
+        for name in names:
+            specialties.write(specialties.rows + 1, name, department_id)
+            specialties_of_department.setdefault(department_id, []).append(specialties.rows)
+
+    diseases = TableWriter(out, 'disease')
+    lab_tests = TableWriter(out, 'lab_test')
+    for disease_id in range(1, settings.diseases + 1):
+        diseases.write(disease_id, f'Condition {disease_id:05d}', f'Synthetic condition number {disease_id}')
+        for test in range(rng.randint(1, 4)):
+            lab_tests.write(lab_tests.rows + 1, disease_id, f'Panel {disease_id:05d}-{test + 1}')
+
+    treatments = TableWriter(out, 'treatment')
+    for treatment_id in range(1, settings.treatments + 1):
+        generic_id = rng.randint(1, treatment_id - 1) if treatment_id > 1 and rng.random() < 0.3 else None
+        treatments.write(treatment_id, f'Treatment {treatment_id:05d}', generic_id)
+
+    persons = TableWriter(out, 'person')
+    doctor_rows = TableWriter(out, 'doctor')
+    availability = TableWriter(out, 'availability')
+    start = datetime.combine(settings.start, datetime.min.time())
+    for doctor in doctors:
+        person_id = settings.patients + doctor.id
+        persons.write(person_id, rng.choice(vocabulary.first_names), rng.choice(vocabulary.last_names))
+        doctor_rows.write(doctor.id, person_id, doctor.department_id,
+                          rng.choice(specialties_of_department[doctor.department_id]))
+        availability.write(doctor.id, doctor.id, ','.join(WEEKDAYS[d] for d in doctor.days),
+                           start.replace(hour=doctor.start_hour), doctor.duration_h, start)
+
+    for writer, table in ((departments, 'department'), (specialties, 'specialty'), (diseases, 'disease'),
+                          (lab_tests, 'lab_test'), (treatments, 'treatment'), (persons, 'person'),
+                          (doctor_rows, 'doctor'), (availability, 'availability')):
+        writer.close()
+        written[table] = writer.rows
+    return written
+
+
+# Per process state, built once by `init_worker`
+_settings: Settings
+_vocabulary: Vocabulary
+_doctors: list[DoctorInfo]
+_doctor_weights: list[float]
+_tests_of_disease: dict[int, list[int]]
+
+
+def init_worker(settings: Settings) -> None:
+    global _settings, _vocabulary, _doctors, _doctor_weights, _tests_of_disease
+    _settings = settings
+    _vocabulary = load_vocabulary()
+    _doctors = build_doctors(settings, _vocabulary)
+    _doctor_weights = zipf_cum_weights(len(_doctors))
+    # Lab tests are numbered in disease order, rebuild the mapping from the reference file
+    _tests_of_disease = {}
+    with open(settings.out / 'lab_test' / 'part-reference.csv', 'r', encoding='utf-8') as csv_file:
+        for test_id, disease_id, _ in csv.reader(csv_file):
+            _tests_of_disease.setdefault(int(disease_id), []).append(int(test_id))
+
+
+def pick_slot(rng: random.Random, doctor: DoctorInfo, shard: int, weeks: int) -> Optional[datetime]:
+    """
+    Pick an appointment slot for a doctor. A doctor's slots are numbered over the whole date range and every shard only
+    books slots congruent to its shard number, so shards generated in different processes never double-book.
+    """
+    per_week = len(doctor.days) * doctor.duration_h
+    total = weeks * per_week
+    count = (total - shard + _settings.shards - 1) // _settings.shards
+    if count <= 0:
+        return None
+    slot = shard + _settings.shards * rng.randrange(count)
+    week, rest = divmod(slot, per_week)
+    day, hour = divmod(rest, doctor.duration_h)
+    start = _settings.start - timedelta(days=_settings.start.weekday())
+    day_date = start + timedelta(weeks=week, days=doctor.days[day])
+    if not _settings.start <= day_date <= _settings.end:
+        return None
+    return datetime.combine(day_date, datetime.min.time()).replace(hour=doctor.start_hour + hour)
+
+
+def generate_shard(shard: int) -> dict[str, int]:
+    """
+    Write the persons, patients and patient activity of one shard
+    :param shard: Shard number
+    :return: Rows written per table
+    """
+    settings = _settings
+    rng = random.Random(settings.seed * 1_000_003 + 1_000 + shard)
+    first_patient = shard * settings.shard_size + 1
+    last_patient = min(first_patient + settings.shard_size - 1, settings.patients)
+    weeks = (settings.end - settings.start).days // 7 + 2
+    disease_weights = zipf_cum_weights(settings.diseases)
+    treatment_weights = zipf_cum_weights(settings.treatments)
+    booked: set[tuple[int, datetime]] = set()
+
+    writers = {table: TableWriter(settings.out, table, shard)
+               for table in ('person', 'patient', 'appointment', 'diagnosis', 'patient_prescription',
+                             'ordered_lab_test')}
+    for patient_id in range(first_patient, last_patient + 1):
+        first_name = rng.choice(_vocabulary.first_names)
+        last_name = rng.choice(_vocabulary.last_names)
+        min_age, max_age, _ = rng.choices(AGE_BANDS, weights=[b[2] for b in AGE_BANDS])[0]
+        dob = datetime.combine(settings.today, datetime.min.time()) - timedelta(
+            days=rng.randint(min_age * 365, max_age * 365 + 364), seconds=rng.randrange(86400))
+        email = None if rng.random() < 0.1 else \
+            f'{first_name[0]}{last_name}{patient_id}@{rng.choice(EMAIL_DOMAINS)}'.lower().replace(' ', '')
+        phone = None if rng.random() < 0.1 else \
+            f'{rng.randint(201, 989)}-{rng.randint(201, 989)}-{rng.randrange(10000):04d}'
+        writers['person'].write(patient_id, first_name, last_name)
+        writers['patient'].write(patient_id, patient_id, weighted(rng, GENDERS), weighted(rng, SEXES),
+                                 weighted(rng, ORIENTATIONS), dob, phone, email,
+                                 f'{rng.randint(1, 99999)} {rng.choice(_vocabulary.streets)}')
+
+        # Appointment counts are heavy tailed: most patients have a few, some have many
+        for _ in range(int(rng.expovariate(1 / settings.appointments_per_patient))):
+            doctor = rng.choices(_doctors, cum_weights=_doctor_weights)[0]
+            slot = pick_slot(rng, doctor, shard, weeks)
+            if slot is None or (doctor.id, slot) in booked:
+                continue
+            booked.add((doctor.id, slot))
+            if slot.date() >= settings.today:
+                status = 'Scheduled'
+            else:
+                status = weighted(rng, (('Complete', 90), ('Checked In', 3), ('Scheduled', 7)))
+            writers['appointment'].write(patient_id, doctor.id, doctor.department_id, slot, status,
+                                         rng.choice(APPOINTMENT_REASONS))
+
+        diagnosed: set[tuple[int, int]] = set()
+        prescribed: set[tuple[int, int]] = set()
+        for _ in range(min(int(rng.expovariate(1 / 1.2)), 8)):
+            doctor = rng.choices(_doctors, cum_weights=_doctor_weights)[0]
+            disease_id = rng.choices(range(1, settings.diseases + 1), cum_weights=disease_weights)[0]
+            if (doctor.id, disease_id) in diagnosed:
+                continue
+            diagnosed.add((doctor.id, disease_id))
+            diagnosed_at = datetime.combine(settings.start, datetime.min.time()) + timedelta(
+                seconds=rng.randrange(int((settings.today - settings.start).total_seconds()) or 1))
+            writers['diagnosis'].write(patient_id, doctor.id, disease_id, diagnosed_at,
+                                       None if rng.random() < 0.6 else 'Follow up in two weeks')
+            for _ in range(rng.choices((0, 1, 2), weights=(30, 55, 15))[0]):
+                treatment_id = rng.choices(range(1, settings.treatments + 1), cum_weights=treatment_weights)[0]
+                if (disease_id, treatment_id) in prescribed:
+                    continue
+                prescribed.add((disease_id, treatment_id))
+                writers['patient_prescription'].write(
+                    patient_id, disease_id, treatment_id, diagnosed_at,
+                    diagnosed_at + timedelta(days=rng.choice((7, 10, 14, 30, 90, 365))), rng.choice(DOSAGES))
+            tests = _tests_of_disease.get(disease_id, [])
+            for test_id in rng.sample(tests, rng.randint(0, len(tests))):
+                writers['ordered_lab_test'].write(patient_id, test_id, doctor.id, weighted(rng, TEST_RESULTS))
+
+    written = {}
+    for table, writer in writers.items():
+        writer.close()
+        written[table] = writer.rows
+    return written
+
+
+def write_load_script(out: Path) -> None:
+    """
+    Write load.sql, importing every CSV file in dependency order. The ids are explicit, so the script first checks
+    that every table it loads is empty: the guard row violates its CHECK constraint otherwise (MySQL 8.0.16+,
+    MariaDB 10.2+), and the mysql client stops at the error before anything is loaded
+    """
+    non_empty = ' + '.join(f'EXISTS (SELECT 1 FROM `{table}`)' for table in TABLE_COLUMNS)
+    lines = [
+        'CREATE TEMPORARY TABLE load_guard (non_empty_tables INT, '
+        'CONSTRAINT load_into_empty_schema_only CHECK (non_empty_tables = 0));',
+        f'INSERT INTO load_guard (non_empty_tables) SELECT {non_empty};',
+        'DROP TEMPORARY TABLE load_guard;',
+        'SET FOREIGN_KEY_CHECKS = 0;', 'SET UNIQUE_CHECKS = 0;'
+    ]
+    for table, columns in TABLE_COLUMNS.items():
+        for part in sorted((out / table).glob('part-*.csv')):
+            lines.append(
+                f"LOAD DATA LOCAL INFILE '{part.resolve().as_posix()}' INTO TABLE `{table}` "
+                f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY '\\n' "
+                f"({', '.join(f'`{c}`' for c in columns)});"
+            )
+    lines += ['SET UNIQUE_CHECKS = 1;', 'SET FOREIGN_KEY_CHECKS = 1;']
+    with open(out / 'load.sql', 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic hospital data for capacity testing')
+    parser.add_argument('--out', type=Path, default=Path('generated_data'), help='Output directory')
+    parser.add_argument('--seed', type=int, default=42, help='Seed, the same seed always gives the same data')
+    parser.add_argument('--patients', type=int, default=100_000)
+    parser.add_argument('--doctors', type=int, default=None, help='Defaults to one doctor per 200 patients')
+    parser.add_argument('--diseases', type=int, default=500)
+    parser.add_argument('--treatments', type=int, default=800)
+    parser.add_argument('--appointments-per-patient', type=float, default=4.0, help='Mean appointments per patient')
+    parser.add_argument('--start', type=date.fromisoformat, default=date(2023, 1, 1), help='First appointment date')
+    parser.add_argument('--end', type=date.fromisoformat, default=date(2025, 12, 31), help='Last appointment date')
+    parser.add_argument('--today', type=date.fromisoformat, default=date(2025, 6, 1),
+                        help='Appointments before this date are mostly complete, after it scheduled')
+    parser.add_argument('--shard-size', type=int, default=50_000, help='Patients per output file')
+    parser.add_argument('--processes', type=int, default=1)
+    args = parser.parse_args()
+
+    settings = Settings(
+        out=args.out, seed=args.seed, patients=args.patients, doctors=args.doctors or max(args.patients // 200, 1),
+        diseases=args.diseases, treatments=args.treatments, shard_size=args.shard_size,
+        appointments_per_patient=args.appointments_per_patient, start=args.start, end=args.end, today=args.today
+    )
+    settings.out.mkdir(parents=True, exist_ok=True)
+
+    vocabulary = load_vocabulary()
+    totals = write_reference(settings, vocabulary, build_doctors(settings, vocabulary))
+    with Pool(args.processes, initializer=init_worker, initargs=(settings,)) as pool:
+        for written in pool.imap_unordered(generate_shard, range(settings.shards)):
+            for table, rows in written.items():
+                totals[table] = totals.get(table, 0) + rows
+            print(f'Shard done, {totals["patient"]:,} of {settings.patients:,} patients written')
+
+    write_load_script(settings.out)
+    for table, rows in totals.items():
+        print(f'{table:<22} {rows:>12,}')
+    print(f'Load into an empty schema with: mysql --local-infile=1 DATABASE < {settings.out / "load.sql"}')
+
+
+if __name__ == '__main__':
+    main()
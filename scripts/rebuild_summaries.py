@@ -0,0 +1,56 @@
+"""
+Creates (with --create) and rebuilds the department and patient summary tables from their views.
+
+The application keeps the summaries up to date on every write once DB_USE_SUMMARIES is enabled. Rebuild them after
+loading data outside of the application (bulk loads, generated data), or to repair them.
+
+Run from the root of the project:
+    python -m scripts.rebuild_summaries --create
+"""
+import argparse
+import time
+
+from sqlalchemy.orm import Session
+
+from databaseui.database import DatabaseManager, with_session
+from databaseui.database.db_types import DBCredentials, PoolOptions
+from databaseui.database.summaries import SummaryTables
+from databaseui.env import load_config
+
+
+@with_session
+def create(session: Session) -> None:
+    SummaryTables.create(session)
+
+
+@with_session
+def rebuild(session: Session) -> tuple[int, int]:
+    session.begin()
+    return SummaryTables.rebuild(session)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild the summary tables')
+    parser.add_argument('--create', action='store_true', help="Create the summary tables if they don't exist")
+    args = parser.parse_args()
+
+    config = load_config()
+    DatabaseManager.connect(
+        DBCredentials(user=config.User, passwd=config.Password, host=config.Host, db_name=config.Database),
+        PoolOptions(size=1, max_overflow=0)
+    )
+    try:
+        if args.create:
+            create()
+        start = time.perf_counter()
+        rows = rebuild()
+    finally:
+        DatabaseManager.shutdown()
+    if rows is None:
+        print('Rebuilding the summaries failed')
+        return
+    print(f'Rebuilt {rows[0]} department and {rows[1]} patient summaries in {time.perf_counter() - start:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
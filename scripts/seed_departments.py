@@ -0,0 +1,125 @@
+"""
+Seeds departments and their specialties from specialties.json.
+
+Departments and specialties are upserted in one batch each, with `INSERT ... ON DUPLICATE KEY UPDATE` on their names:
+re-running the seed inserts the new rows, moves specialties to the department the file now lists them under, and
+leaves the rest as it is, so it can be re-run on every deployment. The upsert relies on unique keys on
+`department.name` and `specialty.name`, which are added first if the schema has none.
+
+Run from the root of the project:
+    python -m scripts.seed_departments scripts/specialties.json
+"""
+import argparse
+import json
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import table, column
+
+from databaseui.database import DatabaseManager, with_session
+from databaseui.database.db_types import DBCredentials, PoolOptions
+from databaseui.env import load_config
+
+department_table = table('department', column('name'))
+specialty_table = table('specialty', column('name'), column('department_id'))
+
+# Unique keys the upserts match rows on, by table
+UNIQUE_NAME_KEYS = {'department': 'uq_department_name', 'specialty': 'uq_specialty_name'}
+
+
+def department_ids(session: Session) -> dict[str, int]:
+    return {name: dept_id for name, dept_id in session.execute(text("SELECT name, id FROM department"))}
+
+
+def has_unique_name_key(session: Session, table_name: str) -> bool:
+    """
+    :return: True if the table has a unique index on its name column alone
+    """
+    return session.execute(text(
+        "SELECT COUNT(*) FROM ("
+        "SELECT index_name FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = :table_name AND non_unique = 0 "
+        "GROUP BY index_name HAVING COUNT(*) = 1 AND MAX(column_name) = 'name') AS name_keys"
+    ), {'table_name': table_name}).scalar_one() > 0
+
+
+@with_session
+def ensure_unique_keys(session: Session) -> list[str]:
+    """
+    Add the unique keys on the names the upserts need, to the tables that don't have one. Fails if a table already
+    has duplicate names, which have to be merged by hand first
+    :return: Keys that were added
+    """
+    added = []
+    for table_name, key in UNIQUE_NAME_KEYS.items():
+        if not has_unique_name_key(session, table_name):
+            session.execute(text(f"ALTER TABLE {table_name} ADD UNIQUE KEY {key} (name)"))
+            added.append(key)
+    return added
+
+
+@with_session
+def seed(session: Session, specialties: dict[str, list[str]]) -> tuple[int, int, int]:
+    """
+    Upsert the departments and specialties, in a single transaction
+    :param session:
+    :param specialties: Specialty names, keyed by department name
+    :return: Number of departments inserted, specialties inserted and specialties moved to another department
+    """
+    session.begin()
+    before = department_ids(session)
+    if specialties:
+        statement = insert(department_table).values([{'name': name} for name in specialties.keys()])
+        session.execute(statement.on_duplicate_key_update(name=statement.inserted.name))
+        departments = department_ids(session)
+    else:
+        departments = before
+
+    existing = dict(session.execute(text("SELECT name, department_id FROM specialty")).tuples())
+    rows = [
+        {'name': specialty, 'department_id': departments[department]}
+        for department, names in specialties.items()
+        for specialty in names
+    ]
+    if rows:
+        statement = insert(specialty_table).values(rows)
+        session.execute(statement.on_duplicate_key_update(department_id=statement.inserted.department_id))
+    inserted = sum(1 for row in rows if row['name'] not in existing)
+    moved = sum(1 for row in rows if row['name'] in existing and existing[row['name']] != row['department_id'])
+    return len(set(specialties) - set(before)), inserted, moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed departments and specialties')
+    parser.add_argument('path', nargs='?', type=Path, default=Path(__file__).with_name('specialties.json'),
+                        help='JSON object of specialty names keyed by department name')
+    args = parser.parse_args()
+
+    with open(args.path, 'r') as json_file:
+        specialties = json.load(json_file)
+
+    config = load_config()
+    DatabaseManager.connect(
+        DBCredentials(user=config.User, passwd=config.Password, host=config.Host, db_name=config.Database),
+        PoolOptions(size=1, max_overflow=0)
+    )
+    try:
+        added = ensure_unique_keys()
+        if added is None:
+            print('Adding the unique keys on the names failed, merge duplicate names first')
+            return
+        for key in added:
+            print(f'Added unique key {key}')
+        seeded = seed(specialties)
+    finally:
+        DatabaseManager.shutdown()
+    if seeded is None:
+        print('Seeding failed')
+        return
+    print(f'Inserted {seeded[0]} departments and {seeded[1]} specialties, moved {seeded[2]} specialties')
+
+
+if __name__ == '__main__':
+    main()
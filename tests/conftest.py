@@ -0,0 +1,27 @@
+import time
+from typing import Callable
+
+import pytest
+from PyQt6.QtCore import QCoreApplication
+
+
+@pytest.fixture(scope='session')
+def qapp() -> QCoreApplication:
+    """
+    Application for the tests using Qt timers, signals or thread pools. No display is needed
+    """
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def process_events_until(condition: Callable[[], bool], timeout_s: float = 2.0) -> bool:
+    """
+    Process Qt events until the condition holds
+    :return: False if it still does not hold after the timeout
+    """
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        QCoreApplication.processEvents()
+        time.sleep(0.001)
+    return True
@@ -0,0 +1,92 @@
+from datetime import datetime, date, time, timedelta
+
+from databaseui.database.availability import AvailabilityIndex, format_slot, parse_slot
+from databaseui.database.db_types import Availability, occupies_slot, CANCELLED_STATUS
+
+# A Monday
+MONDAY = date(2025, 6, 2)
+
+
+def at(day: date, hour: int) -> datetime:
+    return datetime.combine(day, time(hour))
+
+
+def index(*rows: Availability, booked=()) -> AvailabilityIndex:
+    return AvailabilityIndex.build(rows, booked)
+
+
+def window(days: str, start: time | timedelta, hours: int, effective_from=None, doctor_id: int = 1) -> Availability:
+    # The driver returns TIME columns as timedelta, not as the datetime the row type declares
+    return Availability(id=1, doctor_id=doctor_id, days_available=days, start_time=start,  # type: ignore[arg-type]
+                        duration_h=hours, dates=effective_from)
+
+
+def test_free_slots_of_a_window():
+    availability = index(window('Monday', time(9), 3))
+    assert availability.free_slots(1, at(MONDAY, 0), at(MONDAY + timedelta(days=7), 0)) == [
+        at(MONDAY, 9), at(MONDAY, 10), at(MONDAY, 11)
+    ]
+
+
+def test_time_columns_returned_as_timedelta():
+    availability = index(window('Mon', timedelta(hours=14), 1))
+    assert availability.is_free(1, at(MONDAY, 14))
+    assert not availability.is_free(1, at(MONDAY, 15))
+
+
+def test_range_bounds_are_half_open():
+    availability = index(window('Monday', time(9), 3))
+    assert availability.free_slots(1, at(MONDAY, 10), at(MONDAY, 11)) == [at(MONDAY, 10)]
+
+
+def test_booked_slots_are_not_free():
+    availability = index(window('Monday', time(9), 3), booked=[(1, format_slot(at(MONDAY, 10)))])
+    assert not availability.is_free(1, at(MONDAY, 10))
+    assert availability.free_slots(1, at(MONDAY, 0), at(MONDAY, 23)) == [at(MONDAY, 9), at(MONDAY, 11)]
+
+
+def test_book_and_release():
+    availability = index(window('Monday', time(9), 1))
+    assert availability.book(1, at(MONDAY, 9))
+    assert not availability.book(1, format_slot(at(MONDAY, 9)))
+    assert not availability.is_free(1, at(MONDAY, 9))
+    availability.release(1, at(MONDAY, 9))
+    assert availability.is_free(1, at(MONDAY, 9))
+
+
+def test_window_past_midnight_carries_into_the_next_day():
+    availability = index(window('Monday', time(23), 2))
+    assert availability.free_slots(1, at(MONDAY, 0), at(MONDAY + timedelta(days=2), 0)) == [
+        at(MONDAY, 23), at(MONDAY + timedelta(days=1), 0)
+    ]
+
+
+def test_windows_apply_from_their_start_date():
+    availability = index(window('Monday', time(9), 1, effective_from=datetime.combine(MONDAY, time.min)))
+    assert not availability.is_free(1, at(MONDAY - timedelta(days=7), 9))
+    assert availability.is_free(1, at(MONDAY, 9))
+    assert availability.is_free(1, at(MONDAY + timedelta(days=7), 9))
+
+
+def test_overlapping_windows_list_a_slot_once():
+    availability = index(window('Monday', time(9), 2), window('Monday', time(10), 2))
+    assert availability.free_slots(1, at(MONDAY, 0), at(MONDAY, 23)) == [
+        at(MONDAY, 9), at(MONDAY, 10), at(MONDAY, 11)
+    ]
+
+
+def test_limit_and_unknown_doctor():
+    availability = index(window('Monday, Tuesday', time(9), 8))
+    assert len(availability.free_slots(1, at(MONDAY, 0), at(MONDAY + timedelta(days=7), 0), limit=5)) == 5
+    assert availability.free_slots(2, at(MONDAY, 0), at(MONDAY, 23)) == []
+    assert not availability.is_free(2, at(MONDAY, 9))
+
+
+def test_slot_strings_round_trip():
+    assert parse_slot(format_slot(at(MONDAY, 9))) == at(MONDAY, 9)
+
+
+def test_only_cancelled_appointments_give_their_slot_back():
+    assert not occupies_slot(CANCELLED_STATUS)
+    assert occupies_slot('Scheduled')
+    assert occupies_slot(None)
@@ -0,0 +1,61 @@
+from array import array
+from dataclasses import dataclass
+from typing import Optional
+
+import pytest
+
+from databaseui.database.columnar import ColumnarRows
+from databaseui.database.db_types import Person
+from databaseui.database.query_manager import map_rows
+
+
+@dataclass(slots=True)
+class Row:
+    id: int
+    status: str
+    doctor_id: Optional[int]
+
+
+ROWS = [(1, 'Scheduled', 7), (2, 'Complete', None), (3, 'Scheduled', 9)]
+
+
+def test_from_rows_keeps_the_field_order():
+    rows = ColumnarRows.from_rows(Row, ROWS)
+    assert rows.names == ('id', 'status', 'doctor_id')
+    assert len(rows) == 3
+    assert rows.to_rows() == [Row(*row) for row in ROWS]
+
+
+def test_int_columns_are_packed_unless_they_have_nulls():
+    rows = ColumnarRows.from_rows(Row, ROWS)
+    assert isinstance(rows.column('id'), array)
+    assert list(rows.column('id')) == [1, 2, 3]
+    assert rows.column('doctor_id') == [7, None, 9]
+
+
+def test_equal_strings_are_shared():
+    rows = ColumnarRows.from_rows(Row, [(1, ''.join(['Sched', 'uled']), 1), (2, ''.join(['Sche', 'duled']), 2)])
+    first, second = rows.column('status')
+    assert first is second
+
+
+def test_row_views_read_the_columns():
+    rows = ColumnarRows.from_rows(Row, ROWS)
+    view = rows[-1]
+    assert (view.id, view.status, view.doctor_id) == (3, 'Scheduled', 9)
+    assert view.materialize() == Row(3, 'Scheduled', 9)
+    assert [v.id for v in rows] == [1, 2, 3]
+    with pytest.raises(AttributeError):
+        _ = view.missing
+    with pytest.raises(IndexError):
+        _ = rows[3]
+
+
+def test_empty_result():
+    rows = ColumnarRows.from_rows(Row, [])
+    assert len(rows) == 0
+    assert rows.to_rows() == []
+
+
+def test_map_rows_builds_row_type_instances():
+    assert map_rows(Person, [(1, 'Ada', 'Lovelace')]) == [Person(1, 'Ada', 'Lovelace')]
@@ -0,0 +1,71 @@
+from databaseui.database.query_manager import is_superseded
+from databaseui.threads.dispatcher import CoalescingDispatcher
+from databaseui.threads.worker import Worker
+from tests.conftest import process_events_until
+
+
+class RecordingPool:
+    """
+    Startable that keeps the workers instead of running them
+    """
+
+    def __init__(self):
+        self.workers: list[Worker] = []
+
+    def start(self, worker: Worker, priority: int = 0) -> None:
+        self.workers.append(worker)
+
+
+def test_a_burst_is_coalesced_into_the_latest_request(qapp):
+    dispatcher = CoalescingDispatcher(RecordingPool(), delay_ms=10)
+    calls = []
+    for i in range(5):
+        dispatcher.submit_local('search', calls.append, i)
+    assert calls == []
+    assert process_events_until(lambda: calls)
+    assert calls == [4]
+    stats = dispatcher.stats()['search']
+    assert (stats.submitted, stats.dispatched, stats.coalesced) == (5, 1, 4)
+
+
+def test_channels_are_independent(qapp):
+    dispatcher = CoalescingDispatcher(RecordingPool(), delay_ms=10)
+    calls = []
+    dispatcher.submit_local('a', calls.append, 'a')
+    dispatcher.submit_local('b', calls.append, 'b')
+    assert process_events_until(lambda: len(calls) == 2)
+    assert sorted(calls) == ['a', 'b']
+
+
+def test_submit_now_dispatches_without_waiting(qapp):
+    pool = RecordingPool()
+    dispatcher = CoalescingDispatcher(pool, delay_ms=10_000)
+    dispatcher.submit_now('chart', lambda generation: None)
+    assert len(pool.workers) == 1
+    assert pool.workers[0].kwargs['generation'].is_current()
+
+
+def test_a_newer_request_supersedes_and_cancels_the_one_in_flight(qapp):
+    pool = RecordingPool()
+    dispatcher = CoalescingDispatcher(pool, delay_ms=10_000)
+    dispatcher.submit_now('chart', lambda generation: None)
+    first = pool.workers[0]
+    generation = first.kwargs['generation']
+
+    dispatcher.submit('chart', lambda generation: None)
+    assert not generation.is_current()
+    assert first.context.is_cancelled()
+    # The newer request is still waiting for the channel to be quiet
+    assert len(pool.workers) == 1
+
+    assert is_superseded(generation)
+    assert dispatcher.stats()['chart'].dropped == 1
+
+
+def test_current_requests_are_not_superseded(qapp):
+    pool = RecordingPool()
+    dispatcher = CoalescingDispatcher(pool, delay_ms=10_000)
+    dispatcher.submit_now('chart', lambda generation: None)
+    assert not is_superseded(pool.workers[0].kwargs['generation'])
+    assert not is_superseded(None)
+    assert dispatcher.stats()['chart'].dropped == 0
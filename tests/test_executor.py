@@ -0,0 +1,126 @@
+import threading
+
+import pytest
+
+from databaseui.threads.executor import DatabaseExecutor, Rejected, RejectionPolicy
+from databaseui.threads.task_context import CancellationToken, Priority, TaskContext
+from databaseui.threads.worker import Worker
+from tests.conftest import process_events_until
+
+
+class Tracked:
+    """
+    Worker recording the order it ran in and the errors it emitted
+    """
+
+    def __init__(self, executor: DatabaseExecutor, name: str, ran: list[str], priority: Priority = Priority.INTERACTIVE,
+                 release: threading.Event | None = None, token: CancellationToken | None = None):
+        self.errors: list[tuple] = []
+        self.finished = False
+
+        def run():
+            ran.append(name)
+            if release is not None:
+                release.wait(5)
+
+        self.worker = Worker(run)
+        self.worker.context = TaskContext(priority, token)
+        self.worker.signals.error.connect(self.errors.append)
+        self.worker.signals.finished.connect(self._on_finished)
+        self.worker.start(executor)
+
+    def _on_finished(self):
+        self.finished = True
+
+    @property
+    def rejected(self) -> bool:
+        return any(error[0] is Rejected for error in self.errors)
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def busy_executor(policy: RejectionPolicy, ran: list[str], release: threading.Event) -> DatabaseExecutor:
+    """
+    Executor with one thread, taken by a worker waiting for `release`, and room for one queued worker
+    """
+    executor = DatabaseExecutor(1, 1, policy)
+    Tracked(executor, 'blocker', ran, release=release)
+    assert process_events_until(lambda: ran == ['blocker'])
+    return executor
+
+
+def test_reject_turns_away_work_once_the_queue_is_full(qapp, release):
+    ran: list[str] = []
+    executor = busy_executor(RejectionPolicy.REJECT, ran, release)
+    queued = Tracked(executor, 'queued', ran)
+    rejected = Tracked(executor, 'rejected', ran)
+    assert process_events_until(lambda: rejected.finished)
+    assert rejected.rejected and not queued.rejected
+
+    release.set()
+    assert process_events_until(lambda: queued.finished)
+    assert ran == ['blocker', 'queued']
+    stats = executor.stats()
+    assert (stats.submitted, stats.rejected, stats.shed, stats.max_queued) == (3, 1, 0, 1)
+
+
+def test_interactive_work_sheds_queued_background_work(qapp, release):
+    ran: list[str] = []
+    executor = busy_executor(RejectionPolicy.SHED_BACKGROUND, ran, release)
+    background = Tracked(executor, 'background', ran, Priority.BACKGROUND)
+    interactive = Tracked(executor, 'interactive', ran)
+    assert process_events_until(lambda: background.finished)
+    assert background.rejected
+
+    release.set()
+    assert process_events_until(lambda: interactive.finished)
+    assert ran == ['blocker', 'interactive']
+    assert executor.stats().shed == 1
+
+
+def test_background_work_is_rejected_when_the_queue_is_full(qapp, release):
+    ran: list[str] = []
+    executor = busy_executor(RejectionPolicy.SHED_BACKGROUND, ran, release)
+    interactive = Tracked(executor, 'interactive', ran)
+    background = Tracked(executor, 'background', ran, Priority.BACKGROUND)
+    assert process_events_until(lambda: background.finished)
+    assert background.rejected and not interactive.rejected
+    assert executor.stats().shed == 0
+
+
+def test_interactive_work_runs_before_queued_background_work(qapp, release):
+    ran: list[str] = []
+    executor = DatabaseExecutor(1, 4)
+    Tracked(executor, 'blocker', ran, release=release)
+    assert process_events_until(lambda: ran == ['blocker'])
+    background = Tracked(executor, 'background', ran, Priority.BACKGROUND)
+    Tracked(executor, 'interactive', ran)
+
+    release.set()
+    assert process_events_until(lambda: background.finished)
+    assert ran == ['blocker', 'interactive', 'background']
+
+
+def test_cancelled_queued_work_makes_room(qapp, release):
+    ran: list[str] = []
+    executor = busy_executor(RejectionPolicy.REJECT, ran, release)
+    token = CancellationToken()
+    cancelled = Tracked(executor, 'cancelled', ran, token=token)
+    token.cancel()
+    accepted = Tracked(executor, 'accepted', ran)
+    assert process_events_until(lambda: cancelled.finished)
+    assert not accepted.rejected and not cancelled.errors
+
+    release.set()
+    assert process_events_until(lambda: accepted.finished)
+    assert ran == ['blocker', 'accepted']
+
+
+def test_for_engine_pool_uses_one_thread_per_connection(qapp):
+    assert DatabaseExecutor.for_engine_pool(5, 10, 64).stats().threads == 15
+    assert DatabaseExecutor.for_engine_pool(5, -1, 64).stats().threads == 5
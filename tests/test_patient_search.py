@@ -0,0 +1,93 @@
+from datetime import date, datetime
+
+import pytest
+
+from databaseui.database.patient_search import MAX_NAME_TERMS, PatientQuery, PatientSearch
+from databaseui.database.statements import phone_digits_sql
+
+
+@pytest.fixture(autouse=True)
+def like_mode():
+    PatientSearch.configure(fulltext=False)
+    yield
+    PatientSearch.configure(fulltext=False)
+
+
+def test_parse_splits_names_dates_and_phone_numbers():
+    query = PatientQuery.parse('Smith 1990-04-01 (507) 555-12 o\'brien')
+    assert query.names == ('smith', 'o', 'brien')
+    assert query.dob == date(1990, 4, 1)
+    assert query.phone == '50755512'
+
+
+def test_parse_keeps_an_invalid_date_as_a_name():
+    query = PatientQuery.parse('1990-13-40')
+    assert query.dob is None
+    assert query.names == ()
+    assert query.phone == '19901340'
+
+
+def test_parse_limits_the_name_terms():
+    assert len(PatientQuery.parse('a b c d e').names) == MAX_NAME_TERMS
+    assert PatientQuery.parse('   ').is_empty()
+
+
+def test_statements_are_built_once_per_shape():
+    first = PatientSearch.ids_statement(PatientQuery.parse('smith jo'))
+    assert PatientSearch.ids_statement(PatientQuery.parse('garcia al')) is first
+    assert PatientSearch.ids_statement(PatientQuery.parse('garcia')) is not first
+
+
+def test_names_are_a_union_of_one_range_scan_per_column():
+    statement = PatientSearch.ids_statement(PatientQuery.parse('smith jo'))
+    assert ' OR ' in statement.sql
+    assert statement.sql.count(' UNION ') == 1
+    assert 'pe.first_name LIKE :name_0' in statement.sql
+    assert 'pe.last_name LIKE :name_0' in statement.sql
+    # Each branch is ordered and limited, and the merged result again
+    assert statement.sql.count('ORDER BY') == 3
+    assert statement.sql.count('LIMIT :page_size') == 3
+
+
+def test_the_longest_name_term_drives():
+    params = PatientSearch.params(PatientQuery.parse('jo smith'), after_id=10, page_size=50)
+    assert params == {'after_id': 10, 'page_size': 50, 'name_0': 'smith%', 'name_1': 'jo%'}
+
+
+def test_filters_without_names_are_a_single_query():
+    statement = PatientSearch.ids_statement(PatientQuery.parse('1990-04-01'))
+    assert ' UNION ' not in statement.sql
+    assert 'pa.DOB >= :dob AND pa.DOB < :dob_end' in statement.sql
+    params = PatientSearch.params(PatientQuery.parse('1990-04-01'), -1, 50)
+    assert (params['dob'], params['dob_end']) == (datetime(1990, 4, 1), datetime(1990, 4, 2))
+
+
+def test_phone_numbers_compare_as_digits():
+    query = PatientQuery.parse('507-555')
+    statement = PatientSearch.ids_statement(query)
+    assert f"{phone_digits_sql('pa.phone_number')} LIKE :phone" in statement.sql
+    assert PatientSearch.params(query, -1, 50)['phone'] == '507555%'
+
+
+def test_phone_digits_strip_every_separator():
+    expression = phone_digits_sql('phone_number')
+    for separator in ('-', ' ', '(', ')', '.', '+'):
+        assert f"'{separator}', '')" in expression
+
+
+def test_fulltext_only_takes_long_terms():
+    PatientSearch.configure(fulltext=True)
+    query = PatientQuery.parse('smith jo')
+    statement = PatientSearch.ids_statement(query)
+    assert 'MATCH (pe.first_name, pe.last_name)' in statement.sql
+    params = PatientSearch.params(query, -1, 50)
+    assert params['fulltext'] == '+smith*'
+    assert params['name_0'] == 'jo%'
+
+
+def test_prepared_statements_bind_every_parameter():
+    query = PatientQuery.parse('smith jo 507')
+    statement = PatientSearch.ids_statement(query)
+    params = PatientSearch.params(query, -1, 50)
+    assert set(statement.positional_names) == set(params)
+    assert statement.positional_sql.count('?') == len(statement.positional_names)
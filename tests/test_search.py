@@ -0,0 +1,111 @@
+from datetime import datetime
+
+import pytest
+
+from databaseui.database import search
+from databaseui.database.db_types import NamedPatient
+from databaseui.database.search import PatientSearchIndex, edit_distance, fuzzy_score, max_edits, tokenize, trigrams
+
+
+def patient(patient_id: int, first_name: str, last_name: str, phone: str = '', email: str = '') -> NamedPatient:
+    return NamedPatient(id=patient_id, person_id=patient_id, gender='', sex='', sexual_orientation=None,
+                        DOB=datetime(1990, 1, 1), phone_number=phone, email=email, address=None, diagnoses=None,
+                        treatments=None, tests=None, appts=None, first_name=first_name, last_name=last_name)
+
+
+@pytest.fixture
+def index() -> PatientSearchIndex:
+    patients = PatientSearchIndex()
+    patients.set_rows([
+        patient(1, 'John', 'Smith', '555-123-4567', 'john.smith@gmail.com'),
+        patient(2, 'Johanna', 'Garcia', '555-987-6543', 'jo@example.org'),
+        patient(3, 'Maria', 'Johnson', '507-555-0000'),
+        patient(4, 'Jonathan', 'Smithers'),
+    ])
+    return patients
+
+
+def ids(rows) -> list[int]:
+    return [row.id for row in rows]
+
+
+def test_tokenize_joins_phone_number_parts():
+    assert tokenize('555-123-4567') == ['555', '123', '4567', '5551234567']
+    assert tokenize('John.Smith@Gmail.com') == ['john', 'smith', 'gmail', 'com']
+    assert tokenize(None) == []
+
+
+def test_trigrams_are_padded():
+    assert trigrams('jo') == {'  j', ' jo', 'jo '}
+
+
+@pytest.mark.parametrize('a, b, distance', [
+    ('john', 'john', 0),
+    ('john', 'jon', 1),
+    ('john', 'jonh', 1),
+    ('garcia', 'garica', 1),
+    ('smith', 'smyth', 1),
+    ('kitten', 'sitting', 3),
+])
+def test_edit_distance_counts_transpositions_as_one_edit(a, b, distance):
+    assert edit_distance(a, b, 5) == distance
+
+
+def test_edit_distance_stops_above_the_limit():
+    assert edit_distance('kitten', 'sitting', 1) == 2
+    assert edit_distance('a', 'abcdef', 2) == 3
+
+
+def test_max_edits_grows_with_the_term():
+    assert max_edits('jon') == 0
+    assert max_edits('john') == search.SHORT_TERM_EDITS
+    assert max_edits('jonathan') == search.LONG_TERM_EDITS
+
+
+def test_fuzzy_score_uses_the_better_of_dice_and_edits():
+    term, token = 'jonh', 'john'
+    shared = len(trigrams(term) & trigrams(token))
+    # Too few shared trigrams for the Dice coefficient, one edit away
+    assert 2 * shared / (len(trigrams(term)) + len(token) + 1) < search.FUZZY_THRESHOLD
+    assert fuzzy_score(term, len(trigrams(term)), token, shared) == pytest.approx(0.75)
+    assert fuzzy_score('mary', len(trigrams('mary')), 'smith', 0) == 0.0
+
+
+def test_exact_matches_rank_before_prefix_matches(index):
+    assert ids(index.search('smith')) == [1, 4]
+    assert ids(index.search('john')) == [1, 3, 2]
+
+
+def test_every_term_must_match(index):
+    assert ids(index.search('jo smith')) == [1, 4]
+    assert ids(index.search('maria smith')) == []
+
+
+@pytest.mark.parametrize('query, expected', [('jonh', 1), ('garica', 2), ('jhon', 1)])
+def test_misspelled_names_still_match(index, query, expected):
+    assert expected in ids(index.search(query))
+
+
+def test_phone_numbers_match_with_or_without_separators(index):
+    assert ids(index.search('5551234')) == [1]
+    assert ids(index.search('555-987')) == [2]
+
+
+def test_upsert_and_remove(index):
+    index.upsert(patient(3, 'Maria', 'Lopez'))
+    assert 3 not in ids(index.search('johnson'))
+    assert ids(index.search('lopez')) == [3]
+    index.remove(3)
+    assert ids(index.search('maria')) == []
+    assert len(index) == 3
+
+
+def test_terms_matching_many_rows_are_capped(monkeypatch):
+    monkeypatch.setattr(search, 'TERM_POSTINGS_LIMIT', 10)
+    patients = PatientSearchIndex()
+    patients.set_rows([patient(i, f'jo{i}', 'common') for i in range(100)] + [patient(100, 'jo', 'rare')])
+    scores, truncated = patients._term_scores('common')
+    assert truncated and len(scores) == 10
+    # A capped term is checked against the rows of the other term instead of being left out
+    assert ids(patients.search('common jo99')) == [99]
+    assert ids(patients.search('rare jo')) == [100]